@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import AdminLog, SiteConfiguration
+from .models import AdminLog, DailyStats, SiteConfiguration
 
 
 @admin.register(AdminLog)
@@ -40,3 +40,10 @@ class SiteConfigurationAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         obj.updated_by = request.user
         super().save_model(request, obj, form, change)
+
+
+@admin.register(DailyStats)
+class DailyStatsAdmin(admin.ModelAdmin):
+    list_display = ['date', 'new_users', 'new_posts', 'new_comments', 'new_likes', 'active_users', 'updated_at']
+    date_hierarchy = 'date'
+    ordering = ['-date']
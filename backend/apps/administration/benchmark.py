@@ -0,0 +1,232 @@
+"""
+Benchmark de los endpoints REST más usados.
+
+``run_benchmark`` lanza peticiones con el cliente de pruebas de Django (pasan
+por todo el stack: middleware, autenticación JWT, serializadores) en nombre de
+usuarios sintéticos (``apps.administration.synthetic``) y mide la latencia y
+las consultas SQL de cada una. El resultado se guarda como JSON para
+compararlo con ``compare_results`` entre commits.
+
+``run_consumer_db_benchmark`` mide el rendimiento del pool de base de datos de
+los consumers (``config.db_executor``) con distintos tamaños.
+"""
+import asyncio
+import json
+import platform
+import random
+import statistics
+import subprocess
+import time
+from math import ceil
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.chat.models import ChatRoom
+from config.db_executor import configure_executor, consumer_db
+from notifications.models import Notification
+from .synthetic import SYNTHETIC_PREFIX, dataset_summary
+
+User = get_user_model()
+
+# Nombre -> función que construye la URL para un usuario (None si no aplica)
+ENDPOINTS = {
+    'feed': lambda ctx, user: '/api/posts/',
+    'profile': lambda ctx, user: f"/api/users/{ctx.random.choice(ctx.usernames)}/",
+    'profile_posts': lambda ctx, user: f"/api/posts/user/{ctx.random.choice(ctx.usernames)}/",
+    'conversations': lambda ctx, user: '/api/chat/chats/',
+    'messages': lambda ctx, user: (
+        f'/api/chat/chats/{ctx.rooms[user.pk]}/messages/' if user.pk in ctx.rooms else None
+    ),
+    'notifications': lambda ctx, user: '/api/notifications/',
+    'trending': lambda ctx, user: '/api/posts/hashtags/trending/',
+}
+
+# Métricas en las que una subida por encima del umbral cuenta como regresión
+COMPARED_METRICS = ('p50_ms', 'p95_ms', 'queries_max')
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not values:
+        return 0.0
+    return values[max(ceil(pct / 100 * len(values)) - 1, 0)]
+
+
+class BenchmarkContext:
+    def __init__(self, users, seed):
+        self.random = random.Random(seed)
+        self.users = list(
+            User.objects.filter(username__startswith=SYNTHETIC_PREFIX).order_by('id')[:users]
+        )
+        self.usernames = [user.username for user in self.users]
+        self.tokens = {user.pk: str(AccessToken.for_user(user)) for user in self.users}
+        self.rooms = dict(
+            ChatRoom.participants.through.objects
+            .filter(user_id__in=self.tokens).values_list('user_id', 'chatroom_id')
+        )
+
+
+def _summary(timings, queries, errors):
+    timings = sorted(timings)
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'p99_ms': round(percentile(timings, 99), 2),
+        'mean_ms': round(statistics.fmean(timings), 2) if timings else 0.0,
+        'max_ms': round(timings[-1], 2) if timings else 0.0,
+        'queries_mean': round(statistics.fmean(queries), 1) if queries else 0.0,
+        'queries_max': max(queries, default=0),
+    }
+
+
+def run_benchmark(endpoints=None, requests=100, warmup=10, users=50, seed=0):
+    """
+    Mide cada endpoint con ``requests`` peticiones (tras ``warmup`` que no se
+    cuentan) repartidas entre ``users`` usuarios sintéticos.
+    """
+    ctx = BenchmarkContext(users, seed)
+    if not ctx.users:
+        raise ValueError('No hay datos sintéticos: ejecuta generate_synthetic_data')
+
+    # Host incluido en ALLOWED_HOSTS
+    client = Client(SERVER_NAME='localhost')
+    results = {}
+    for name in endpoints or ENDPOINTS:
+        build_url = ENDPOINTS[name]
+        timings, queries, errors = [], [], 0
+        for i in range(warmup + requests):
+            user = ctx.random.choice(ctx.users)
+            url = build_url(ctx, user)
+            if url is None:
+                continue
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url, HTTP_AUTHORIZATION=f'Bearer {ctx.tokens[user.pk]}')
+                elapsed = (time.perf_counter() - started) * 1000
+            if i < warmup:
+                continue
+            if response.status_code >= 400:
+                errors += 1
+            timings.append(elapsed)
+            queries.append(len(captured))
+        results[name] = _summary(timings, queries, errors)
+
+    return {
+        'meta': {
+            'created_at': timezone.now().isoformat(),
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'requests': requests,
+            'warmup': warmup,
+            'users': len(ctx.users),
+            'seed': seed,
+            'dataset': dataset_summary(),
+        },
+        'endpoints': results,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare_results(baseline, current, threshold=10.0):
+    """
+    Filas ``(endpoint, métrica, antes, ahora, % cambio, regresión)`` de los
+    endpoints presentes en ambos resultados.
+    """
+    rows = []
+    for name, now in current['endpoints'].items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = before[metric], now[metric]
+            change = (new - old) / old * 100 if old else (100.0 if new else 0.0)
+            if metric.startswith('queries'):
+                regression = new > old
+            else:
+                regression = change > threshold
+            rows.append((name, metric, old, new, round(change, 1), regression))
+    return rows
+
+
+def _consumer_db_call(user_ids, latency):
+    """Consulta típica de un consumer (contador de no leídas) más la latencia de red simulada"""
+    started = time.perf_counter()
+    Notification.objects.filter(recipient_id=random.choice(user_ids), is_read=False).count()
+    if latency:
+        time.sleep(latency)
+    return started
+
+
+def run_consumer_db_benchmark(workers_list, calls=2000, concurrency=200, latency_ms=0.0):
+    """
+    Lanza ``calls`` llamadas con ``concurrency`` corrutinas a la vez por cada
+    tamaño de pool y devuelve llamadas por segundo y espera en cola. ``0``
+    hilos equivale al hilo único de ``database_sync_to_async``.
+    """
+    from asgiref.sync import async_to_sync
+
+    user_ids = list(
+        User.objects.filter(username__startswith=SYNTHETIC_PREFIX).values_list('id', flat=True)[:1000]
+    ) or [0]
+    latency = latency_ms / 1000
+    call = consumer_db(_consumer_db_call)
+
+    async def run():
+        remaining = iter(range(calls))
+        waits = []
+
+        async def client():
+            for _ in remaining:
+                submitted = time.perf_counter()
+                waits.append((await call(user_ids, latency) - submitted) * 1000)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return time.perf_counter() - started, sorted(waits)
+
+    results = {}
+    try:
+        for workers in workers_list:
+            configure_executor(workers)
+            elapsed, waits = async_to_sync(run)()
+            results[workers] = {
+                'calls_per_second': round(calls / elapsed, 1),
+                'wait_p50_ms': round(percentile(waits, 50), 2),
+                'wait_p99_ms': round(percentile(waits, 99), 2),
+            }
+    finally:
+        configure_executor()
+        close_old_connections()
+    return results
+
+
+def load_results(path):
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_results(results, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+        f.write('\n')
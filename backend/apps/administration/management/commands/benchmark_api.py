@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.administration.benchmark import (
+    ENDPOINTS, compare_results, load_results, run_benchmark, save_results,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide latencia (p50/p95/p99) y consultas SQL de los endpoints principales sobre '
+        'los datos de generate_synthetic_data y guarda el resultado en JSON'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint',
+            action='append',
+            choices=sorted(ENDPOINTS),
+            help='Endpoint a medir (se puede repetir; por defecto todos)',
+        )
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por endpoint')
+        parser.add_argument('--warmup', type=int, default=20, help='Peticiones previas sin medir')
+        parser.add_argument('--users', type=int, default=50, help='Usuarios sintéticos distintos')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None, help='Fichero JSON para el resultado')
+        parser.add_argument('--compare', default=None, help='JSON de referencia con el que comparar')
+        parser.add_argument(
+            '--threshold',
+            type=float,
+            default=10.0,
+            help='Porcentaje de subida de la latencia que cuenta como regresión',
+        )
+        parser.add_argument(
+            '--fail-on-regression',
+            action='store_true',
+            help='Terminar con error si hay regresiones respecto a --compare',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            results = run_benchmark(
+                endpoints=options['endpoint'],
+                requests=options['requests'],
+                warmup=options['warmup'],
+                users=options['users'],
+                seed=options['seed'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{'endpoint':<16}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'errores':>9}"
+        )
+        for name, row in results['endpoints'].items():
+            self.stdout.write(
+                f"{name:<16}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                f"{row['queries_mean']:>9.1f}{row['errors']:>9}"
+            )
+
+        if options['output']:
+            save_results(results, options['output'])
+            self.stdout.write(f"Resultado guardado en {options['output']}")
+
+        if options['compare']:
+            regressions = self.compare(load_results(options['compare']), results, options['threshold'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f'{regressions} regresiones respecto a {options["compare"]}')
+
+    def compare(self, baseline, results, threshold):
+        self.stdout.write(f"\nComparación con {baseline['meta'].get('commit') or 'la referencia'}:")
+        regressions = 0
+        for name, metric, old, new, change, regression in compare_results(baseline, results, threshold):
+            line = f'{name:<16}{metric:<13}{old:>9}{new:>9}{change:>+8.1f}%'
+            if regression:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(f'{line}  REGRESIÓN'))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.administration.benchmark import run_consumer_db_benchmark
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide cuántas llamadas a base de datos por segundo atiende el pool de los consumers '
+        'según su número de hilos (CONSUMER_DB_WORKERS)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            default='0,1,2,4,8',
+            help='Tamaños de pool a probar, separados por comas (0 = hilo único de Channels)',
+        )
+        parser.add_argument('--calls', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=200, help='Llamadas simultáneas')
+        parser.add_argument(
+            '--latency-ms',
+            type=float,
+            default=0.0,
+            help='Latencia de red simulada por consulta (la base de datos local no la tiene)',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            workers = [int(value) for value in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError('--workers debe ser una lista de enteros separados por comas')
+
+        results = run_consumer_db_benchmark(
+            workers, options['calls'], options['concurrency'], options['latency_ms']
+        )
+        self.stdout.write(f"{'hilos':>6}{'llamadas/s':>12}{'espera p50':>12}{'espera p99':>12}")
+        for size, row in results.items():
+            self.stdout.write(
+                f"{size:>6}{row['calls_per_second']:>12.1f}"
+                f"{row['wait_p50_ms']:>12.1f}{row['wait_p99_ms']:>12.1f}"
+            )
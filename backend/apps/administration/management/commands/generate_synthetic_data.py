@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.administration.synthetic import (
+    SCALES, SYNTHETIC_PREFIX, User, clear_dataset, generate_dataset,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera usuarios, seguidores, posts, likes, comentarios, chats y notificaciones '
+        'sintéticos para los benchmarks. Escribe en la base de datos configurada: usar '
+        'solo en entornos desechables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=sorted(SCALES), default='small')
+        for name in SCALES['small']:
+            parser.add_argument(
+                f"--{name.replace('_', '-')}",
+                type=int,
+                default=None,
+                help=f'Sustituye el valor de la escala para {name}',
+            )
+        parser.add_argument('--days', type=int, default=90, help='Antigüedad máxima de las filas')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Borrar los datos sintéticos existentes antes de generar',
+        )
+        parser.add_argument(
+            '--clear-only',
+            action='store_true',
+            help='Solo borrar los datos sintéticos',
+        )
+
+    def handle(self, *args, **options):
+        if options['clear'] or options['clear_only']:
+            self.stdout.write(f'Filas borradas: {clear_dataset()}')
+            if options['clear_only']:
+                return
+        elif User.objects.filter(username__startswith=SYNTHETIC_PREFIX).exists():
+            raise CommandError('Ya hay datos sintéticos; usa --clear para regenerarlos')
+
+        sizes = {
+            name: options[name] if options[name] is not None else value
+            for name, value in SCALES[options['scale']].items()
+        }
+        summary = generate_dataset(
+            sizes,
+            days=options['days'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            stdout=self.stdout,
+        )
+        for name, count in summary.items():
+            self.stdout.write(f'{name}: {count}')
@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.administration.benchmark import save_results
+from apps.administration.ws_loadtest import SCENARIOS, run_loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        'Prueba de carga de los WebSockets de chat, directos y notificaciones con los '
+        'usuarios de generate_synthetic_data: tiempo de conexión, latencias p50/p99, '
+        'mensajes por segundo y CPU'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scenario',
+            action='append',
+            choices=SCENARIOS,
+            help='Escenario a ejecutar (se puede repetir; por defecto todos)',
+        )
+        parser.add_argument('--chatters', type=int, default=20, help='Usuarios en salas de chat')
+        parser.add_argument('--viewers', type=int, default=50, help='Espectadores del directo')
+        parser.add_argument('--recipients', type=int, default=50, help='Destinatarios de notificaciones')
+        parser.add_argument('--duration', type=float, default=10.0, help='Segundos enviando mensajes')
+        parser.add_argument('--rate', type=float, default=1.0, help='Mensajes por segundo y cliente')
+        parser.add_argument(
+            '--url',
+            default=None,
+            help='Servidor en marcha (p. ej. ws://localhost:8000); por defecto, en el propio proceso',
+        )
+        parser.add_argument(
+            '--server-pid',
+            type=int,
+            default=None,
+            help='PID del servidor para medir su CPU (con --url)',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default=None, help='Fichero JSON para el resultado')
+
+    def handle(self, *args, **options):
+        try:
+            results = run_loadtest(
+                scenarios=options['scenario'] or SCENARIOS,
+                chatters=options['chatters'],
+                viewers=options['viewers'],
+                recipients=options['recipients'],
+                duration=options['duration'],
+                rate=options['rate'],
+                url=options['url'],
+                server_pid=options['server_pid'],
+                seed=options['seed'],
+            )
+        except (ValueError, RuntimeError, ConnectionError) as e:
+            raise CommandError(str(e))
+
+        for name, row in results['scenarios'].items():
+            self.stdout.write(
+                f"{name}: {row['clients']} clientes, conexión p50={row['connect_p50_ms']:.1f}ms "
+                f"p99={row['connect_p99_ms']:.1f}ms, {row['messages_per_second']} msg/s, "
+                f"CPU {row['cpu_percent']}%, errores {row['errors']}"
+            )
+            for metric, latency in row['latency'].items():
+                self.stdout.write(
+                    f"  {metric}: p50={latency['p50_ms']:.1f}ms p99={latency['p99_ms']:.1f}ms "
+                    f"({latency['count']} mensajes)"
+                )
+
+        if options['output']:
+            save_results(results, options['output'])
+            self.stdout.write(f"Resultado guardado en {options['output']}")
@@ -0,0 +1,27 @@
+import math
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from config.db_router import measure_replica_lag
+
+
+class Command(BaseCommand):
+    help = (
+        'Escribe el heartbeat en el primario y muestra el retraso de cada réplica '
+        '(DB_REPLICAS) y si está en rotación'
+    )
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            self.stdout.write('No hay réplicas configuradas (DB_REPLICAS)')
+            return
+
+        lags = measure_replica_lag(settings.DATABASE_REPLICAS)
+        self.stdout.write(f"{'réplica':<12}{'retraso':>10}  estado")
+        for alias, lag in lags.items():
+            in_rotation = lag <= settings.DB_REPLICA_MAX_LAG
+            shown = 'sin datos' if math.isinf(lag) else f'{lag:.1f}s'
+            self.stdout.write(
+                f"{alias:<12}{shown:>10}  {'en rotación' if in_rotation else 'fuera de rotación'}"
+            )
@@ -0,0 +1,36 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.administration.stats import rollup_daily_stats
+
+
+class Command(BaseCommand):
+    help = 'Actualiza el resumen diario de actividad del dashboard (DailyStats)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Recalcular los últimos N días en lugar de continuar desde el último guardado',
+        )
+        parser.add_argument(
+            '--since',
+            default=None,
+            help='Recalcular desde esta fecha (AAAA-MM-DD)',
+        )
+
+    def handle(self, *args, **options):
+        start = None
+        if options['since']:
+            try:
+                start = date.fromisoformat(options['since'])
+            except ValueError:
+                raise CommandError('--since debe tener el formato AAAA-MM-DD')
+        elif options['days']:
+            start = timezone.localdate() - timedelta(days=options['days'] - 1)
+
+        days = rollup_daily_stats(start=start)
+        self.stdout.write(f'Días actualizados: {days}')
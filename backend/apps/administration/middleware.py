@@ -0,0 +1,85 @@
+"""
+Aplicación de la configuración del sitio a cada petición de la API.
+
+Lee la configuración de ``get_site_config`` (memoria del proceso), así que no
+añade consultas salvo para identificar al usuario durante el modo
+mantenimiento, en el que solo admins y moderadores pueden usar la API.
+"""
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+
+from apps.authentication.authentication import CachedJWTAuthentication
+from .site_config import get_site_config
+
+# Rutas disponibles aunque el sitio esté en mantenimiento
+MAINTENANCE_EXEMPT_PATHS = ('/api/auth/', '/api/administration/', '/api/metrics/')
+
+# Secciones completas de la API que se pueden desactivar
+FEATURE_PATHS = {
+    '/api/stories/': 'enable_stories',
+    '/api/chat/': 'enable_chat',
+    '/api/notifications/': 'enable_notifications',
+}
+
+# Acciones (nombre de la URL) que dependen de un permiso general; solo escrituras
+FEATURE_URL_NAMES = {
+    'register': 'allow_registration',
+    'post-list-create': 'allow_post_creation',
+    'share-post': 'allow_post_creation',
+    'comment-post': 'allow_comments',
+    'like-post': 'allow_likes',
+    'like-comment': 'allow_likes',
+    'follow-user': 'allow_follows',
+}
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class SiteConfigurationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.path.startswith('/api/'):
+            return self.get_response(request)
+
+        config = get_site_config()
+        if config.maintenance_mode and not request.path.startswith(MAINTENANCE_EXEMPT_PATHS):
+            if not self._is_staff(request):
+                response = JsonResponse({
+                    'error': config.maintenance_message or 'El sitio está en mantenimiento',
+                    'maintenance': True,
+                }, status=503)
+                response['Retry-After'] = '120'
+                return response
+
+        for prefix, flag in FEATURE_PATHS.items():
+            if request.path.startswith(prefix) and not getattr(config, flag):
+                return self._disabled(flag)
+
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS or not request.path.startswith('/api/'):
+            return None
+        flag = FEATURE_URL_NAMES.get(request.resolver_match.url_name)
+        if flag and not getattr(get_site_config(), flag):
+            return self._disabled(flag)
+        return None
+
+    def _disabled(self, flag):
+        return JsonResponse({
+            'error': 'Esta función está desactivada temporalmente',
+            'feature': flag,
+        }, status=403)
+
+    def _is_staff(self, request):
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        if result is None:
+            user = getattr(request, 'user', None)
+        else:
+            user = result[0]
+        return bool(user and user.is_authenticated and user.is_staff_member())
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administration', '0002_rename_enable_comments_siteconfiguration_allow_comments_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('new_users', models.PositiveIntegerField(default=0)),
+                ('new_posts', models.PositiveIntegerField(default=0)),
+                ('new_comments', models.PositiveIntegerField(default=0)),
+                ('new_likes', models.PositiveIntegerField(default=0)),
+                ('active_users', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Daily Stats',
+                'verbose_name_plural': 'Daily Stats',
+                'ordering': ['date'],
+            },
+        ),
+    ]
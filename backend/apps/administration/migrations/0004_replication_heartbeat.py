@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-19 16:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('administration', '0003_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReplicationHeartbeat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('beat_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Replication Heartbeat',
+            },
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -93,8 +93,56 @@ class SiteConfiguration(models.Model):
     def __str__(self):
         return f"Site Configuration - Updated: {self.updated_at}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from .site_config import invalidate_site_config
+        transaction.on_commit(invalidate_site_config)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from .site_config import invalidate_site_config
+        transaction.on_commit(invalidate_site_config)
+        return result
+
     @classmethod
     def get_config(cls):
-        """Obtiene o crea la configuración del sitio"""
-        config, created = cls.objects.get_or_create(pk=1)
-        return config
+        """Obtiene (o crea) la configuración del sitio desde la copia en memoria"""
+        from .site_config import get_site_config
+        return get_site_config()
+
+
+class DailyStats(models.Model):
+    """
+    Resumen de actividad por día, rellenado de forma incremental con
+    ``python manage.py rollup_daily_stats`` para las gráficas del dashboard.
+    """
+    date = models.DateField(unique=True)
+    new_users = models.PositiveIntegerField(default=0)
+    new_posts = models.PositiveIntegerField(default=0)
+    new_comments = models.PositiveIntegerField(default=0)
+    new_likes = models.PositiveIntegerField(default=0)
+    # Usuarios distintos que publicaron, comentaron o dieron like ese día
+    active_users = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        verbose_name = 'Daily Stats'
+        verbose_name_plural = 'Daily Stats'
+
+    def __str__(self):
+        return f"Stats {self.date}"
+
+
+class ReplicationHeartbeat(models.Model):
+    """
+    Fila única que ``config.db_router`` actualiza en el primario; su valor en
+    cada réplica indica cuánto retraso lleva la replicación.
+    """
+    beat_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Replication Heartbeat'
+
+    def __str__(self):
+        return f"Heartbeat {self.beat_at}"
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models import Count, Q
 from django.utils import timezone
@@ -90,6 +91,25 @@ class UserAdminSerializer(serializers.ModelSerializer):
         return Like.objects.filter(user=obj).count()
 
 
+class BulkUserActionSerializer(serializers.Serializer):
+    """Datos de las acciones masivas sobre usuarios"""
+    user_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    reason = serializers.CharField(required=False, allow_blank=True)
+    role = serializers.ChoiceField(choices=User.ROLE_CHOICES, required=False)
+
+    def validate_user_ids(self, value):
+        if len(value) > settings.ADMIN_BULK_MAX_USERS:
+            raise serializers.ValidationError(
+                f'Máximo {settings.ADMIN_BULK_MAX_USERS} usuarios por operación'
+            )
+        return value
+
+    def validate(self, data):
+        if self.context.get('require_role') and not data.get('role'):
+            raise serializers.ValidationError({'role': 'Rol inválido'})
+        return data
+
+
 class DashboardStatsSerializer(serializers.Serializer):
     """Serializer para estadísticas del dashboard"""
     # Estadísticas generales
@@ -99,7 +119,7 @@ class DashboardStatsSerializer(serializers.Serializer):
     total_likes = serializers.IntegerField()
     total_stories = serializers.IntegerField()
     
-    # Usuarios
+    # Usuarios (activos: sesión iniciada, posts o comentarios en los últimos 30 días)
     active_users = serializers.IntegerField()
     new_users_today = serializers.IntegerField()
     new_users_week = serializers.IntegerField()
@@ -121,6 +141,17 @@ class DashboardStatsSerializer(serializers.Serializer):
     user_count = serializers.IntegerField()
 
 
+class DailyStatsSerializer(serializers.Serializer):
+    """Punto de las series diarias del dashboard"""
+    date = serializers.DateField()
+    new_users = serializers.IntegerField()
+    new_posts = serializers.IntegerField()
+    new_comments = serializers.IntegerField()
+    new_likes = serializers.IntegerField()
+    # Usuarios con posts o comentarios ese día
+    active_users = serializers.IntegerField()
+
+
 class UserStatsSerializer(serializers.Serializer):
     """Estadísticas de usuarios"""
     total_users = serializers.IntegerField()
@@ -0,0 +1,63 @@
+"""
+Configuración del sitio en memoria.
+
+``get_site_config`` devuelve una copia de ``SiteConfiguration`` guardada en el
+proceso. Durante ``SITE_CONFIG_LOCAL_TTL`` segundos se usa sin consultar nada;
+después solo se compara la versión publicada en la caché compartida
+(``site_config:version``) y se recarga si cambió. Guardar la configuración
+incrementa esa versión tras el commit, de modo que todos los workers ven el
+cambio en unos segundos sin ir a la base de datos en cada petición. Si la
+caché no es compartida entre procesos (locmem), la copia se recarga de la base
+de datos como mucho cada ``SITE_CONFIG_MAX_AGE`` segundos.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+VERSION_KEY = 'site_config:version'
+SNAPSHOT_KEY = 'site_config:snapshot:{}'
+
+_local = {'config': None, 'version': None, 'checked_at': 0.0, 'loaded_at': 0.0}
+_lock = threading.Lock()
+
+
+def get_site_config():
+    """Configuración actual del sitio (instancia de solo lectura compartida)"""
+    now = time.monotonic()
+    config = _local['config']
+    if config is not None and now - _local['checked_at'] < settings.SITE_CONFIG_LOCAL_TTL:
+        return config
+
+    with _lock:
+        version = cache.get(VERSION_KEY)
+        fresh = now - _local['loaded_at'] < settings.SITE_CONFIG_MAX_AGE
+        if _local['config'] is None or version is None or version != _local['version'] or not fresh:
+            _load(version)
+        _local['checked_at'] = now
+        return _local['config']
+
+
+def _load(version):
+    from .models import SiteConfiguration
+
+    if version is None:
+        cache.add(VERSION_KEY, 1, None)
+        version = cache.get(VERSION_KEY, 1)
+
+    config = cache.get(SNAPSHOT_KEY.format(version))
+    if config is None or time.monotonic() - _local['loaded_at'] >= settings.SITE_CONFIG_MAX_AGE:
+        config, _ = SiteConfiguration.objects.get_or_create(pk=1)
+        cache.set(SNAPSHOT_KEY.format(version), config, settings.SITE_CONFIG_MAX_AGE)
+
+    _local.update(config=config, version=version, loaded_at=time.monotonic())
+
+
+def invalidate_site_config():
+    """Publica una nueva versión para que todos los workers recarguen la configuración"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+    _local.update(config=None, version=None, checked_at=0.0, loaded_at=0.0)
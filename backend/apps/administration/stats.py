@@ -0,0 +1,163 @@
+"""
+Estadísticas del dashboard de administración.
+
+``dashboard_stats`` calcula los totales con agregación condicional (una
+consulta por tabla) y guarda el resultado en la caché
+``ADMIN_STATS_CACHE_TTL`` segundos. Las series diarias salen de
+``DailyStats``, que ``rollup_daily_stats`` rellena día a día sin volver a
+recorrer el histórico.
+"""
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from apps.posts.models import Comment, Like, Post
+from apps.stories.models import Story
+from .models import DailyStats
+
+User = get_user_model()
+
+STATS_CACHE_KEY = 'administration:dashboard:stats'
+ROLLUP_FIELDS = ['new_users', 'new_posts', 'new_comments', 'new_likes', 'active_users']
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def active_user_ids(since, until=None):
+    """
+    Subconsultas con los autores de posts y comentarios del periodo. Dar like
+    no cuenta como actividad (misma definición que tenía el dashboard).
+    """
+    period = Q(created_at__gte=since)
+    if until is not None:
+        period &= Q(created_at__lt=until)
+    return (
+        Post.objects.filter(period).values('author_id'),
+        Comment.objects.filter(period).values('author_id'),
+    )
+
+
+def dashboard_stats():
+    stats = cache.get(STATS_CACHE_KEY)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(STATS_CACHE_KEY, stats, settings.ADMIN_STATS_CACHE_TTL)
+    return stats
+
+
+def compute_dashboard_stats():
+    today_start = _day_start(timezone.localdate())
+    week_start = today_start - timedelta(days=7)
+    month_start = today_start - timedelta(days=30)
+    posts_by, comments_by = active_user_ids(month_start)
+
+    # Usuarios activos: han iniciado sesión o creado contenido en los últimos 30 días
+    users = User.objects.aggregate(
+        total_users=Count('id'),
+        active_users=Count('id', filter=(
+            Q(last_login__gte=month_start)
+            | Q(id__in=posts_by) | Q(id__in=comments_by)
+        )),
+        new_users_today=Count('id', filter=Q(created_at__gte=today_start)),
+        new_users_week=Count('id', filter=Q(created_at__gte=week_start)),
+        new_users_month=Count('id', filter=Q(created_at__gte=month_start)),
+        banned_users=Count('id', filter=Q(is_banned=True)),
+        admin_count=Count('id', filter=Q(role='admin')),
+        moderator_count=Count('id', filter=Q(role='moderator')),
+        user_count=Count('id', filter=Q(role='user')),
+    )
+    posts = Post.objects.aggregate(
+        total_posts=Count('id'),
+        new_posts_today=Count('id', filter=Q(created_at__gte=today_start)),
+        new_posts_week=Count('id', filter=Q(created_at__gte=week_start)),
+        new_posts_month=Count('id', filter=Q(created_at__gte=month_start)),
+    )
+    comments = Comment.objects.aggregate(
+        total_comments=Count('id'),
+        new_comments_today=Count('id', filter=Q(created_at__gte=today_start)),
+    )
+    likes = Like.objects.aggregate(
+        total_likes=Count('id'),
+        new_likes_today=Count('id', filter=Q(created_at__gte=today_start)),
+    )
+    return {
+        **users, **posts, **comments, **likes,
+        'total_stories': Story.objects.count(),
+    }
+
+
+def _count_by_day(queryset, start):
+    return dict(
+        queryset.filter(created_at__gte=start)
+        .annotate(day=TruncDate('created_at'))
+        .order_by().values('day').annotate(count=Count('id'))
+        .values_list('day', 'count')
+    )
+
+
+def rollup_daily_stats(start=None, end=None):
+    """
+    Recalcula las filas de ``DailyStats`` entre ``start`` y ``end`` (fechas
+    locales, incluidas). Por defecto continúa desde el último día guardado,
+    que se repite porque pudo quedar a medias, hasta hoy. Devuelve los días
+    actualizados.
+    """
+    end = end or timezone.localdate()
+    if start is None:
+        last = DailyStats.objects.order_by('-date').values_list('date', flat=True).first()
+        start = last or end - timedelta(days=settings.ADMIN_STATS_ROLLUP_DAYS - 1)
+    if start > end:
+        return 0
+
+    since = _day_start(start)
+    counts = {
+        'new_users': _count_by_day(User.objects.all(), since),
+        'new_posts': _count_by_day(Post.objects.all(), since),
+        'new_comments': _count_by_day(Comment.objects.all(), since),
+        'new_likes': _count_by_day(Like.objects.all(), since),
+    }
+
+    rows = []
+    day = start
+    while day <= end:
+        posts_by, comments_by = active_user_ids(
+            _day_start(day), _day_start(day + timedelta(days=1))
+        )
+        active = User.objects.filter(
+            Q(id__in=posts_by) | Q(id__in=comments_by)
+        ).count()
+        rows.append(DailyStats(
+            date=day,
+            active_users=active,
+            **{field: by_day.get(day, 0) for field, by_day in counts.items()},
+        ))
+        day += timedelta(days=1)
+
+    DailyStats.objects.bulk_create(
+        rows, update_conflicts=True, unique_fields=['date'],
+        update_fields=ROLLUP_FIELDS + ['updated_at'],
+    )
+    return len(rows)
+
+
+def daily_series(days):
+    """Filas de los últimos ``days`` días, con ceros en los días sin resumen"""
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+    stored = {
+        row['date']: row
+        for row in DailyStats.objects.filter(date__gte=start).values('date', *ROLLUP_FIELDS)
+    }
+    return [
+        stored.get(start + timedelta(days=i)) or {
+            'date': start + timedelta(days=i), **dict.fromkeys(ROLLUP_FIELDS, 0)
+        }
+        for i in range(days)
+    ]
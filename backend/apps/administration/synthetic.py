@@ -0,0 +1,298 @@
+"""
+Datos sintéticos para benchmarks.
+
+``generate_dataset`` crea con ``bulk_create`` usuarios, un grafo de
+seguidores con distribución de ley de potencias (pocos usuarios muy seguidos,
+la mayoría con pocos seguidores), posts con hashtags, likes, comentarios,
+chats con mensajes y notificaciones, repartidos en los últimos ``days`` días.
+Todo lo generado lleva el prefijo ``SYNTHETIC_PREFIX`` en el nombre de
+usuario (y de hashtag), de modo que ``clear_dataset`` lo borra sin tocar los
+datos reales. Con la misma semilla el resultado es el mismo.
+"""
+import itertools
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from apps.chat.models import ChatRoom, Message
+from apps.posts.models import Comment, Hashtag, Like, Post, PostHashtag
+from apps.users.models import Follow
+from notifications.models import Notification
+
+User = get_user_model()
+
+SYNTHETIC_PREFIX = 'synth_'
+SYNTHETIC_PASSWORD = 'synthetic-pass'
+
+# Totales por escala; ``follows`` es la media de usuarios seguidos por usuario
+SCALES = {
+    'small': {
+        'users': 200, 'follows': 20, 'posts': 2_000, 'hashtags': 50, 'likes': 10_000,
+        'comments': 4_000, 'chat_rooms': 100, 'messages': 2_000, 'notifications': 5_000,
+    },
+    'medium': {
+        'users': 2_000, 'follows': 50, 'posts': 40_000, 'hashtags': 300, 'likes': 200_000,
+        'comments': 80_000, 'chat_rooms': 1_500, 'messages': 50_000, 'notifications': 100_000,
+    },
+    'large': {
+        'users': 20_000, 'follows': 100, 'posts': 500_000, 'hashtags': 2_000,
+        'likes': 2_500_000, 'comments': 1_000_000, 'chat_rooms': 20_000,
+        'messages': 1_000_000, 'notifications': 1_500_000,
+    },
+}
+
+FIRST_NAMES = ['Ana', 'Luis', 'Marta', 'Javier', 'Lucía', 'Carlos', 'Elena', 'Pablo', 'Sara', 'Diego']
+LAST_NAMES = ['García', 'López', 'Martín', 'Sánchez', 'Pérez', 'Gómez', 'Ruiz', 'Díaz', 'Moreno']
+WORDS = [
+    'hoy', 'viaje', 'música', 'café', 'proyecto', 'concierto', 'partido', 'receta',
+    'playa', 'montaña', 'libro', 'serie', 'foto', 'amigos', 'trabajo', 'ciudad',
+]
+TAG_WORDS = ['viajes', 'musica', 'futbol', 'cocina', 'tech', 'arte', 'cine', 'moda', 'fotografia']
+
+
+@contextmanager
+def explicit_created_at(*models):
+    """
+    Permite fijar ``created_at`` en bulk_create (auto_now_add lo sobrescribe).
+    Cambia el campo del modelo para todo el proceso, no solo para este hilo:
+    usar solo en comandos de generación de datos, nunca dentro del servidor.
+    """
+    fields = [model._meta.get_field('created_at') for model in models]
+    previous = [field.auto_now_add for field in fields]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in zip(fields, previous):
+            field.auto_now_add = value
+
+
+class DatasetGenerator:
+    def __init__(self, sizes, days=90, seed=0, batch_size=5000, stdout=None):
+        self.sizes = sizes
+        self.days = days
+        self.random = random.Random(seed)
+        self.batch_size = batch_size
+        self.stdout = stdout
+        self.now = timezone.now()
+
+    def log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def moment(self, after=None):
+        """Fecha aleatoria del periodo, posterior a ``after`` si se indica"""
+        start = after or self.now - timedelta(days=self.days)
+        seconds = max(int((self.now - start).total_seconds()), 1)
+        return start + timedelta(seconds=self.random.randint(0, seconds))
+
+    def sentence(self, words=8, tags=()):
+        text = ' '.join(self.random.choice(WORDS) for _ in range(words)).capitalize()
+        return ' '.join([text, *(f'#{tag}' for tag in tags)])
+
+    def popular(self, population, cum_weights, k):
+        """``k`` elementos elegidos según la popularidad (ley de potencias)"""
+        return self.random.choices(population, cum_weights=cum_weights, k=k)
+
+    def bulk(self, model, objects, **kwargs):
+        created = 0
+        iterator = iter(objects)
+        while True:
+            batch = list(itertools.islice(iterator, self.batch_size))
+            if not batch:
+                return created
+            model.objects.bulk_create(batch, **kwargs)
+            created += len(batch)
+
+    def run(self):
+        started = time.perf_counter()
+        with explicit_created_at(User, Follow, Post, Like, Comment, ChatRoom, Message, Notification):
+            users = self.create_users()
+            self.create_follows(users)
+            posts = self.create_posts(users)
+            self.create_likes(users, posts)
+            self.create_comments(users, posts)
+            self.create_chats(users)
+            self.create_notifications(users, posts)
+        self.log(f'Datos generados en {time.perf_counter() - started:.1f}s')
+        return dataset_summary()
+
+    def create_users(self):
+        count = self.sizes['users']
+        password = make_password(SYNTHETIC_PASSWORD)
+        self.bulk(User, (
+            User(
+                username=f'{SYNTHETIC_PREFIX}{i}',
+                email=f'{SYNTHETIC_PREFIX}{i}@example.com',
+                email_domain='example.com',
+                password=password,
+                first_name=self.random.choice(FIRST_NAMES),
+                last_name=self.random.choice(LAST_NAMES),
+                bio=self.sentence(6),
+                created_at=self.moment(),
+            )
+            for i in range(count)
+        ))
+        ids = list(
+            User.objects.filter(username__startswith=SYNTHETIC_PREFIX)
+            .order_by('id').values_list('id', flat=True)
+        )
+        self.random.shuffle(ids)
+        # Peso 1/rango^1.1: el primero de la lista es el usuario más popular
+        self.user_weights = list(itertools.accumulate(1 / (rank + 1) ** 1.1 for rank in range(len(ids))))
+        self.log(f'Usuarios: {len(ids)}')
+        return ids
+
+    def create_follows(self, users):
+        def follows():
+            for follower in users:
+                # Número de seguidos con cola larga alrededor de la media pedida
+                count = min(int(self.random.paretovariate(2) * self.sizes['follows'] / 2), len(users) - 1)
+                targets = set(self.popular(users, self.user_weights, count)) - {follower}
+                for following in targets:
+                    yield Follow(follower_id=follower, following_id=following, created_at=self.moment())
+
+        self.log(f'Seguimientos: {self.bulk(Follow, follows(), ignore_conflicts=True)}')
+
+    def create_posts(self, users):
+        tags = [f'{SYNTHETIC_PREFIX}{self.random.choice(TAG_WORDS)}{i}' for i in range(self.sizes['hashtags'])]
+        tag_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(tags))))
+        authors = self.popular(users, self.user_weights, self.sizes['posts'])
+        post_tags = [
+            set(self.random.choices(tags, cum_weights=tag_weights, k=self.random.randint(0, 3)))
+            for _ in authors
+        ]
+        self.bulk(Post, (
+            Post(author_id=author, content=self.sentence(12, sorted(used)), created_at=self.moment())
+            for author, used in zip(authors, post_tags)
+        ))
+        posts = list(
+            Post.objects.filter(author__username__startswith=SYNTHETIC_PREFIX)
+            .order_by('id').values_list('id', 'created_at')
+        )
+
+        usage = {}
+        for used in post_tags:
+            for tag in sorted(used):
+                usage[tag] = usage.get(tag, 0) + 1
+        self.bulk(Hashtag, (
+            Hashtag(name=tag, slug=tag.replace('_', '-'), usage_count=count)
+            for tag, count in usage.items()
+        ), ignore_conflicts=True)
+        hashtag_ids = dict(Hashtag.objects.filter(name__in=usage).values_list('name', 'id'))
+        self.bulk(PostHashtag, (
+            PostHashtag(post_id=post_id, hashtag_id=hashtag_ids[tag])
+            for (post_id, _), used in zip(posts, post_tags)
+            for tag in used
+        ), ignore_conflicts=True)
+        self.log(f'Posts: {len(posts)}, hashtags: {len(usage)}')
+        return posts
+
+    def create_likes(self, users, posts):
+        likes = (
+            Like(user_id=user, post_id=post_id, created_at=self.moment(created_at))
+            for user, (post_id, created_at) in zip(
+                self.popular(users, self.user_weights, self.sizes['likes']),
+                self.random.choices(posts, k=self.sizes['likes']),
+            )
+        )
+        self.log(f'Likes: {self.bulk(Like, likes, ignore_conflicts=True)}')
+
+    def create_comments(self, users, posts):
+        comments = (
+            Comment(author_id=user, post_id=post_id, content=self.sentence(6),
+                    created_at=self.moment(created_at))
+            for user, (post_id, created_at) in zip(
+                self.random.choices(users, k=self.sizes['comments']),
+                self.random.choices(posts, k=self.sizes['comments']),
+            )
+        )
+        self.log(f'Comentarios: {self.bulk(Comment, comments)}')
+
+    def create_chats(self, users):
+        count = self.sizes['chat_rooms']
+        if count == 0 or len(users) < 2:
+            return
+        pairs = [tuple(self.random.sample(users, 2)) for _ in range(count)]
+        created = [self.moment() for _ in pairs]
+        rooms = ChatRoom.objects.bulk_create(
+            [ChatRoom(created_at=moment) for moment in created], batch_size=self.batch_size
+        )
+        if rooms[0].pk is None:
+            # Backends sin RETURNING: se recuperan las salas recién creadas
+            rooms = list(ChatRoom.objects.order_by('-id')[:count])[::-1]
+
+        Through = ChatRoom.participants.through
+        self.bulk(Through, (
+            Through(chatroom_id=room.pk, user_id=user)
+            for room, pair in zip(rooms, pairs)
+            for user in pair
+        ))
+        per_room = self.random.choices(range(count), k=self.sizes['messages'])
+        self.bulk(Message, (
+            Message(
+                chat_room_id=rooms[index].pk,
+                sender_id=self.random.choice(pairs[index]),
+                content=self.sentence(8),
+                is_read=self.random.random() < 0.7,
+                created_at=self.moment(created[index]),
+            )
+            for index in per_room
+        ))
+        self.log(f'Chats: {count}, mensajes: {len(per_room)}')
+
+    def create_notifications(self, users, posts):
+        types = ['like', 'comment', 'follow']
+
+        def notifications():
+            for _ in range(self.sizes['notifications']):
+                notification_type = self.random.choice(types)
+                post_id, created_at = self.random.choice(posts)
+                yield Notification(
+                    recipient_id=self.random.choice(users),
+                    sender_id=self.random.choice(users),
+                    notification_type=notification_type,
+                    title='Actividad',
+                    message=self.sentence(5),
+                    is_read=self.random.random() < 0.8,
+                    related_post_id=None if notification_type == 'follow' else post_id,
+                    created_at=self.moment(created_at),
+                )
+
+        self.log(f'Notificaciones: {self.bulk(Notification, notifications())}')
+
+
+def generate_dataset(sizes, days=90, seed=0, batch_size=5000, stdout=None):
+    """Genera un conjunto de datos sintético y devuelve el número de filas por tabla"""
+    with transaction.atomic():
+        return DatasetGenerator(sizes, days, seed, batch_size, stdout).run()
+
+
+def dataset_summary():
+    users = User.objects.filter(username__startswith=SYNTHETIC_PREFIX)
+    return {
+        'users': users.count(),
+        'follows': Follow.objects.filter(follower__in=users).count(),
+        'posts': Post.objects.filter(author__in=users).count(),
+        'hashtags': Hashtag.objects.filter(name__startswith=SYNTHETIC_PREFIX).count(),
+        'likes': Like.objects.filter(user__in=users).count(),
+        'comments': Comment.objects.filter(author__in=users).count(),
+        'chat_rooms': ChatRoom.objects.filter(participants__in=users).distinct().count(),
+        'messages': Message.objects.filter(sender__in=users).count(),
+        'notifications': Notification.objects.filter(recipient__in=users).count(),
+    }
+
+
+def clear_dataset():
+    """Borra todo lo generado (los usuarios arrastran sus filas en cascada)"""
+    with transaction.atomic():
+        ChatRoom.objects.filter(participants__username__startswith=SYNTHETIC_PREFIX).delete()
+        Hashtag.objects.filter(name__startswith=SYNTHETIC_PREFIX).delete()
+        return User.objects.filter(username__startswith=SYNTHETIC_PREFIX).delete()[0]
@@ -0,0 +1,322 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.posts.models import Comment, Like, Post
+from apps.users.auth_cache import auth_cache_key
+from apps.users.testing import create_user
+from config import tiered_cache
+from .benchmark import compare_results, run_benchmark
+from .models import AdminLog, DailyStats, SiteConfiguration
+from .site_config import get_site_config, invalidate_site_config
+from .stats import compute_dashboard_stats, rollup_daily_stats
+from .synthetic import clear_dataset, generate_dataset
+from .ws_loadtest import run_loadtest
+
+User = get_user_model()
+
+
+class DashboardStatsTests(TestCase):
+    """Tests de las estadísticas del dashboard y del resumen diario"""
+
+    def setUp(self):
+        cache.clear()
+        self.moderator = create_user('moderator', role='moderator')
+        self.author = create_user('author')
+        self.banned = create_user('banned', is_banned=True)
+        self.old = create_user('old')
+        User.objects.filter(pk=self.old.pk).update(created_at=timezone.now() - timedelta(days=60))
+
+        post = Post.objects.create(author=self.author, content='hola')
+        Comment.objects.create(post=post, author=self.author, content='c')
+        Like.objects.create(post=post, user=self.banned)
+        old_post = Post.objects.create(author=self.old, content='viejo')
+        Post.objects.filter(pk=old_post.pk).update(created_at=timezone.now() - timedelta(days=3))
+
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.moderator)
+
+    def test_stats_use_grouped_queries(self):
+        with self.assertNumQueries(5):
+            stats = compute_dashboard_stats()
+
+        self.assertEqual(stats['total_users'], 4)
+        self.assertEqual(stats['new_users_month'], 3)
+        self.assertEqual(stats['banned_users'], 1)
+        self.assertEqual(stats['moderator_count'], 1)
+        self.assertEqual(stats['total_posts'], 2)
+        self.assertEqual(stats['new_posts_week'], 2)
+        self.assertEqual(stats['new_comments_today'], 1)
+        self.assertEqual(stats['new_likes_today'], 1)
+        # author (post y comentario) y old (post hace 3 días); un like no cuenta
+        self.assertEqual(stats['active_users'], 2)
+
+    def test_stats_endpoint_is_cached(self):
+        response = self.client.get('/api/administration/dashboard/stats/')
+        self.assertEqual(response.data['total_posts'], 2)
+
+        Post.objects.create(author=self.author, content='otro')
+        response = self.client.get('/api/administration/dashboard/stats/')
+        self.assertEqual(response.data['total_posts'], 2)
+
+    def test_rollup_is_incremental(self):
+        today = timezone.localdate()
+        self.assertEqual(rollup_daily_stats(start=today - timedelta(days=4)), 5)
+
+        row = DailyStats.objects.get(date=today)
+        self.assertEqual((row.new_posts, row.new_comments, row.new_likes, row.active_users), (1, 1, 1, 1))
+        self.assertEqual(DailyStats.objects.get(date=today - timedelta(days=3)).new_posts, 1)
+
+        # La siguiente ejecución solo repite el último día guardado
+        Post.objects.create(author=self.author, content='otro')
+        self.assertEqual(rollup_daily_stats(), 1)
+        self.assertEqual(DailyStats.objects.get(date=today).new_posts, 2)
+
+    def test_timeseries_fills_missing_days(self):
+        rollup_daily_stats(start=timezone.localdate())
+        response = self.client.get('/api/administration/dashboard/timeseries/?days=90')
+
+        self.assertEqual(len(response.data), 90)
+        self.assertEqual(response.data[0]['new_posts'], 0)
+        self.assertEqual(response.data[-1]['new_posts'], 1)
+        self.assertEqual(
+            self.client.get('/api/administration/dashboard/timeseries/?days=x').status_code, 400
+        )
+
+
+class UserModerationTests(TestCase):
+    """Tests de la búsqueda de usuarios y las acciones masivas"""
+
+    def setUp(self):
+        self.admin = create_user('admin', role='admin')
+        self.moderator = create_user('moderator', role='moderator')
+        self.spammers = [create_user(f'spam{i}') for i in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.moderator)
+
+    def test_search_by_prefix(self):
+        create_user('Alice')
+        response = self.client.get('/api/administration/users/?search=SPAM')
+        self.assertEqual(len(response.data['results']), 5)
+
+        response = self.client.get('/api/administration/users/?search=alice@')
+        self.assertEqual([user['username'] for user in response.data['results']], ['Alice'])
+
+        response = self.client.get('/api/administration/users/?search=pam')
+        self.assertEqual(response.data['results'], [])
+
+    def test_search_by_email_domain_and_substring(self):
+        for username, email in [('ana', 'ana@Spam-Wave.net'), ('luis', 'luis@spam-wave.org')]:
+            User.objects.create_user(username=username, email=email, password='testpass123')
+
+        response = self.client.get('/api/administration/users/?search=spam-wave.NET')
+        self.assertEqual([user['username'] for user in response.data['results']], ['ana'])
+
+        response = self.client.get('/api/administration/users/?search=@spam-wave')
+        self.assertEqual({user['username'] for user in response.data['results']}, {'ana', 'luis'})
+
+        # Subcadena en cualquier posición solo bajo petición
+        response = self.client.get('/api/administration/users/?search=pam&match=contains')
+        self.assertEqual(len(response.data['results']), 7)
+
+    def test_bulk_ban_uses_one_update(self):
+        ids = [user.id for user in self.spammers] + [self.admin.id, self.moderator.id]
+        cache.set(auth_cache_key(self.spammers[0].id), {'stale': True})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/administration/users/bulk_ban/', {
+                'user_ids': ids, 'reason': 'spam'
+            }, format='json')
+
+        # Ni a sí mismo ni a un admin siendo moderador
+        self.assertEqual(response.data, {'updated': 5, 'skipped': 2})
+        self.assertEqual(User.objects.filter(is_banned=True, ban_reason='spam').count(), 5)
+        self.assertEqual(AdminLog.objects.filter(action='user_ban').count(), 5)
+        self.assertIsNone(cache.get(auth_cache_key(self.spammers[0].id)))
+
+        response = self.client.post('/api/administration/users/bulk_unban/', {
+            'user_ids': ids
+        }, format='json')
+        self.assertEqual(response.data['updated'], 5)
+        self.assertFalse(User.objects.filter(is_banned=True).exists())
+
+    def test_bulk_ban_refreshes_cached_profile(self):
+        """El UPDATE masivo no lanza post_save: el perfil en caché se invalida igualmente"""
+        cache.clear()
+        tiered_cache.clear_local()
+        self.addCleanup(tiered_cache.clear_local)
+        url = f'/api/users/{self.spammers[0].username}/'
+        self.assertFalse(self.client.get(url).data['is_banned'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/administration/users/bulk_ban/', {
+                'user_ids': [self.spammers[0].id], 'reason': 'spam'
+            }, format='json')
+        self.assertTrue(self.client.get(url).data['is_banned'])
+
+    def test_bulk_ban_query_count_does_not_grow(self):
+        more = [create_user(f'wave{i}') for i in range(20)]
+        get_site_config()
+        with self.assertNumQueries(5):
+            self.client.post('/api/administration/users/bulk_ban/', {
+                'user_ids': [user.id for user in self.spammers]
+            }, format='json')
+        with self.assertNumQueries(5):
+            self.client.post('/api/administration/users/bulk_ban/', {
+                'user_ids': [user.id for user in more]
+            }, format='json')
+
+    def test_bulk_change_role_requires_admin(self):
+        ids = [user.id for user in self.spammers]
+        response = self.client.post('/api/administration/users/bulk_change_role/', {
+            'user_ids': ids, 'role': 'moderator'
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.post('/api/administration/users/bulk_change_role/', {
+            'user_ids': ids, 'role': 'moderator'
+        }, format='json')
+        self.assertEqual(response.data['updated'], 5)
+        self.assertEqual(User.objects.filter(role='moderator').count(), 6)
+
+    @override_settings(ADMIN_BULK_MAX_USERS=3)
+    def test_bulk_limit(self):
+        response = self.client.post('/api/administration/users/bulk_ban/', {
+            'user_ids': [user.id for user in self.spammers]
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SiteConfigurationTests(TestCase):
+    """Tests de la configuración del sitio en memoria y su aplicación"""
+
+    def setUp(self):
+        cache.clear()
+        # La copia en memoria sobrevive al rollback de cada test
+        self.addCleanup(invalidate_site_config)
+        self.user = create_user('user')
+        self.admin = create_user('admin', role='admin')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def update_config(self, **fields):
+        config = SiteConfiguration.objects.get_or_create(pk=1)[0]
+        for field, value in fields.items():
+            setattr(config, field, value)
+        with self.captureOnCommitCallbacks(execute=True):
+            config.save()
+
+    def test_config_is_served_from_memory(self):
+        get_site_config()
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                get_site_config()
+
+    def test_save_publishes_new_version(self):
+        self.assertTrue(get_site_config().allow_likes)
+        self.update_config(allow_likes=False)
+        self.assertFalse(get_site_config().allow_likes)
+
+    def test_feature_switches(self):
+        self.update_config(allow_post_creation=False, enable_stories=False)
+
+        response = self.client.post('/api/posts/', {'content': 'hola'})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()['feature'], 'allow_post_creation')
+        # Leer sigue permitido
+        self.assertEqual(self.client.get('/api/posts/').status_code, 200)
+        self.assertEqual(self.client.get('/api/stories/').status_code, 403)
+
+    def test_maintenance_mode_only_lets_staff_in(self):
+        self.update_config(maintenance_mode=True, maintenance_message='Volvemos pronto')
+
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['error'], 'Volvemos pronto')
+
+        # Con JWT, como el frontend
+        login = self.client.post('/api/auth/login/', {
+            'email': 'admin@test.com', 'password': 'testpass123'
+        })
+        self.client.force_authenticate(user=None)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {login.data['access']}")
+        self.assertEqual(self.client.get('/api/posts/').status_code, 200)
+
+
+class SyntheticBenchmarkTests(TestCase):
+    """Tests del generador de datos sintéticos y del benchmark de la API"""
+
+    sizes = {
+        'users': 30, 'follows': 5, 'posts': 60, 'hashtags': 5, 'likes': 100,
+        'comments': 40, 'chat_rooms': 10, 'messages': 30, 'notifications': 50,
+    }
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_generate_and_clear_dataset(self):
+        summary = generate_dataset(self.sizes, seed=1)
+        self.assertEqual(summary['users'], 30)
+        self.assertEqual(summary['posts'], 60)
+        self.assertEqual(summary['chat_rooms'], 10)
+        self.assertEqual(summary['messages'], 30)
+        self.assertGreater(summary['follows'], 0)
+        self.assertGreater(summary['hashtags'], 0)
+        self.assertLessEqual(summary['likes'], 100)
+
+        clear_dataset()
+        self.assertFalse(User.objects.filter(username__startswith='synth_').exists())
+        self.assertFalse(Post.objects.exists())
+
+    def test_benchmark_reports_every_endpoint(self):
+        generate_dataset(self.sizes, seed=1)
+        results = run_benchmark(requests=3, warmup=1, users=10)
+
+        for name, row in results['endpoints'].items():
+            self.assertEqual(row['errors'], 0, name)
+            self.assertGreater(row['queries_max'], 0, name)
+        self.assertEqual(results['meta']['dataset']['users'], 30)
+
+        slower = {'endpoints': {
+            name: {**row, 'p50_ms': row['p50_ms'] * 2 + 1}
+            for name, row in results['endpoints'].items()
+        }}
+        rows = compare_results(results, slower, threshold=10)
+        self.assertTrue(any(metric == 'p50_ms' and regression for _, metric, *_, regression in rows))
+        self.assertFalse(any(regression for *_, regression in compare_results(results, results)))
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    LIVE_VIEWERS_BROADCAST_INTERVAL=0,
+)
+class WebSocketLoadTestTests(TransactionTestCase):
+    """Tests de la prueba de carga de WebSockets en el propio proceso"""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        generate_dataset({
+            'users': 8, 'follows': 2, 'posts': 10, 'hashtags': 2, 'likes': 10,
+            'comments': 5, 'chat_rooms': 2, 'messages': 4, 'notifications': 5,
+        })
+
+    def test_every_scenario_delivers_messages(self):
+        results = run_loadtest(chatters=4, viewers=3, recipients=3, duration=0.5, rate=20)
+
+        chat, live, notifications = (results['scenarios'][name] for name in ('chat', 'live', 'notifications'))
+        self.assertEqual(chat['clients'], 4)
+        self.assertEqual(live['clients'], 4)
+        for row in (chat, live, notifications):
+            self.assertEqual(row['errors'], 0)
+            self.assertGreater(row['messages_per_second'], 0)
+        self.assertGreater(chat['latency']['chat_message']['count'], 0)
+        self.assertEqual(live['latency']['live_signaling']['count'], 3)
+        self.assertGreater(live['latency']['live_comment']['count'], 0)
+        self.assertGreater(notifications['latency']['notification']['count'], 0)
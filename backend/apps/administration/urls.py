@@ -14,5 +14,6 @@ router.register(r'config', SiteConfigurationViewSet, basename='admin-config')
 
 urlpatterns = [
     path('dashboard/stats/', DashboardViewSet.as_view({'get': 'stats'}), name='dashboard-stats'),
+    path('dashboard/timeseries/', DashboardViewSet.as_view({'get': 'timeseries'}), name='dashboard-timeseries'),
     path('', include(router.urls)),
 ]
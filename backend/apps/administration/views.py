@@ -1,136 +1,118 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth import get_user_model
-from django.db.models import Count, Q
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
 from django.utils import timezone
-from datetime import timedelta
 from .models import AdminLog, SiteConfiguration
 from .serializers import (
     AdminLogSerializer,
+    BulkUserActionSerializer,
     SiteConfigurationSerializer,
     UserAdminSerializer,
+    DailyStatsSerializer,
     DashboardStatsSerializer
 )
+from .stats import daily_series, dashboard_stats
+from apps.users.auth_cache import invalidate_auth_cache
+from apps.users.models import SEARCH_FIELDS
 from apps.users.permissions import IsAdmin, IsModerator
-from apps.posts.models import Post, Comment, Like
-from apps.stories.models import Story
+from apps.users.profile_cache import invalidate_profiles
 
 User = get_user_model()
 
+MAX_TIMESERIES_DAYS = 365
+
+
+def _prefix(field, term):
+    """Condición "``field`` empieza por ``term``" que puede usar el índice del campo"""
+    if connection.vendor == 'sqlite':
+        # SQLite compara por bytes: el prefijo es un rango y usa el índice de LOWER()
+        return Q(**{f'{field}__gte': term, f'{field}__lt': term[:-1] + chr(ord(term[-1]) + 1)})
+    # Con collations lingüísticas el rango no equivale al prefijo: LIKE 'term%'
+    # (en PostgreSQL, con los índices varchar_pattern_ops)
+    return Q(**{f'{field}__startswith': term})
+
+
+def search_users(queryset, term, contains=False):
+    """
+    Usuarios cuyo username, email, nombre, apellido o dominio del email
+    empiezan por ``term``, sin distinguir mayúsculas (``spam.com`` encuentra
+    a todos los usuarios de ese dominio; ``@spam`` busca solo en el dominio).
+    Cada campo usa su índice en lugar de recorrer la tabla con
+    ``LIKE '%...%'``. Con ``contains`` se busca el término en cualquier
+    posición: en PostgreSQL con los índices de trigramas, en SQLite
+    recorriendo la tabla.
+    """
+    term = term.strip().lower()
+    if not term:
+        return queryset
+    if term.startswith('@') and not contains:
+        return queryset.filter(_prefix('email_domain', term[1:])) if term[1:] else queryset
+
+    # Las condiciones van sobre LOWER(campo), la expresión de los índices
+    queryset = queryset.alias(**{f'{field}_lower': Lower(field) for field in SEARCH_FIELDS})
+    if contains:
+        condition = Q()
+        for field in SEARCH_FIELDS:
+            condition |= Q(**{f'{field}_lower__contains': term})
+        return queryset.filter(condition)
+
+    condition = _prefix('email_domain', term)
+    for field in SEARCH_FIELDS:
+        condition |= _prefix(f'{field}_lower', term)
+    if term.isdigit():
+        condition |= Q(id=int(term))
+    return queryset.filter(condition)
+
+
+class AdminUserPagination(CursorPagination):
+    # Sin COUNT(*) ni OFFSET: el coste no crece con la página
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
 
 class DashboardViewSet(viewsets.ViewSet):
     """
     ViewSet para estadísticas del dashboard de administración
     """
     permission_classes = [IsAuthenticated, IsModerator]
+    # Los COUNT del dashboard pueden leerse de una réplica (config.db_router)
+    replica_reads = {'stats', 'timeseries'}
     
     @action(detail=False, methods=['get'])
     def stats(self, request):
         """Obtiene estadísticas generales del dashboard"""
-        now = timezone.now()
-        today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        week_start = today_start - timedelta(days=7)
-        month_start = today_start - timedelta(days=30)
-        
-        # Contar totales
-        total_users = User.objects.count()
-        total_posts = Post.objects.count()
-        total_comments = Comment.objects.count()
-        total_likes = Like.objects.count()
-        total_stories = Story.objects.count()
-        
-        # Usuarios activos (que han hecho login o han creado contenido en los últimos 30 días)
-        # Contar usuarios que han iniciado sesión recientemente
-        active_by_login = User.objects.filter(
-            last_login__gte=month_start
-        ).values_list('id', flat=True)
-        
-        # Contar usuarios que han creado posts recientemente
-        active_by_posts = Post.objects.filter(
-            created_at__gte=month_start
-        ).values_list('author_id', flat=True).distinct()
-        
-        # Contar usuarios que han comentado recientemente
-        active_by_comments = Comment.objects.filter(
-            created_at__gte=month_start
-        ).values_list('author_id', flat=True).distinct()
-        
-        # Combinar todos los IDs únicos
-        active_user_ids = set(active_by_login) | set(active_by_posts) | set(active_by_comments)
-        active_users = len(active_user_ids)
-        
-        # Nuevos usuarios
-        new_users_today = User.objects.filter(
-            created_at__gte=today_start
-        ).count()
-        new_users_week = User.objects.filter(
-            created_at__gte=week_start
-        ).count()
-        new_users_month = User.objects.filter(
-            created_at__gte=month_start
-        ).count()
-        
-        # Usuarios baneados
-        banned_users = User.objects.filter(is_banned=True).count()
-        
-        # Nuevos posts
-        new_posts_today = Post.objects.filter(
-            created_at__gte=today_start
-        ).count()
-        new_posts_week = Post.objects.filter(
-            created_at__gte=week_start
-        ).count()
-        new_posts_month = Post.objects.filter(
-            created_at__gte=month_start
-        ).count()
-        
-        # Actividad del día
-        new_comments_today = Comment.objects.filter(
-            created_at__gte=today_start
-        ).count()
-        new_likes_today = Like.objects.filter(
-            created_at__gte=today_start
-        ).count()
-        
-        # Roles
-        admin_count = User.objects.filter(role='admin').count()
-        moderator_count = User.objects.filter(role='moderator').count()
-        user_count = User.objects.filter(role='user').count()
-        
-        stats_data = {
-            'total_users': total_users,
-            'total_posts': total_posts,
-            'total_comments': total_comments,
-            'total_likes': total_likes,
-            'total_stories': total_stories,
-            'active_users': active_users,
-            'new_users_today': new_users_today,
-            'new_users_week': new_users_week,
-            'new_users_month': new_users_month,
-            'banned_users': banned_users,
-            'new_posts_today': new_posts_today,
-            'new_posts_week': new_posts_week,
-            'new_posts_month': new_posts_month,
-            'new_comments_today': new_comments_today,
-            'new_likes_today': new_likes_today,
-            'admin_count': admin_count,
-            'moderator_count': moderator_count,
-            'user_count': user_count,
-        }
-        
-        serializer = DashboardStatsSerializer(stats_data)
+        serializer = DashboardStatsSerializer(dashboard_stats())
         return Response(serializer.data)
 
+    @action(detail=False, methods=['get'])
+    def timeseries(self, request):
+        """Series diarias (usuarios, posts, comentarios, likes, activos) de los últimos ?days= días"""
+        try:
+            days = int(request.query_params.get('days', 30))
+        except ValueError:
+            return Response(
+                {'error': 'days debe ser un número'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        days = max(1, min(days, MAX_TIMESERIES_DAYS))
+        return Response(DailyStatsSerializer(daily_series(days), many=True).data)
+
 
 class UserAdminViewSet(viewsets.ModelViewSet):
     """
     ViewSet para gestión administrativa de usuarios
     """
-    queryset = User.objects.all().order_by('-created_at')
+    queryset = User.objects.all()
     serializer_class = UserAdminSerializer
     permission_classes = [IsAuthenticated, IsModerator]
+    pagination_class = AdminUserPagination
     
     def get_queryset(self):
         queryset = super().get_queryset()
@@ -145,12 +127,9 @@ class UserAdminViewSet(viewsets.ModelViewSet):
         if is_banned is not None:
             queryset = queryset.filter(is_banned=is_banned.lower() == 'true')
         if search:
-            queryset = queryset.filter(
-                Q(username__icontains=search) |
-                Q(email__icontains=search) |
-                Q(first_name__icontains=search) |
-                Q(last_name__icontains=search)
-            )
+            # match=contains: subcadena en cualquier posición (trigramas en PostgreSQL)
+            contains = self.request.query_params.get('match') == 'contains'
+            queryset = search_users(queryset, search, contains=contains)
         
         return queryset
     
@@ -177,7 +156,8 @@ class UserAdminViewSet(viewsets.ModelViewSet):
         user.is_banned = True
         user.ban_reason = reason
         user.banned_at = timezone.now()
-        user.save()
+        user.save(update_fields=['is_banned', 'ban_reason', 'banned_at', 'updated_at'])
+        invalidate_auth_cache([user.id])
         
         # Registrar en log
         AdminLog.objects.create(
@@ -197,7 +177,8 @@ class UserAdminViewSet(viewsets.ModelViewSet):
         user.is_banned = False
         user.ban_reason = ''
         user.banned_at = None
-        user.save()
+        user.save(update_fields=['is_banned', 'ban_reason', 'banned_at', 'updated_at'])
+        invalidate_auth_cache([user.id])
         
         # Registrar en log
         AdminLog.objects.create(
@@ -223,7 +204,8 @@ class UserAdminViewSet(viewsets.ModelViewSet):
         
         old_role = user.role
         user.role = new_role
-        user.save()
+        user.save(update_fields=['role', 'updated_at'])
+        invalidate_auth_cache([user.id])
         
         # Registrar en log
         AdminLog.objects.create(
@@ -236,6 +218,86 @@ class UserAdminViewSet(viewsets.ModelViewSet):
         
         return Response({'message': f'Rol cambiado a {new_role} exitosamente'})
 
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsModerator])
+    def bulk_ban(self, request):
+        """Banear a muchos usuarios a la vez (p. ej. una oleada de spam)"""
+        data = self._bulk_data(request)
+        reason = data.get('reason') or 'No reason provided'
+        targets = User.objects.filter(id__in=data['user_ids'], is_banned=False).exclude(id=request.user.id)
+        if not request.user.is_admin():
+            targets = targets.exclude(role='admin')
+
+        return self._bulk_update(
+            request, targets, data['user_ids'], 'user_ban',
+            {'is_banned': True, 'ban_reason': reason, 'banned_at': timezone.now()},
+            f'Usuario baneado (acción masiva). Razón: {reason}',
+            {'bulk': True, 'reason': reason}
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsModerator])
+    def bulk_unban(self, request):
+        """Desbanear a muchos usuarios a la vez"""
+        data = self._bulk_data(request)
+        targets = User.objects.filter(id__in=data['user_ids'], is_banned=True)
+
+        return self._bulk_update(
+            request, targets, data['user_ids'], 'user_unban',
+            {'is_banned': False, 'ban_reason': '', 'banned_at': None},
+            'Usuario desbaneado (acción masiva)',
+            {'bulk': True}
+        )
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated, IsAdmin])
+    def bulk_change_role(self, request):
+        """Cambiar el rol de muchos usuarios a la vez"""
+        data = self._bulk_data(request, require_role=True)
+        new_role = data['role']
+        targets = User.objects.filter(id__in=data['user_ids']).exclude(role=new_role)
+
+        return self._bulk_update(
+            request, targets, data['user_ids'], 'user_role_change',
+            {'role': new_role},
+            f'Rol cambiado a {new_role} (acción masiva)',
+            {'bulk': True, 'new_role': new_role}
+        )
+
+    def _bulk_data(self, request, require_role=False):
+        serializer = BulkUserActionSerializer(data=request.data, context={'require_role': require_role})
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+
+    def _bulk_update(self, request, targets, requested_ids, action, updates, description, metadata):
+        """
+        Aplica ``updates`` a ``targets`` con un solo UPDATE (sin save() ni
+        señales por usuario), registra un AdminLog por usuario con
+        bulk_create e invalida la caché de autenticación y los perfiles
+        públicos de los afectados.
+        """
+        with transaction.atomic():
+            user_ids = list(targets.select_for_update().values_list('id', flat=True))
+            if user_ids:
+                User.objects.filter(id__in=user_ids).update(updated_at=timezone.now(), **updates)
+                AdminLog.objects.bulk_create([
+                    AdminLog(
+                        admin=request.user,
+                        action=action,
+                        target_user_id=user_id,
+                        description=description,
+                        metadata=metadata
+                    )
+                    for user_id in user_ids
+                ], batch_size=500)
+
+                def invalidate_caches():
+                    invalidate_auth_cache(user_ids)
+                    invalidate_profiles(user_ids)
+                transaction.on_commit(invalidate_caches)
+
+        return Response({
+            'updated': len(user_ids),
+            'skipped': len(set(requested_ids)) - len(user_ids),
+        })
+
 
 class AdminLogViewSet(viewsets.ReadOnlyModelViewSet):
     """
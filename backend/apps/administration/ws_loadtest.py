@@ -0,0 +1,410 @@
+"""
+Prueba de carga de los consumers WebSocket.
+
+``run_loadtest`` simula con clientes asyncio tres escenarios sobre los datos de
+``generate_synthetic_data``:
+
+- ``chat``: parejas de usuarios en sus salas enviando mensajes,
+- ``live``: un streamer con espectadores que piden oferta WebRTC, responden
+  con answer/ICE y comentan,
+- ``notifications``: destinatarios conectados recibiendo ``new_notification``
+  publicadas en el channel layer.
+
+Por defecto los clientes hablan con la aplicación ASGI en el propio proceso
+(``channels.testing``); con ``url`` se conectan a un Daphne en marcha mediante
+el paquete opcional ``websockets``. En ese caso el escenario de notificaciones
+necesita un channel layer compartido (Redis) para llegar al servidor.
+
+Cada mensaje de prueba lleva una marca (``lt:<n>``) y la latencia se mide entre
+el envío y la recepción en el resto de clientes, con el reloj del propio
+harness. Se informa del tiempo de conexión, latencias p50/p99, mensajes por
+segundo y CPU consumida (del proceso o de ``server_pid``).
+"""
+import asyncio
+import itertools
+import json
+import os
+import random
+import time
+from collections import defaultdict
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth import get_user_model
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.chat.models import ChatRoom
+from live.comments import comment_buffer
+from live.models import LiveStream
+from live.presence import presence
+from .benchmark import percentile
+from .synthetic import SYNTHETIC_PREFIX
+
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+User = get_user_model()
+
+SCENARIOS = ('chat', 'live', 'notifications')
+MARK = 'lt:'
+# Espera tras la fase de envío para los mensajes todavía en vuelo
+DRAIN_SECONDS = 1.0
+
+
+class CommunicatorClient:
+    """Cliente contra la aplicación ASGI del proceso"""
+
+    application = None
+
+    def __init__(self, path, token):
+        if CommunicatorClient.application is None:
+            from channels.routing import URLRouter
+            from apps.chat.middleware import JwtAuthMiddlewareStack
+            from config.asgi import websocket_patterns
+            CommunicatorClient.application = JwtAuthMiddlewareStack(URLRouter(websocket_patterns))
+        self.communicator = WebsocketCommunicator(self.application, f'{path}?token={token}')
+
+    async def connect(self):
+        connected, _ = await self.communicator.connect(timeout=10)
+        if not connected:
+            raise ConnectionError('Conexión rechazada')
+
+    async def send(self, data):
+        await self.communicator.send_json_to(data)
+
+    async def receive(self):
+        # Sin timeout corto: al expirar, el communicator cancela la aplicación
+        message = await self.communicator.receive_output(timeout=3600)
+        if message['type'] != 'websocket.send':
+            return None
+        return json.loads(message['text'])
+
+    async def close(self):
+        await self.communicator.disconnect()
+
+
+class RemoteClient:
+    """Cliente contra un servidor en marcha (``ws://host:puerto``)"""
+
+    def __init__(self, base_url, path, token):
+        if websockets is None:
+            raise RuntimeError('Instala el paquete websockets para probar contra un servidor')
+        self.url = f"{base_url.rstrip('/')}{path}?token={token}"
+        self.connection = None
+
+    async def connect(self):
+        self.connection = await websockets.connect(self.url, open_timeout=10)
+
+    async def send(self, data):
+        await self.connection.send(json.dumps(data))
+
+    async def receive(self):
+        try:
+            return json.loads(await self.connection.recv())
+        except websockets.ConnectionClosed:
+            return None
+
+    async def close(self):
+        await self.connection.close()
+
+
+def cpu_seconds(pid=None):
+    """CPU (usuario + sistema) consumida por este proceso o por ``pid`` (Linux)"""
+    if pid is None:
+        return time.process_time()
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    # utime y stime son los campos 14 y 15; aquí empiezan en el campo 3
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+class LoadTest:
+    def __init__(self, url=None, duration=10.0, rate=1.0, seed=0):
+        self.url = url
+        self.duration = duration
+        self.rate = rate
+        self.random = random.Random(seed)
+        self.markers = itertools.count()
+        self.reset()
+
+    def reset(self):
+        self.clients = []
+        self.sent_at = {}
+        self.connect_ms = []
+        self.latency_ms = defaultdict(list)
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+
+    def client(self, path, user):
+        token = str(AccessToken.for_user(user))
+        if self.url:
+            return RemoteClient(self.url, path, token)
+        return CommunicatorClient(path, token)
+
+    def mark(self):
+        marker = f'{MARK}{next(self.markers)}'
+        self.sent_at[marker] = time.perf_counter()
+        self.sent += 1
+        return marker
+
+    def observe(self, metric, marker):
+        sent_at = self.sent_at.get(marker)
+        if sent_at is not None:
+            self.latency_ms[metric].append((time.perf_counter() - sent_at) * 1000)
+
+    async def open(self, path, user):
+        client = self.client(path, user)
+        started = time.perf_counter()
+        await client.connect()
+        await self.wait_for(client, 'connection_established')
+        self.connect_ms.append((time.perf_counter() - started) * 1000)
+        return client
+
+    async def wait_for(self, client, message_type):
+        while True:
+            message = await client.receive()
+            if message is None:
+                raise ConnectionError('El servidor cerró la conexión')
+            if message.get('type') == message_type:
+                return message
+
+    async def read(self, client, handler):
+        while True:
+            message = await client.receive()
+            if message is None:
+                return
+            self.received += 1
+            try:
+                await handler(client, message)
+            except Exception:
+                self.errors += 1
+
+    async def pace(self, send):
+        """Llama a ``send`` unas ``rate`` veces por segundo durante ``duration``"""
+        deadline = time.perf_counter() + self.duration
+        # Arranque escalonado para no sincronizar a todos los clientes
+        await asyncio.sleep(self.random.random() / self.rate)
+        while time.perf_counter() < deadline:
+            await send()
+            await asyncio.sleep(self.random.expovariate(self.rate))
+
+    def start(self, client, handler):
+        """Empieza a leer los mensajes de ``client`` en segundo plano"""
+        self.clients.append((client, asyncio.ensure_future(self.read(client, handler))))
+
+    async def run_senders(self, senders):
+        await asyncio.gather(*senders)
+        await asyncio.sleep(DRAIN_SECONDS)
+
+    async def execute(self, scenario, *args):
+        """Ejecuta un escenario y cierra siempre las conexiones abiertas"""
+        try:
+            await scenario(*args)
+        finally:
+            for _, reader in self.clients:
+                reader.cancel()
+            await asyncio.gather(*(reader for _, reader in self.clients), return_exceptions=True)
+            for client, _ in self.clients:
+                try:
+                    await client.close()
+                except Exception:
+                    self.errors += 1
+
+    # ----------------------------------------------------------------------
+    # Escenarios
+    # ----------------------------------------------------------------------
+
+    async def chat(self, rooms):
+        """``rooms``: lista de ``(room_id, [usuarios])``"""
+        senders = []
+        for room_id, users in rooms:
+            for user in users:
+                client = await self.open('/ws/chat/', user)
+                await client.send({'type': 'join_room', 'room': str(room_id)})
+                await self.wait_for(client, 'room_joined')
+
+                async def handle(client, message, user=user):
+                    if message.get('type') != 'chat_message':
+                        return
+                    data = message['message']
+                    if data.get('sender_id') != user.pk and str(data.get('content')).startswith(MARK):
+                        self.observe('chat_message', data['content'])
+
+                async def send(client=client, room_id=room_id):
+                    await client.send({'type': 'send_message', 'room': str(room_id), 'message': self.mark()})
+
+                self.start(client, handle)
+                senders.append(self.pace(send))
+        await self.run_senders(senders)
+
+    async def live(self, stream_id, streamer, viewers):
+        path = f'/ws/live/{stream_id}/'
+        requested_at = {}
+
+        async def handle_streamer(client, message):
+            if message.get('type') == 'request_offer':
+                self.sent += 1
+                await client.send({
+                    'type': 'webrtc_offer',
+                    'target_user': message['from_user'],
+                    'offer': {'type': 'offer', 'sdp': 'v=0'},
+                })
+            elif message.get('type') == 'new_comment':
+                self.observe('live_comment', message['comment'].get('content'))
+
+        def viewer_handler(viewer):
+            async def handle(client, message):
+                message_type = message.get('type')
+                if message_type == 'webrtc_offer' and message.get('target_user') == viewer.pk:
+                    if viewer.pk in requested_at:
+                        self.latency_ms['live_signaling'].append(
+                            (time.perf_counter() - requested_at.pop(viewer.pk)) * 1000
+                        )
+                    await client.send({
+                        'type': 'webrtc_answer',
+                        'target_user': message['from_user'],
+                        'answer': {'type': 'answer', 'sdp': 'v=0'},
+                    })
+                    for candidate in range(2):
+                        await client.send({
+                            'type': 'webrtc_ice_candidate',
+                            'target_user': message['from_user'],
+                            'candidate': {'candidate': f'candidate:{candidate}'},
+                        })
+                    self.sent += 3
+                elif message_type == 'new_comment':
+                    self.observe('live_comment', message['comment'].get('content'))
+            return handle
+
+        self.start(await self.open(path, streamer), handle_streamer)
+        senders = []
+        for viewer in viewers:
+            client = await self.open(path, viewer)
+            self.start(client, viewer_handler(viewer))
+            requested_at[viewer.pk] = time.perf_counter()
+            await client.send({'type': 'request_offer'})
+            self.sent += 1
+
+            async def comment(client=client):
+                await client.send({'type': 'comment', 'content': self.mark()})
+
+            senders.append(self.pace(comment))
+        await self.run_senders(senders)
+
+        if not self.url:
+            # Guardar lo pendiente antes de que se cierre el bucle de eventos
+            await comment_buffer.flush()
+            await presence.flush([str(stream_id)])
+
+    async def notifications(self, recipients):
+        channel_layer = get_channel_layer()
+        senders = []
+        for recipient in recipients:
+            client = await self.open('/ws/notifications/', recipient)
+
+            async def handle(client, message):
+                if message.get('type') == 'new_notification':
+                    self.observe('notification', message['notification'].get('message'))
+
+            async def publish(recipient=recipient):
+                await channel_layer.group_send(f'notifications_{recipient.pk}', {
+                    'type': 'new_notification',
+                    'notification': {'id': 0, 'notification_type': 'like', 'message': self.mark()},
+                })
+
+            self.start(client, handle)
+            senders.append(self.pace(publish))
+        await self.run_senders(senders)
+
+    def summary(self, clients, elapsed, cpu):
+        connect = sorted(self.connect_ms)
+        return {
+            'clients': clients,
+            'connect_p50_ms': round(percentile(connect, 50), 2),
+            'connect_p99_ms': round(percentile(connect, 99), 2),
+            'latency': {
+                metric: {
+                    'count': len(values),
+                    'p50_ms': round(percentile(sorted(values), 50), 2),
+                    'p99_ms': round(percentile(sorted(values), 99), 2),
+                }
+                for metric, values in self.latency_ms.items()
+            },
+            'sent': self.sent,
+            'received': self.received,
+            'messages_per_second': round(self.received / elapsed, 1) if elapsed else 0.0,
+            'errors': self.errors,
+            'seconds': round(elapsed, 2),
+            'cpu_seconds': round(cpu, 2),
+            'cpu_percent': round(cpu / elapsed * 100, 1) if elapsed else 0.0,
+        }
+
+
+def _synthetic_users():
+    return User.objects.filter(username__startswith=SYNTHETIC_PREFIX).order_by('id')
+
+
+def _chat_rooms(chatters):
+    """Salas sintéticas completas hasta sumar ``chatters`` participantes"""
+    members = defaultdict(list)
+    through = ChatRoom.participants.through.objects.filter(
+        user__username__startswith=SYNTHETIC_PREFIX
+    ).select_related('user').order_by('chatroom_id')
+    for row in through.iterator():
+        members[row.chatroom_id].append(row.user)
+    rooms = []
+    total = 0
+    for room_id, users in members.items():
+        if total >= chatters:
+            break
+        rooms.append((room_id, users))
+        total += len(users)
+    return rooms, total
+
+
+def run_loadtest(scenarios=SCENARIOS, chatters=20, viewers=50, recipients=50,
+                 duration=10.0, rate=1.0, url=None, server_pid=None, seed=0):
+    users = list(_synthetic_users()[:max(viewers + 1, recipients)])
+    if not users:
+        raise ValueError('No hay datos sintéticos: ejecuta generate_synthetic_data')
+
+    test = LoadTest(url=url, duration=duration, rate=rate, seed=seed)
+    results = {}
+    for scenario in scenarios:
+        test.reset()
+        stream = None
+        if scenario == 'chat':
+            rooms, clients = _chat_rooms(chatters)
+            run, args = test.chat, (rooms,)
+        elif scenario == 'live':
+            stream = LiveStream.objects.create(streamer=users[0], status='live', title='Prueba de carga')
+            clients = min(viewers, len(users) - 1) + 1
+            run, args = test.live, (stream.pk, users[0], users[1:clients])
+        else:
+            clients = min(recipients, len(users))
+            run, args = test.notifications, (users[:clients],)
+
+        cpu_before = cpu_seconds(server_pid)
+        started = time.perf_counter()
+        try:
+            async_to_sync(test.execute)(run, *args)
+        finally:
+            if stream is not None:
+                stream.delete()
+        results[scenario] = test.summary(
+            clients, time.perf_counter() - started, cpu_seconds(server_pid) - cpu_before
+        )
+    return {
+        'meta': {
+            'target': url or 'in-process',
+            'duration': duration,
+            'rate': rate,
+            'server_pid': server_pid,
+            'seed': seed,
+        },
+        'scenarios': results,
+    }
@@ -0,0 +1,35 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from apps.users.auth_cache import get_user_snapshot, user_from_snapshot
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    Igual que ``JWTAuthentication`` pero resuelve el usuario desde la copia en
+    caché de ``apps.users.auth_cache``, sin consultar la base de datos en cada
+    petición.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        snapshot = get_user_snapshot(user_id)
+        if snapshot is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+        if not snapshot['is_active']:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != snapshot['password_md5']:
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code='password_changed'
+                )
+
+        return user_from_snapshot(snapshot)
@@ -1,32 +1,49 @@
+import asyncio
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from config.db_executor import consumer_db
+from config.metrics import InstrumentedConsumerMixin
 from django.contrib.auth import get_user_model
 from django.db.models import Count
+from django.utils import timezone
+from apps.administration.site_config import get_site_config
+from apps.users.signals import profile_watchers_group
 from .models import ChatRoom, Message
 
 User = get_user_model()
+# Un registro por mensaje: se muestrea con LOG_SAMPLING
+logger = logging.getLogger(__name__)
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+class ChatConsumer(InstrumentedConsumerMixin, AsyncWebsocketConsumer):
     async def connect(self):
         # Obtener room_name de la URL, si no existe usar 'general'
         self.room_name = self.scope['url_route']['kwargs'].get('room_name', 'general')
         self.room_group_name = f'chat_{self.room_name}'
         self.user = self.scope['user']
         self.current_room = None
+        self.watched_profiles = set()
 
         if not self.user.is_authenticated:
             await self.close()
             return
 
+        # Configuración del sitio y contactos en un solo acceso a la base de datos
+        contacts = await self.load_session()
+        if contacts is None:
+            # Chat desactivado desde la configuración del sitio
+            await self.close()
+            return
+
         await self.accept()
         
-        # Suscribirse a actualizaciones de conversaciones del usuario
+        # Suscribirse a actualizaciones de conversaciones del usuario y a los
+        # cambios de perfil de los contactos (y los propios)
         self.chat_updates_group = f'chat_updates_{self.user.id}'
-        await self.channel_layer.group_add(
-            self.chat_updates_group,
-            self.channel_name
+        await asyncio.gather(
+            self.channel_layer.group_add(self.chat_updates_group, self.channel_name),
+            self.watch_profiles([self.user.id, *contacts]),
         )
         
         # Enviar mensaje de bienvenida
@@ -37,18 +54,14 @@ class ChatConsumer(AsyncWebsocketConsumer):
         }))
 
     async def disconnect(self, close_code):
-        # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
-        
-        # Desuscribirse de actualizaciones de conversaciones
+        # Salir de todos los grupos a la vez
+        groups = [self.room_group_name]
         if hasattr(self, 'chat_updates_group'):
-            await self.channel_layer.group_discard(
-                self.chat_updates_group,
-                self.channel_name
-            )
+            groups.append(self.chat_updates_group)
+        groups.extend(profile_watchers_group(user_id) for user_id in getattr(self, 'watched_profiles', ()))
+        await asyncio.gather(*(
+            self.channel_layer.group_discard(group, self.channel_name) for group in groups
+        ))
 
     async def receive(self, text_data):
         try:
@@ -59,19 +72,18 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 # Manejar unión a sala
                 room_id = text_data_json.get('room')
                 if room_id:
-                    # Salir de la sala actual si existe
-                    if self.current_room:
-                        await self.channel_layer.group_discard(
-                            f'chat_{self.current_room}',
-                            self.channel_name
-                        )
-                    
-                    # Unirse a la nueva sala
-                    self.current_room = room_id
-                    await self.channel_layer.group_add(
-                        f'chat_{room_id}',
-                        self.channel_name
+                    # Cambiar de sala y cargar sus participantes a la vez
+                    previous_room, self.current_room = self.current_room, room_id
+                    groups = [self.channel_layer.group_add(f'chat_{room_id}', self.channel_name)]
+                    if previous_room and previous_room != room_id:
+                        groups.append(self.channel_layer.group_discard(
+                            f'chat_{previous_room}', self.channel_name
+                        ))
+                    participants, *_ = await asyncio.gather(
+                        self.get_room_participants(room_id), *groups
                     )
+                    # La sala puede ser nueva y traer contactos nuevos
+                    await self.watch_profiles(participants)
                     
                     await self.send(text_data=json.dumps({
                         'type': 'room_joined',
@@ -94,6 +106,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     message = await self.save_message(message_content, room_id)
                     
                     if message:
+                        logger.info('Mensaje de chat', extra={
+                            'room': room_id, 'user_id': self.user.id, 'message_id': message.id,
+                        })
                         # Send message to room group only
                         await self.channel_layer.group_send(
                             f'chat_{room_id}',
@@ -150,10 +165,6 @@ class ChatConsumer(AsyncWebsocketConsumer):
                             'room': room_id
                         }
                     )
-            
-            elif message_type == 'profile_updated':
-                # Manejar actualización de perfil del usuario
-                await self.broadcast_profile_update()
                     
         except json.JSONDecodeError:
             await self.send(text_data=json.dumps({
@@ -215,105 +226,91 @@ class ChatConsumer(AsyncWebsocketConsumer):
             'user_data': event['user_data']
         }))
 
-    async def broadcast_profile_update(self):
-        # Obtener datos actualizados del usuario
-        user_data = await self.get_user_data()
-        
-        # Obtener todas las salas donde participa el usuario
-        user_rooms = await self.get_user_chat_rooms()
-        
-        # Enviar la actualización a todas las salas donde participa
-        for room_id in user_rooms:
-            await self.channel_layer.group_send(
-                f'chat_{room_id}',
-                {
-                    'type': 'profile_update',
-                    'user_id': self.user.id,
-                    'user_data': user_data
-                }
-            )
+    async def watch_profiles(self, user_ids):
+        """Unirse a los grupos de cambios de perfil de los usuarios indicados"""
+        new_ids = set(user_ids) - self.watched_profiles
+        self.watched_profiles |= new_ids
+        await asyncio.gather(*(
+            self.channel_layer.group_add(profile_watchers_group(user_id), self.channel_name)
+            for user_id in new_ids
+        ))
 
-    @database_sync_to_async
-    def get_user_data(self):
-        """Obtener datos actualizados del usuario para enviar via WebSocket"""
-        try:
-            user = User.objects.get(id=self.user.id)
-            profile_pic_url = None
-            if user.profile_picture:
-                # Construir URL absoluta para la imagen de perfil
-                profile_pic_url = user.profile_picture.url
-            
-            return {
-                'id': user.id,
-                'username': user.username,
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'full_name': f"{user.first_name} {user.last_name}",
-                'profile_picture': profile_pic_url
-            }
-        except User.DoesNotExist:
+    @consumer_db
+    def load_session(self):
+        """
+        IDs de los usuarios con los que comparte alguna sala, o None si el chat
+        está desactivado
+        """
+        if not get_site_config().enable_chat:
             return None
+        return list(
+            User.objects.filter(
+                chat_rooms__participants=self.user
+            ).exclude(id=self.user.id).values_list('id', flat=True).distinct()
+        )
 
-    @database_sync_to_async
-    def get_user_chat_rooms(self):
-        """Obtener IDs de todas las salas donde participa el usuario"""
+    @consumer_db
+    def get_room_participants(self, room_id):
+        if not str(room_id).isdigit():
+            return []
         return list(
-            ChatRoom.objects.filter(
-                participants=self.user
-            ).values_list('id', flat=True)
+            ChatRoom.objects.filter(id=int(room_id), participants=self.user)
+            .values_list('participants', flat=True)
         )
 
-    @database_sync_to_async
+    @consumer_db
     def save_message(self, message_content, room_id=None):
-        # Get or create chat room
         room_identifier = room_id or self.room_name
+        # ID numérico de una sala
+        if isinstance(room_identifier, int) or (
+                isinstance(room_identifier, str) and room_identifier.isdigit()):
+            return self.save_room_message(int(room_identifier), message_content)
+
+        # Si el identificador es una cadena, puede ser un username
+        # Intentamos reutilizar un chat privado entre ambos usuarios
         try:
-            # Intentar obtener por ID numérico
-            if isinstance(room_identifier, int):
-                chat_room = ChatRoom.objects.get(id=room_identifier)
-            elif (isinstance(room_identifier, str) and
-                  room_identifier.isdigit()):
-                chat_room = ChatRoom.objects.get(id=int(room_identifier))
-            else:
-                # Si el identificador es una cadena, puede ser un username
-                # Intentamos reutilizar un chat privado entre ambos usuarios
-                room_str = str(room_identifier)
-                try:
-                    other_user = User.objects.get(username=room_str)
-                except User.DoesNotExist:
-                    other_user = None
+            other_user = User.objects.get(username=str(room_identifier))
+        except User.DoesNotExist:
+            other_user = None
 
-                if other_user:
-                    # Buscar chat privado existente entre los dos usuarios
-                    existing_chat = ChatRoom.objects.filter(
-                        participants=self.user
-                    ).filter(
-                        participants=other_user
-                    ).annotate(
-                        participant_count=Count('participants')
-                    ).filter(participant_count=2).first()
+        if other_user:
+            # Buscar chat privado existente entre los dos usuarios
+            chat_room = ChatRoom.objects.filter(
+                participants=self.user
+            ).filter(
+                participants=other_user
+            ).annotate(
+                participant_count=Count('participants')
+            ).filter(participant_count=2).first()
 
-                    if existing_chat:
-                        chat_room = existing_chat
-                    else:
-                        # Crear nuevo chat privado y asignar participantes
-                        chat_room = ChatRoom.objects.create()
-                        chat_room.participants.set([self.user, other_user])
-                else:
-                    # Si no es un username válido, crear una sala genérica
-                    chat_room = ChatRoom.objects.create()
-        except ChatRoom.DoesNotExist:
-            # Crear nueva sala genérica si no se encontró por ID
+            if chat_room is None:
+                # Crear nuevo chat privado y asignar participantes
+                chat_room = ChatRoom.objects.create()
+                chat_room.participants.set([self.user, other_user])
+        else:
+            # Si no es un username válido, crear una sala genérica
             chat_room = ChatRoom.objects.create()
-        
-        if chat_room:
-            message = Message.objects.create(
-                chat_room=chat_room,
-                sender=self.user,
-                content=message_content
-            )
-            # Actualizar el timestamp del chat room para que aparezca como reciente
-            chat_room.updated_at = message.created_at
-            chat_room.save(update_fields=['updated_at'])
-            return message
-        return None
\ No newline at end of file
+
+        message = Message.objects.create(
+            chat_room=chat_room,
+            sender=self.user,
+            content=message_content
+        )
+        # Actualizar el timestamp del chat room para que aparezca como reciente
+        chat_room.updated_at = message.created_at
+        chat_room.save(update_fields=['updated_at'])
+        return message
+
+    def save_room_message(self, room_id, message_content):
+        """
+        Guarda un mensaje en una sala existente: el UPDATE de ``updated_at``
+        comprueba a la vez que la sala existe, así que no hace falta cargarla
+        """
+        if not ChatRoom.objects.filter(id=room_id).update(updated_at=timezone.now()):
+            # Crear nueva sala genérica si no se encontró por ID
+            room_id = ChatRoom.objects.create().id
+        return Message.objects.create(
+            chat_room=ChatRoom(id=room_id),
+            sender=self.user,
+            content=message_content
+        )
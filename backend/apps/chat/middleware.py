@@ -1,5 +1,5 @@
 from channels.middleware import BaseMiddleware
-from channels.db import database_sync_to_async
+from config.db_executor import consumer_db
 from django.contrib.auth.models import AnonymousUser
 from django.contrib.auth import get_user_model
 from rest_framework_simplejwt.tokens import UntypedToken
@@ -11,7 +11,7 @@ import urllib.parse
 User = get_user_model()
 
 
-@database_sync_to_async
+@consumer_db
 def get_user(user_id):
     try:
         return User.objects.get(id=user_id)
@@ -1,27 +1,8 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
 from .models import Message
-from notifications.models import Notification
-from notifications.serializers import NotificationSerializer
-
-channel_layer = get_channel_layer()
-
-
-def send_notification_to_websocket(notification):
-    """Enviar notificación por WebSocket en tiempo real"""
-    if channel_layer:
-        serializer = NotificationSerializer(notification)
-        group_name = f'notifications_{notification.recipient.id}'
-        
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': 'new_notification',
-                'notification': serializer.data
-            }
-        )
+from notifications.aggregation import notify
+from notifications.outbox import publish
 
 
 @receiver(post_save, sender=Message)
@@ -38,7 +19,8 @@ def create_message_notification(sender, instance, created, **kwargs):
             if len(instance.content) > 50:
                 message_preview += "..."
             
-            notification = Notification.objects.create(
+            # Crea la notificación y la envía por WebSocket tras el commit
+            notify(
                 recipient=recipient,
                 sender=instance.sender,
                 notification_type='message',
@@ -46,18 +28,14 @@ def create_message_notification(sender, instance, created, **kwargs):
                 message=f'{instance.sender.username}: {message_preview}'
             )
             
-            # Enviar notificación por WebSocket
-            send_notification_to_websocket(notification)
-            
             # Enviar señal al WebSocket de chat para actualizar conversaciones
-            if channel_layer:
-                async_to_sync(channel_layer.group_send)(
-                    f'chat_updates_{recipient.id}',
-                    {
-                        'type': 'conversation_update',
-                        'action': 'new_message',
-                        'chat_room_id': instance.chat_room.id,
-                        'sender_id': instance.sender.id,
-                        'sender_username': instance.sender.username
-                    }
-                )
+            publish(
+                f'chat_updates_{recipient.id}',
+                {
+                    'type': 'conversation_update',
+                    'action': 'new_message',
+                    'chat_room_id': instance.chat_room.id,
+                    'sender_id': instance.sender.id,
+                    'sender_username': instance.sender.username
+                }
+            )
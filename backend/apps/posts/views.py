@@ -2,6 +2,7 @@ from rest_framework import generics, status, viewsets
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
 from django.shortcuts import get_object_or_404
 from django.contrib.auth import get_user_model
 from django.db.models import Count, Q
@@ -13,12 +14,15 @@ from .serializers import (
     SharePostSerializer, SharedPostSerializer
 )
 from apps.users.models import Follow
+from config.tiered_cache import cached
 
 User = get_user_model()
 
 
 class PostListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
+    # El feed (GET) puede leerse de una réplica (config.db_router)
+    replica_reads = True
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -77,6 +81,7 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
 class UserPostsView(generics.ListAPIView):
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
+    replica_reads = True
 
     def get_queryset(self):
         username = self.kwargs['username']
@@ -103,6 +108,33 @@ def like_post(request, post_id):
         )
 
 
+@cached('posts:trending', ttl=lambda: settings.TRENDING_CACHE_TTL)
+def trending_hashtags_data():
+    """Top hashtags de las últimas 24 horas (igual para todos los usuarios, se cachea)"""
+    yesterday = timezone.now() - timedelta(days=1)
+    
+    # Hashtags usados en las últimas 24 horas
+    trending_hashtags = Hashtag.objects.filter(
+        posts__created_at__gte=yesterday
+    ).annotate(
+        recent_count=Count('posts', filter=Q(posts__created_at__gte=yesterday))
+    ).order_by('-recent_count', '-usage_count')[:10]
+    
+    data = [
+        {
+            'id': hashtag.id,
+            'name': hashtag.name,
+            'slug': hashtag.slug,
+            'usage_count': hashtag.usage_count,
+            'recent_count': hashtag.recent_count,
+            'created_at': hashtag.created_at
+        }
+        for hashtag in trending_hashtags
+    ]
+    
+    return data
+
+
 class HashtagViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet para listar y buscar hashtags
@@ -113,6 +145,7 @@ class HashtagViewSet(viewsets.ReadOnlyModelViewSet):
     """
     permission_classes = [IsAuthenticated]
     lookup_field = 'slug'
+    replica_reads = {'list', 'retrieve', 'trending', 'posts'}
     
     def get_queryset(self):
         queryset = Hashtag.objects.all()
@@ -158,28 +191,7 @@ class HashtagViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def trending(self, request):
         """Top hashtags de las últimas 24 horas"""
-        yesterday = timezone.now() - timedelta(days=1)
-        
-        # Hashtags usados en las últimas 24 horas
-        trending_hashtags = Hashtag.objects.filter(
-            posts__created_at__gte=yesterday
-        ).annotate(
-            recent_count=Count('posts', filter=Q(posts__created_at__gte=yesterday))
-        ).order_by('-recent_count', '-usage_count')[:10]
-        
-        data = [
-            {
-                'id': hashtag.id,
-                'name': hashtag.name,
-                'slug': hashtag.slug,
-                'usage_count': hashtag.usage_count,
-                'recent_count': hashtag.recent_count,
-                'created_at': hashtag.created_at
-            }
-            for hashtag in trending_hashtags
-        ]
-        
-        return Response(data)
+        return Response(trending_hashtags_data())
     
     @action(detail=True, methods=['get'])
     def posts(self, request, slug=None):
@@ -275,24 +287,14 @@ def shared_posts_list(request):
 @permission_classes([IsAuthenticated])
 def like_comment(request, comment_id):
     """Dar o quitar like a un comentario"""
+    from notifications.counters import delete_notifications
     from notifications.models import Notification
     
     comment = get_object_or_404(Comment, id=comment_id)
     like, created = CommentLike.objects.get_or_create(user=request.user, comment=comment)
     
     if created:
-        # Crear notificación solo si el like es de otro usuario
-        if comment.author != request.user:
-            Notification.objects.create(
-                recipient=comment.author,
-                sender=request.user,
-                notification_type='like',
-                title=f'{request.user.get_full_name()} le dio me gusta a tu comentario',
-                message=f'En la publicación: "{comment.post.content[:50]}..."',
-                related_comment_id=comment.id,
-                related_post_id=comment.post.id
-            )
-        
+        # La notificación la crea (o agrupa) la señal post_save de CommentLike
         return Response(
             {'message': 'Comment liked', 'liked': True}, 
             status=status.HTTP_201_CREATED
@@ -300,14 +302,14 @@ def like_comment(request, comment_id):
     else:
         like.delete()
         
-        # Eliminar la notificación si existe
+        # Eliminar la notificación si existe y no agrupa likes de otros usuarios
         if comment.author != request.user:
-            Notification.objects.filter(
-                recipient=comment.author,
+            delete_notifications(comment.author_id, Notification.objects.filter(
                 sender=request.user,
                 notification_type='like',
-                related_comment_id=comment.id
-            ).delete()
+                related_comment_id=comment.id,
+                actor_count=1
+            ))
         
         return Response(
             {'message': 'Comment unliked', 'liked': False}, 
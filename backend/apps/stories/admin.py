@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import Story, StoryView
+from .models import Story, StoryArchive, StoryView, VideoUpload
 
 
 @admin.register(Story)
 class StoryAdmin(admin.ModelAdmin):
-    list_display = ('id', 'author', 'content_preview', 'created_at', 'expires_at', 'is_expired', 'views_count')
-    list_filter = ('created_at', 'expires_at')
+    list_display = ('id', 'author', 'content_preview', 'video_status', 'created_at', 'expires_at', 'is_expired', 'views_count')
+    list_filter = ('video_status', 'created_at', 'expires_at')
     search_fields = ('author__username', 'content')
     ordering = ('-created_at',)
     readonly_fields = ('created_at', 'expires_at')
@@ -25,3 +25,19 @@ class StoryViewAdmin(admin.ModelAdmin):
     list_filter = ('viewed_at',)
     search_fields = ('user__username', 'story__author__username')
     ordering = ('-viewed_at',)
+
+
+@admin.register(StoryArchive)
+class StoryArchiveAdmin(admin.ModelAdmin):
+    list_display = ('id', 'author', 'story_id', 'views_count', 'created_at', 'archived_at')
+    list_filter = ('archived_at',)
+    search_fields = ('author__username', 'content')
+    ordering = ('-created_at',)
+
+
+@admin.register(VideoUpload)
+class VideoUploadAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'filename', 'received', 'total_size', 'status', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('user__username', 'filename')
+    ordering = ('-created_at',)
@@ -0,0 +1,52 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.stories.sweeper import sweep_expired_stories, sweep_stale_uploads
+
+
+class Command(BaseCommand):
+    help = 'Borra o archiva las historias caducadas y libera sus ficheros'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Historias por transacción (por defecto STORY_SWEEP_BATCH_SIZE)',
+        )
+        parser.add_argument(
+            '--archive',
+            action='store_true',
+            default=None,
+            help='Archivar para el autor aunque STORY_ARCHIVE_ENABLED esté desactivado',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar las filas afectadas',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Repetir el barrido cada N segundos en lugar de salir',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = sweep_expired_stories(
+                batch_size=options['batch_size'],
+                archive=options['archive'],
+                dry_run=options['dry_run'],
+            )
+            prefix = 'Se barrerían' if options['dry_run'] else 'Barrido'
+            self.stdout.write(f'{prefix}: {stats}')
+            if stats.missing_files:
+                self.stdout.write(f'Ficheros que ya no existían: {len(stats.missing_files)}')
+            uploads = sweep_stale_uploads(dry_run=options['dry_run'])
+            self.stdout.write(f'Subidas de vídeo caducadas: {uploads}')
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.stories.models import Story
+from apps.stories.transcoding import resumable_stories, transcode_story
+
+
+class Command(BaseCommand):
+    help = 'Procesa los vídeos de historias pendientes o interrumpidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Volver a intentar también los vídeos que fallaron',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help='Repetir cada N segundos en lugar de salir',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            if options['retry_failed']:
+                Story.objects.filter(video_status='failed').update(
+                    video_status='pending', video_error=''
+                )
+                options['retry_failed'] = False
+
+            ready = failed = 0
+            for story_id in list(resumable_stories().values_list('id', flat=True)):
+                story = transcode_story(story_id)
+                if story is None:
+                    continue
+                if story.video_status == 'ready':
+                    ready += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'Historia {story_id}: fallo al procesar el vídeo')
+            self.stdout.write(f'Vídeos procesados: {ready}, fallidos: {failed}')
+
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stories', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['author', 'expires_at'], name='stories_sto_author__b245e3_idx'),
+        ),
+    ]
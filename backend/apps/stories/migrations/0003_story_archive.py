@@ -0,0 +1,47 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stories', '0002_story_author_expires_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoryArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('story_id', models.BigIntegerField(unique=True)),
+                ('content', models.TextField(blank=True, max_length=500)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='stories/')),
+                ('video', models.FileField(blank=True, null=True, upload_to='stories/videos/')),
+                ('background_color', models.CharField(default='#000000', max_length=7)),
+                ('views_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('expired_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='story',
+            index=models.Index(fields=['expires_at'], name='stories_sto_expires_b8bcdb_idx'),
+        ),
+        migrations.AddField(
+            model_name='storyarchive',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_stories', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='storyarchive',
+            index=models.Index(fields=['author', '-created_at'], name='stories_sto_author__3b3c59_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+def mark_existing_videos_ready(apps, schema_editor):
+    # Los vídeos subidos antes del procesado se sirven tal cual
+    Story = apps.get_model('stories', 'Story')
+    Story.objects.exclude(video='').exclude(video__isnull=True).update(video_status='ready')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('stories', '0003_story_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='story',
+            name='video_error',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='video_low',
+            field=models.FileField(blank=True, null=True, upload_to='stories/videos/'),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='video_poster',
+            field=models.ImageField(blank=True, null=True, upload_to='stories/posters/'),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='video_status',
+            field=models.CharField(choices=[('none', 'Sin vídeo'), ('pending', 'Pendiente'), ('processing', 'Procesando'), ('ready', 'Listo'), ('failed', 'Fallido')], default='none', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='story',
+            name='video_updated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='VideoUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('filename', models.CharField(max_length=255)),
+                ('content_type', models.CharField(max_length=100)),
+                ('total_size', models.PositiveBigIntegerField()),
+                ('received', models.PositiveBigIntegerField(default=0)),
+                ('status', models.CharField(choices=[('uploading', 'Subiendo'), ('complete', 'Completa'), ('used', 'Usada')], default='uploading', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='video_uploads', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'updated_at'], name='stories_vid_status_d94f9b_idx')],
+            },
+        ),
+        migrations.RunPython(mark_existing_videos_ready, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,7 @@
+import uuid
+from pathlib import Path
+
+from django.conf import settings
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
@@ -15,8 +19,28 @@ class Story(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
 
+    # Procesado del vídeo (apps.stories.transcoding): ``video`` pasa a ser la
+    # versión web optimizada y se añaden póster y versión de baja calidad
+    VIDEO_STATUS_CHOICES = (
+        ('none', 'Sin vídeo'),
+        ('pending', 'Pendiente'),
+        ('processing', 'Procesando'),
+        ('ready', 'Listo'),
+        ('failed', 'Fallido'),
+    )
+    video_status = models.CharField(max_length=10, choices=VIDEO_STATUS_CHOICES, default='none')
+    video_poster = models.ImageField(upload_to='stories/posters/', blank=True, null=True)
+    video_low = models.FileField(upload_to='stories/videos/', blank=True, null=True)
+    video_error = models.TextField(blank=True)
+    video_updated_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['author', 'expires_at']),
+            # Barrido de historias caducadas (apps.stories.sweeper)
+            models.Index(fields=['expires_at']),
+        ]
 
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -34,6 +58,41 @@ class Story(models.Model):
         return self.views.count()
 
 
+class VideoUpload(models.Model):
+    """
+    Subida de vídeo por partes. Cada parte se añade a un fichero temporal en
+    disco; al completarse el vídeo puede adjuntarse a una historia nueva.
+    """
+    STATUS_CHOICES = (
+        ('uploading', 'Subiendo'),
+        ('complete', 'Completa'),
+        ('used', 'Usada'),
+    )
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='video_uploads')
+    filename = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    total_size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='uploading')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} upload {self.id} ({self.received}/{self.total_size})"
+
+    @property
+    def temp_path(self):
+        return Path(settings.STORY_UPLOAD_TEMP_DIR) / f'{self.id}.part'
+
+
 class StoryView(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='story_views')
     story = models.ForeignKey(Story, on_delete=models.CASCADE, related_name='views')
@@ -43,4 +102,30 @@ class StoryView(models.Model):
         unique_together = ('user', 'story')
 
     def __str__(self):
-        return f"{self.user.username} viewed {self.story.author.username}'s story"
\ No newline at end of file
+        return f"{self.user.username} viewed {self.story.author.username}'s story"
+
+
+class StoryArchive(models.Model):
+    """
+    Historia caducada conservada para su autor cuando STORY_ARCHIVE_ENABLED
+    está activo. Los ficheros de imagen y vídeo pasan a esta fila.
+    """
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_stories')
+    story_id = models.BigIntegerField(unique=True)
+    content = models.TextField(max_length=500, blank=True)
+    image = models.ImageField(upload_to='stories/', blank=True, null=True)
+    video = models.FileField(upload_to='stories/videos/', blank=True, null=True)
+    background_color = models.CharField(max_length=7, default='#000000')
+    views_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField()
+    expired_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['author', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.author.username}'s archived story - {self.created_at}"
@@ -1,6 +1,10 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Story, StoryView
+from django.core.files import File
+from django.db import transaction
+from .models import Story, StoryArchive, StoryView, VideoUpload
+from .transcoding import ALLOWED_VIDEO_TYPES, enqueue_transcode
 
 User = get_user_model()
 
@@ -20,7 +24,8 @@ class StorySerializer(serializers.ModelSerializer):
         fields = [
             'id', 'author', 'author_id', 'author_username', 'author_first_name',
             'author_last_name', 'author_profile_picture', 'content', 'image', 
-            'video', 'background_color', 'created_at', 'expires_at', 
+            'video', 'video_status', 'video_poster', 'video_low',
+            'background_color', 'created_at', 'expires_at',
             'views_count', 'is_viewed'
         ]
         read_only_fields = ['id', 'author', 'created_at', 'expires_at']
@@ -31,9 +36,14 @@ class StorySerializer(serializers.ModelSerializer):
         return None
 
     def get_views_count(self, obj):
+        # Anotado por with_viewer_state() para evitar una consulta por historia
+        if hasattr(obj, 'views_total'):
+            return obj.views_total
         return obj.get_views_count()
 
     def get_is_viewed(self, obj):
+        if hasattr(obj, 'viewed_by_user'):
+            return obj.viewed_by_user
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return StoryView.objects.filter(user=request.user, story=obj).exists()
@@ -41,9 +51,12 @@ class StorySerializer(serializers.ModelSerializer):
 
 
 class StoryCreateSerializer(serializers.ModelSerializer):
+    # Vídeo subido por partes con /stories/uploads/ en lugar de en esta petición
+    upload_id = serializers.UUIDField(write_only=True, required=False)
+
     class Meta:
         model = Story
-        fields = ['content', 'image', 'video', 'background_color']
+        fields = ['content', 'image', 'video', 'background_color', 'upload_id']
 
     def validate_image(self, value):
         if value:
@@ -70,36 +83,62 @@ class StoryCreateSerializer(serializers.ModelSerializer):
 
     def validate_video(self, value):
         if value:
-            # Validar tamaño (máximo 50MB para videos)
-            max_size = 50 * 1024 * 1024
+            # Validar tamaño
+            max_size = settings.STORY_VIDEO_MAX_SIZE
             if value.size > max_size:
                 raise serializers.ValidationError(
-                    'El video es demasiado grande. Tamaño máximo: 50MB'
+                    f'El video es demasiado grande. Tamaño máximo: {max_size // (1024 * 1024)}MB'
                 )
-            
+
             # Validar tipo
-            allowed_types = [
-                'video/mp4',
-                'video/quicktime',
-                'video/x-msvideo'
-            ]
-            if value.content_type not in allowed_types:
+            if value.content_type not in ALLOWED_VIDEO_TYPES:
                 raise serializers.ValidationError(
                     'Tipo de video no permitido. Solo MP4, MOV y AVI'
                 )
         
         return value
 
+    def validate_upload_id(self, value):
+        upload = VideoUpload.objects.filter(
+            id=value, user=self.context['request'].user
+        ).first()
+        if upload is None:
+            raise serializers.ValidationError('Subida no encontrada')
+        if upload.status != 'complete':
+            raise serializers.ValidationError('La subida no está completa o ya se usó')
+        return upload
+
     def validate(self, data):
         # Al menos uno de: content, image o video debe estar presente
-        if not data.get('content') and not data.get('image') and not data.get('video'):
+        if not any(data.get(field) for field in ('content', 'image', 'video', 'upload_id')):
             raise serializers.ValidationError(
                 'Debes proporcionar contenido, imagen o video'
             )
+        if data.get('video') and data.get('upload_id'):
+            raise serializers.ValidationError(
+                'Envía el video o el upload_id, no ambos'
+            )
         return data
 
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
+        upload = validated_data.pop('upload_id', None)
+        with transaction.atomic():
+            if upload is not None:
+                with open(upload.temp_path, 'rb') as video:
+                    validated_data['video'] = File(video, name=upload.filename)
+                    story = self._create_story(validated_data)
+                VideoUpload.objects.filter(pk=upload.pk).update(status='used')
+                transaction.on_commit(lambda: upload.temp_path.unlink(missing_ok=True))
+            else:
+                story = self._create_story(validated_data)
+            if story.video:
+                enqueue_transcode(story.id)
+        return story
+
+    def _create_story(self, validated_data):
+        if validated_data.get('video'):
+            validated_data['video_status'] = 'pending'
         return super().create(validated_data)
 
 
@@ -107,4 +146,55 @@ class StoryViewSerializer(serializers.ModelSerializer):
     class Meta:
         model = StoryView
         fields = ['id', 'user', 'story', 'viewed_at']
-        read_only_fields = ['id', 'user', 'viewed_at']
\ No newline at end of file
+        read_only_fields = ['id', 'user', 'viewed_at']
+
+class StoryTrayAuthorSerializer(serializers.ModelSerializer):
+    profile_picture = serializers.SerializerMethodField()
+
+    class Meta:
+        model = User
+        fields = ['id', 'username', 'first_name', 'last_name', 'profile_picture']
+
+    def get_profile_picture(self, obj):
+        if obj.profile_picture:
+            return obj.profile_picture.url
+        return None
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    chunk_size = serializers.SerializerMethodField()
+
+    class Meta:
+        model = VideoUpload
+        fields = [
+            'id', 'filename', 'content_type', 'total_size', 'received', 'status',
+            'chunk_size', 'created_at'
+        ]
+        read_only_fields = ['id', 'received', 'status', 'created_at']
+
+    def get_chunk_size(self, obj):
+        return settings.STORY_UPLOAD_CHUNK_SIZE
+
+    def validate_content_type(self, value):
+        if value not in ALLOWED_VIDEO_TYPES:
+            raise serializers.ValidationError(
+                'Tipo de video no permitido. Solo MP4, MOV y AVI'
+            )
+        return value
+
+    def validate_total_size(self, value):
+        max_size = settings.STORY_VIDEO_MAX_SIZE
+        if not 0 < value <= max_size:
+            raise serializers.ValidationError(
+                f'El video es demasiado grande. Tamaño máximo: {max_size // (1024 * 1024)}MB'
+            )
+        return value
+
+
+class StoryArchiveSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StoryArchive
+        fields = [
+            'id', 'story_id', 'content', 'image', 'video', 'background_color',
+            'views_count', 'created_at', 'expired_at'
+        ]
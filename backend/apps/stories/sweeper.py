@@ -0,0 +1,125 @@
+"""
+Barrido de historias caducadas.
+
+``sweep_expired_stories`` borra por lotes de ``STORY_SWEEP_BATCH_SIZE`` las
+historias caducadas hace más de ``STORY_SWEEP_GRACE_SECONDS`` segundos junto
+con sus ``StoryView`` y, tras el commit de cada lote, elimina sus ficheros del
+storage. Con ``STORY_ARCHIVE_ENABLED`` las historias pasan a ``StoryArchive``
+con sus ficheros en lugar de borrarse. ``sweep_stale_uploads`` elimina las
+subidas por partes sin actividad en ``STORY_UPLOAD_EXPIRY_SECONDS``. Se programa con
+``python manage.py sweep_stories`` (cron o ``--interval``).
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Story, StoryArchive, StoryView, VideoUpload
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SweepStats:
+    stories: int = 0
+    views: int = 0
+    archived: int = 0
+    files: int = 0
+    bytes: int = 0
+    missing_files: list = field(default_factory=list)
+
+    def __str__(self):
+        return (
+            f'{self.stories} historias, {self.views} vistas, {self.archived} archivadas, '
+            f'{self.files} ficheros ({self.bytes} bytes)'
+        )
+
+
+def expired_stories(now=None):
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=settings.STORY_SWEEP_GRACE_SECONDS)
+    return Story.objects.filter(expires_at__lt=cutoff)
+
+
+def sweep_expired_stories(batch_size=None, archive=None, dry_run=False):
+    """Borra (o archiva) las historias caducadas; devuelve un ``SweepStats``"""
+    batch_size = batch_size or settings.STORY_SWEEP_BATCH_SIZE
+    archive = settings.STORY_ARCHIVE_ENABLED if archive is None else archive
+    stats = SweepStats()
+    queryset = expired_stories()
+
+    if dry_run:
+        stats.stories = queryset.count()
+        stats.views = StoryView.objects.filter(story__in=queryset).count()
+        return stats
+
+    while True:
+        stories = list(
+            queryset.order_by('expires_at').annotate(views_total=Count('views'))[:batch_size]
+        )
+        if not stories:
+            return stats
+        files = _sweep_batch(stories, archive, stats)
+        if files:
+            transaction.on_commit(lambda files=files: _delete_files(files, stats))
+
+
+def _sweep_batch(stories, archive, stats):
+    ids = [story.id for story in stories]
+    with transaction.atomic():
+        if archive:
+            StoryArchive.objects.bulk_create([
+                StoryArchive(
+                    author_id=story.author_id,
+                    story_id=story.id,
+                    content=story.content,
+                    image=story.image.name or None,
+                    video=story.video.name or None,
+                    background_color=story.background_color,
+                    views_count=story.views_total,
+                    created_at=story.created_at,
+                    expired_at=story.expires_at,
+                )
+                for story in stories
+            ], ignore_conflicts=True)
+            stats.archived += len(stories)
+
+        stats.views += StoryView.objects.filter(story_id__in=ids).delete()[0]
+        _, deleted = Story.objects.filter(id__in=ids).delete()
+        stats.stories += deleted.get(Story._meta.label, 0)
+
+    # Con archivo, imagen y vídeo quedan para el autor; las versiones derivadas no
+    fields = ('video_low', 'video_poster') if archive else ('image', 'video', 'video_low', 'video_poster')
+    return [name for story in stories for name in (getattr(story, f).name for f in fields) if name]
+
+
+def sweep_stale_uploads(dry_run=False):
+    """Borra las subidas de vídeo abandonadas o ya usadas y sus ficheros temporales"""
+    cutoff = timezone.now() - timedelta(seconds=settings.STORY_UPLOAD_EXPIRY_SECONDS)
+    uploads = list(VideoUpload.objects.filter(updated_at__lt=cutoff))
+    if dry_run or not uploads:
+        return len(uploads)
+    for upload in uploads:
+        upload.temp_path.unlink(missing_ok=True)
+    VideoUpload.objects.filter(id__in=[upload.id for upload in uploads]).delete()
+    return len(uploads)
+
+
+def _delete_files(names, stats):
+    for name in names:
+        try:
+            size = default_storage.size(name)
+            default_storage.delete(name)
+        except FileNotFoundError:
+            stats.missing_files.append(name)
+            continue
+        except Exception:
+            logger.exception('No se pudo borrar el fichero de historia %s', name)
+            continue
+        stats.files += 1
+        stats.bytes += size
@@ -0,0 +1,257 @@
+import os
+import shutil
+import subprocess
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.users.models import Follow
+from apps.users.testing import create_user
+from .models import Story, StoryArchive, StoryView, VideoUpload
+from .sweeper import sweep_expired_stories, sweep_stale_uploads
+from .transcoding import transcode_story
+
+
+def use_temp_media(test):
+    media_root = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+    settings_override = override_settings(
+        MEDIA_ROOT=media_root, STORY_UPLOAD_TEMP_DIR=os.path.join(media_root, 'uploads')
+    )
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+class StoryTrayTests(TestCase):
+    """Tests de la bandeja de historias agrupada por autor"""
+
+    def setUp(self):
+        self.user = create_user('viewer')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        self.seen_author = create_user('seen')
+        self.unseen_author = create_user('unseen')
+        for author in (self.seen_author, self.unseen_author):
+            Follow.objects.create(follower=self.user, following=author)
+
+        seen = Story.objects.create(author=self.seen_author, content='vista')
+        StoryView.objects.create(user=self.user, story=seen)
+        for i in range(2):
+            Story.objects.create(author=self.unseen_author, content=f'nueva {i}')
+        Story.objects.create(author=self.user, content='propia')
+        Story.objects.create(
+            author=self.unseen_author, content='caducada',
+            expires_at=timezone.now() - timedelta(hours=1)
+        )
+
+    def test_tray_groups_by_author(self):
+        """Propias primero, después autores con historias sin ver"""
+        response = self.client.get('/api/stories/tray/')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(
+            [tray['author']['username'] for tray in response.data],
+            ['viewer', 'unseen', 'seen']
+        )
+        unseen = response.data[1]
+        self.assertEqual((unseen['has_unseen'], unseen['unseen_count']), (True, 2))
+        self.assertEqual([story['content'] for story in unseen['stories']], ['nueva 0', 'nueva 1'])
+        self.assertFalse(response.data[2]['has_unseen'])
+        self.assertTrue(response.data[2]['stories'][0]['is_viewed'])
+
+    def test_tray_uses_fixed_number_of_queries(self):
+        for i in range(5):
+            author = create_user(f'author{i}')
+            Follow.objects.create(follower=self.user, following=author)
+            Story.objects.create(author=author, content='hola')
+
+        # Autenticación forzada: seguidos + historias
+        with self.assertNumQueries(2):
+            self.client.get('/api/stories/tray/')
+
+
+@override_settings(STORY_SWEEP_GRACE_SECONDS=0, STORY_SWEEP_BATCH_SIZE=2)
+class StorySweeperTests(TestCase):
+    """Tests del barrido de historias caducadas"""
+
+    def setUp(self):
+        use_temp_media(self)
+
+        self.author = create_user('author')
+        self.viewer = create_user('viewer')
+        self.expired = []
+        for i in range(3):
+            story = Story(
+                author=self.author, content=f'vieja {i}',
+                expires_at=timezone.now() - timedelta(hours=1)
+            )
+            story.video.save(f'video{i}.mp4', ContentFile(b'x' * 100), save=False)
+            story.save()
+            StoryView.objects.create(user=self.viewer, story=story)
+            self.expired.append(story)
+        self.active = Story.objects.create(author=self.author, content='activa')
+
+    def test_sweep_deletes_rows_and_files(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = sweep_expired_stories()
+
+        self.assertEqual((stats.stories, stats.views, stats.files, stats.bytes), (3, 3, 3, 300))
+        self.assertEqual(list(Story.objects.all()), [self.active])
+        self.assertFalse(StoryView.objects.exists())
+        for story in self.expired:
+            self.assertFalse(default_storage.exists(story.video.name))
+
+    def test_dry_run_changes_nothing(self):
+        stats = sweep_expired_stories(dry_run=True)
+        self.assertEqual((stats.stories, stats.views), (3, 3))
+        self.assertEqual(Story.objects.count(), 4)
+
+    def test_archive_keeps_files_for_the_author(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = sweep_expired_stories(archive=True)
+
+        self.assertEqual((stats.archived, stats.files), (3, 0))
+        archived = StoryArchive.objects.get(story_id=self.expired[0].id)
+        self.assertEqual(archived.views_count, 1)
+        self.assertTrue(default_storage.exists(archived.video.name))
+
+        client = APIClient()
+        client.force_authenticate(user=self.author)
+        response = client.get('/api/stories/archive/')
+        self.assertEqual(response.data['count'], 3)
+
+
+@override_settings(STORY_UPLOAD_CHUNK_SIZE=4)
+class VideoUploadTests(TestCase):
+    """Tests de la subida de vídeo por partes"""
+
+    def setUp(self):
+        use_temp_media(self)
+        self.user = create_user('uploader')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+        response = self.client.post('/api/stories/uploads/', {
+            'filename': 'clip.mp4', 'content_type': 'video/mp4', 'total_size': 10
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['chunk_size'], 4)
+        self.url = f"/api/stories/uploads/{response.data['id']}/"
+
+    def put_chunk(self, data, start, total=10):
+        return self.client.generic(
+            'PUT', self.url, data, content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(data) - 1}/{total}'
+        )
+
+    def test_upload_resumes_from_received_offset(self):
+        self.assertEqual(self.put_chunk(b'0123', 0).data['received'], 4)
+
+        # Una parte repetida o adelantada indica desde dónde continuar
+        response = self.put_chunk(b'89', 8)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['received'], 4)
+        self.assertEqual(self.client.get(self.url).data['received'], 4)
+
+        self.put_chunk(b'4567', 4)
+        response = self.put_chunk(b'89', 8)
+        self.assertEqual(response.data['status'], 'complete')
+
+        upload = VideoUpload.objects.get()
+        self.assertEqual(upload.temp_path.read_bytes(), b'0123456789')
+
+    def test_rejects_chunks_larger_than_chunk_size(self):
+        response = self.put_chunk(b'012345', 0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(VideoUpload.objects.get().received, 0)
+
+    def test_rejects_videos_over_max_size(self):
+        with override_settings(STORY_VIDEO_MAX_SIZE=5):
+            response = self.client.post('/api/stories/uploads/', {
+                'filename': 'big.mp4', 'content_type': 'video/mp4', 'total_size': 10
+            }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    @mock.patch('apps.stories.transcoding._submit')
+    def test_story_from_completed_upload_is_queued(self, submit):
+        self.put_chunk(b'0123', 0)
+        self.put_chunk(b'4567', 4)
+        self.put_chunk(b'89', 8)
+        upload = VideoUpload.objects.get()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/stories/', {'upload_id': str(upload.id)}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        story = Story.objects.get()
+        self.assertEqual(story.video_status, 'pending')
+        self.assertEqual(story.video.read(), b'0123456789')
+        submit.assert_called_once_with(story.id)
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, 'used')
+        self.assertFalse(upload.temp_path.exists())
+
+        # Una subida usada no puede adjuntarse otra vez
+        response = self.client.post('/api/stories/', {'upload_id': str(upload.id)}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_sweep_removes_stale_uploads(self):
+        self.put_chunk(b'0123', 0)
+        upload = VideoUpload.objects.get()
+        VideoUpload.objects.update(updated_at=timezone.now() - timedelta(days=2))
+
+        self.assertEqual(sweep_stale_uploads(), 1)
+        self.assertFalse(VideoUpload.objects.exists())
+        self.assertFalse(upload.temp_path.exists())
+
+
+def fake_ffmpeg(command, **kwargs):
+    with open(command[-1], 'wb') as output:
+        output.write(b'transcoded')
+    return subprocess.CompletedProcess(command, 0, b'', b'')
+
+
+@mock.patch('apps.stories.transcoding.shutil.which', return_value='/usr/bin/ffmpeg')
+class TranscodeTests(TestCase):
+    """Tests del procesado de vídeo con ffmpeg simulado"""
+
+    def setUp(self):
+        use_temp_media(self)
+        self.story = Story(author=create_user('author'), video_status='pending')
+        self.story.video.save('clip.mov', ContentFile(b'original'), save=False)
+        self.story.save()
+        self.original = self.story.video.name
+
+    @mock.patch('apps.stories.transcoding.subprocess.run', side_effect=fake_ffmpeg)
+    def test_transcode_replaces_video_and_adds_renditions(self, run, which):
+        transcode_story(self.story.id)
+
+        self.story.refresh_from_db()
+        self.assertEqual(self.story.video_status, 'ready')
+        self.assertTrue(self.story.video.name.endswith('.mp4'))
+        self.assertTrue(self.story.video_low.name)
+        self.assertTrue(self.story.video_poster.name.endswith('.jpg'))
+        self.assertFalse(default_storage.exists(self.original))
+        self.assertIn('+faststart', run.call_args_list[0].args[0])
+        self.assertEqual(run.call_count, 3)
+
+        # Ya procesada: no se vuelve a reclamar
+        self.assertIsNone(transcode_story(self.story.id))
+
+    @mock.patch('apps.stories.transcoding.subprocess.run',
+                return_value=subprocess.CompletedProcess([], 1, b'', b'Invalid data found'))
+    def test_failure_keeps_original(self, run, which):
+        transcode_story(self.story.id)
+
+        self.story.refresh_from_db()
+        self.assertEqual(self.story.video_status, 'failed')
+        self.assertIn('Invalid data', self.story.video_error)
+        self.assertEqual(self.story.video.name, self.original)
+        self.assertTrue(default_storage.exists(self.original))
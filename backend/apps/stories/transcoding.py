@@ -0,0 +1,199 @@
+"""
+Cola de transcodificación de vídeos de historias.
+
+Al crear una historia con vídeo se marca ``video_status='pending'`` y, tras el
+commit, su id entra en una cola atendida por ``STORY_TRANSCODE_WORKERS`` hilos.
+Cada worker ejecuta ffmpeg como subproceso para generar:
+
+- un MP4 H.264/AAC con ``+faststart`` que sustituye al original en ``video``,
+- ``video_low``, una versión de baja tasa de bits (360p),
+- ``video_poster``, un fotograma representativo.
+
+El estado (``pending`` → ``processing`` → ``ready``/``failed``) se expone en la
+historia. Los trabajos interrumpidos se retoman con
+``python manage.py transcode_stories``.
+"""
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Story
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_VIDEO_TYPES = ('video/mp4', 'video/quicktime', 'video/x-msvideo')
+
+
+class TranscodeError(Exception):
+    pass
+
+
+_queue = queue.Queue()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def enqueue_transcode(story_id):
+    """Encola el vídeo de una historia para procesarlo tras el commit"""
+    transaction.on_commit(lambda: _submit(story_id))
+
+
+def _submit(story_id):
+    _ensure_workers()
+    _queue.put(story_id)
+
+
+def _ensure_workers():
+    with _workers_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        for _ in range(settings.STORY_TRANSCODE_WORKERS - len(_workers)):
+            worker = threading.Thread(target=_work, daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def _work():
+    while True:
+        story_id = _queue.get()
+        try:
+            transcode_story(story_id)
+        except Exception:
+            logger.exception('Error inesperado transcodificando la historia %s', story_id)
+        finally:
+            connection.close()
+            _queue.task_done()
+
+
+def claim_story(story_id):
+    """Marca la historia como en proceso si está pendiente o su proceso quedó abandonado"""
+    stale_before = timezone.now() - timedelta(seconds=settings.STORY_TRANSCODE_TIMEOUT * 3)
+    return Story.objects.filter(pk=story_id).filter(
+        Q(video_status='pending') | Q(video_status='processing', video_updated_at__lt=stale_before)
+    ).update(video_status='processing', video_updated_at=timezone.now()) == 1
+
+
+def resumable_stories():
+    stale_before = timezone.now() - timedelta(seconds=settings.STORY_TRANSCODE_TIMEOUT * 3)
+    return Story.objects.filter(
+        Q(video_status='pending') | Q(video_status='processing', video_updated_at__lt=stale_before)
+    ).order_by('created_at')
+
+
+def transcode_story(story_id):
+    """Procesa el vídeo de una historia; devuelve la historia o None si no le tocaba"""
+    close_old_connections()
+    if not claim_story(story_id):
+        return None
+
+    story = Story.objects.get(pk=story_id)
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            source = _local_copy(story.video.name, workdir)
+            outputs = {}
+            for rendition, command in ffmpeg_commands(source, workdir).items():
+                outputs[rendition] = command[-1]
+                run_ffmpeg(command)
+            _store_outputs(story, outputs)
+    except Exception as exc:
+        logger.exception('No se pudo transcodificar la historia %s', story_id)
+        Story.objects.filter(pk=story_id).update(
+            video_status='failed', video_error=str(exc)[:2000], video_updated_at=timezone.now()
+        )
+        story.video_status = 'failed'
+        return story
+
+    story.video_status = 'ready'
+    return story
+
+
+def ffmpeg_commands(source, workdir):
+    """Órdenes de ffmpeg por versión; el último argumento es el fichero de salida"""
+    ffmpeg = settings.FFMPEG_BINARY
+    return {
+        'video': [
+            ffmpeg, '-y', '-i', source,
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', '23', '-pix_fmt', 'yuv420p',
+            '-vf', "scale='min(1080,iw)':-2",
+            '-c:a', 'aac', '-b:a', '128k',
+            '-movflags', '+faststart',
+            os.path.join(workdir, 'web.mp4'),
+        ],
+        'video_low': [
+            ffmpeg, '-y', '-i', source,
+            '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+            '-b:v', '400k', '-maxrate', '500k', '-bufsize', '1000k',
+            '-vf', "scale=-2:'min(360,ih)'",
+            '-c:a', 'aac', '-b:a', '64k',
+            '-movflags', '+faststart',
+            os.path.join(workdir, 'low.mp4'),
+        ],
+        'video_poster': [
+            ffmpeg, '-y', '-i', source,
+            '-vf', 'thumbnail', '-frames:v', '1', '-q:v', '3',
+            os.path.join(workdir, 'poster.jpg'),
+        ],
+    }
+
+
+def run_ffmpeg(command):
+    if shutil.which(command[0]) is None:
+        raise TranscodeError(f'ffmpeg no disponible ({command[0]})')
+    try:
+        result = subprocess.run(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            timeout=settings.STORY_TRANSCODE_TIMEOUT,
+        )
+    except subprocess.TimeoutExpired:
+        raise TranscodeError(f'ffmpeg superó {settings.STORY_TRANSCODE_TIMEOUT}s')
+    if result.returncode != 0:
+        raise TranscodeError(result.stderr.decode(errors='replace')[-2000:])
+
+
+def _local_copy(name, workdir):
+    """Ruta local del vídeo original, copiándolo si el storage no es local"""
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        target = os.path.join(workdir, 'source' + Path(name).suffix)
+        with default_storage.open(name, 'rb') as source, open(target, 'wb') as destination:
+            for chunk in source.chunks():
+                destination.write(chunk)
+        return target
+
+
+def _store_outputs(story, outputs):
+    original = story.video.name
+    base = Path(original).stem
+    names = {}
+    for rendition, path in outputs.items():
+        field = story._meta.get_field(rendition)
+        suffix = Path(path).suffix
+        upload_name = field.generate_filename(story, f'{base}_{Path(path).stem}{suffix}')
+        with open(path, 'rb') as output:
+            names[rendition] = default_storage.save(upload_name, File(output))
+
+    # Solo si la historia sigue existiendo con el mismo vídeo
+    updated = Story.objects.filter(pk=story.pk, video=original).update(
+        video_status='ready', video_error='', video_updated_at=timezone.now(), **names
+    )
+    if not updated:
+        for name in names.values():
+            default_storage.delete(name)
+        raise TranscodeError('La historia se borró o cambió durante el proceso')
+    default_storage.delete(original)
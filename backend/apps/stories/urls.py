@@ -3,6 +3,10 @@ from . import views
 
 urlpatterns = [
     path('', views.StoryListCreateView.as_view(), name='story-list-create'),
+    path('tray/', views.story_tray, name='story-tray'),
+    path('uploads/', views.VideoUploadCreateView.as_view(), name='video-upload-create'),
+    path('uploads/<uuid:upload_id>/', views.VideoUploadChunkView.as_view(), name='video-upload-chunk'),
+    path('archive/', views.StoryArchiveListView.as_view(), name='story-archive'),
     path('user/<str:username>/', views.UserStoriesView.as_view(), name='user-stories'),
     path('<int:story_id>/view/', views.view_story, name='view-story'),
     path('<int:story_id>/viewers/', views.story_viewers, name='story-viewers'),
@@ -1,17 +1,36 @@
+import re
+
 from rest_framework import generics, status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from .models import Story, StoryView
-from .serializers import StorySerializer, StoryCreateSerializer
+from django.db.models import Count, Exists, OuterRef
+from .models import Story, StoryArchive, StoryView, VideoUpload
+from .serializers import (
+    StoryArchiveSerializer, StorySerializer, StoryCreateSerializer, StoryTrayAuthorSerializer,
+    VideoUploadSerializer
+)
 from apps.users.models import Follow
 
 User = get_user_model()
 
 
+def with_viewer_state(queryset, user):
+    """Anota el número de vistas y si ``user`` ya vio cada historia"""
+    return queryset.select_related('author').annotate(
+        views_total=Count('views'),
+        viewed_by_user=Exists(
+            StoryView.objects.filter(user=user, story=OuterRef('pk'))
+        ),
+    )
+
+
 class StoryListCreateView(generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     
@@ -23,10 +42,10 @@ class StoryListCreateView(generics.ListCreateAPIView):
     def get_queryset(self):
         # Mostrar historias activas del usuario y de usuarios que sigue
         following_users = Follow.objects.filter(follower=self.request.user).values_list('following', flat=True)
-        return Story.objects.filter(
+        return with_viewer_state(Story.objects.filter(
             author__in=list(following_users) + [self.request.user.id],
             expires_at__gt=timezone.now()
-        )
+        ), self.request.user)
 
 
 class UserStoriesView(generics.ListAPIView):
@@ -36,10 +55,148 @@ class UserStoriesView(generics.ListAPIView):
     def get_queryset(self):
         username = self.kwargs['username']
         user = get_object_or_404(User, username=username)
-        return Story.objects.filter(
+        return with_viewer_state(Story.objects.filter(
             author=user,
             expires_at__gt=timezone.now()
+        ), self.request.user)
+
+
+class StoryArchiveListView(generics.ListAPIView):
+    """Historias caducadas que el usuario conserva en su archivo"""
+    serializer_class = StoryArchiveSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return StoryArchive.objects.filter(author=self.request.user)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def story_tray(request):
+    """
+    Historias activas del usuario y de quienes sigue agrupadas por autor.
+    Primero las propias, después los autores con historias sin ver y, dentro
+    de cada grupo, los que publicaron más recientemente.
+    """
+    following_users = Follow.objects.filter(follower=request.user).values_list('following', flat=True)
+    stories = with_viewer_state(Story.objects.filter(
+        author__in=list(following_users) + [request.user.id],
+        expires_at__gt=timezone.now()
+    ), request.user).order_by('author_id', 'created_at')
+
+    trays = {}
+    for story in stories:
+        trays.setdefault(story.author_id, []).append(story)
+
+    data = []
+    for author_id, author_stories in trays.items():
+        is_own = author_id == request.user.id
+        unseen_count = 0 if is_own else sum(
+            not story.viewed_by_user for story in author_stories
         )
+        data.append({
+            'author': StoryTrayAuthorSerializer(author_stories[0].author).data,
+            'is_own': is_own,
+            'has_unseen': unseen_count > 0,
+            'unseen_count': unseen_count,
+            'stories_count': len(author_stories),
+            'latest_created_at': author_stories[-1].created_at,
+            'stories': StorySerializer(
+                author_stories, many=True, context={'request': request}
+            ).data,
+        })
+
+    data.sort(key=lambda tray: tray['latest_created_at'], reverse=True)
+    data.sort(key=lambda tray: (not tray['is_own'], not tray['has_unseen']))
+    return Response(data)
+
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+UPLOAD_READ_SIZE = 64 * 1024
+
+
+class VideoUploadCreateView(generics.CreateAPIView):
+    """Inicia una subida de vídeo por partes"""
+    serializer_class = VideoUploadSerializer
+    permission_classes = [IsAuthenticated]
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class VideoUploadChunkView(APIView):
+    """
+    GET devuelve cuántos bytes se han recibido para poder reanudar la subida.
+    PUT añade una parte con la cabecera ``Content-Range: bytes inicio-fin/total``;
+    el cuerpo se escribe en disco por bloques sin cargarlo entero en memoria.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, upload_id):
+        upload = get_object_or_404(VideoUpload, id=upload_id, user=request.user)
+        return Response(VideoUploadSerializer(upload).data)
+
+    def put(self, request, upload_id):
+        match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+        if not match:
+            return Response(
+                {'error': 'Cabecera Content-Range inválida'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end, total = (int(value) for value in match.groups())
+        length = end - start + 1
+
+        with transaction.atomic():
+            upload = get_object_or_404(
+                VideoUpload.objects.select_for_update(), id=upload_id, user=request.user
+            )
+            if upload.status != 'uploading':
+                return Response(
+                    {'error': 'La subida ya está completa', 'received': upload.received},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if start != upload.received:
+                # El cliente debe continuar desde el último byte confirmado
+                return Response(
+                    {'error': 'Parte fuera de orden', 'received': upload.received},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if (total != upload.total_size or length <= 0 or end >= total
+                    or length > settings.STORY_UPLOAD_CHUNK_SIZE):
+                return Response(
+                    {'error': 'Rango no válido para esta subida'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            written = self._write_chunk(request, upload, start, length)
+            if written != length:
+                return Response(
+                    {'error': 'Parte incompleta', 'received': upload.received},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            upload.received = end + 1
+            if upload.received == upload.total_size:
+                upload.status = 'complete'
+            upload.save(update_fields=['received', 'status', 'updated_at'])
+
+        return Response(VideoUploadSerializer(upload).data)
+
+    def _write_chunk(self, request, upload, start, length):
+        path = upload.temp_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        written = 0
+        with open(path, 'r+b' if path.exists() else 'wb') as destination:
+            destination.seek(start)
+            while written < length:
+                block = request.read(min(UPLOAD_READ_SIZE, length - written))
+                if not block:
+                    break
+                destination.write(block)
+                written += len(block)
+            # Descarta lo que quedara de un intento anterior
+            destination.truncate(start + written)
+        return written
 
 
 @api_view(['POST'])
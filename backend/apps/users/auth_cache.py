@@ -0,0 +1,64 @@
+"""
+Datos de autenticación de usuarios guardados en caché.
+
+``CachedJWTAuthentication`` no carga la fila completa del usuario en cada
+petición: guarda durante ``AUTH_USER_CACHE_TTL`` segundos una copia reducida
+(``SNAPSHOT_FIELDS``) y construye con ella un ``User`` cuyos demás campos
+quedan diferidos: el primer acceso a cualquiera de ellos carga todos en una
+consulta (``User.refresh_from_db``). Las vistas que trabajan con el modelo
+completo (perfil propio, contraseña) lo cargan de antemano con ``full_user``.
+
+Cualquier cambio que afecte a la autorización de un usuario (baneo, rol,
+contraseña, desactivación) debe llamar a ``invalidate_auth_cache`` para que el
+resto de workers no sigan usando el estado anterior; los ``save()`` del
+usuario lo hacen solos mediante una señal.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+SNAPSHOT_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'role',
+    'is_banned', 'ban_reason', 'is_active', 'is_staff', 'is_superuser',
+)
+
+
+def auth_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def invalidate_auth_cache(user_ids):
+    cache.delete_many([auth_cache_key(user_id) for user_id in user_ids])
+
+
+def get_user_snapshot(user_id):
+    """Copia reducida del usuario (dict) o None si no existe"""
+    key = auth_cache_key(user_id)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        User = get_user_model()
+        row = User.objects.filter(pk=user_id).values(*SNAPSHOT_FIELDS, 'password').first()
+        if row is None:
+            return None
+        # En la caché solo el hash del hash, como en el claim de revocación de simplejwt
+        row['password_md5'] = get_md5_hash_password(row.pop('password'))
+        snapshot = row
+        cache.set(key, snapshot, settings.AUTH_USER_CACHE_TTL)
+    return snapshot
+
+
+def user_from_snapshot(snapshot):
+    """``User`` con los campos de la copia; el resto se carga de la base de datos si se usa"""
+    User = get_user_model()
+    # from_db espera los valores en el orden de los campos del modelo
+    fields = [f.attname for f in User._meta.concrete_fields if f.attname in SNAPSHOT_FIELDS]
+    return User.from_db('default', fields, [snapshot[field] for field in fields])
+
+
+def full_user(user):
+    """Carga los campos que falten del usuario (una consulta si venía de la caché)"""
+    deferred = user.get_deferred_fields()
+    if deferred:
+        user.refresh_from_db(fields=list(deferred))
+    return user
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.11 on 2026-10-19 17:07
+
+from django.db import migrations, models
+
+
+def fill_email_domain(apps, schema_editor):
+    User = apps.get_model('users', 'User')
+    batch = []
+    for user in User.objects.only('id', 'email').iterator(chunk_size=1000):
+        user.email_domain = user.email.rpartition('@')[2].lower()
+        batch.append(user)
+        if len(batch) >= 1000:
+            User.objects.bulk_update(batch, ['email_domain'])
+            batch = []
+    if batch:
+        User.objects.bulk_update(batch, ['email_domain'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='email_domain',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=254),
+        ),
+        migrations.RunPython(fill_email_domain, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 4.2.11 on 2026-10-19 17:22
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class PostgresAddIndex(migrations.AddIndex):
+    """``AddIndex`` que solo crea el índice en PostgreSQL (opclasses y GIN no existen en SQLite)"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_user_email_domain'),
+    ]
+
+    operations = [
+        # No hace nada fuera de PostgreSQL
+        TrigramExtension(),
+        PostgresAddIndex(
+            model_name='user',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('username'), name='varchar_pattern_ops'), name='user_username_pattern_idx'),
+        ),
+        PostgresAddIndex(
+            model_name='user',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('email'), name='varchar_pattern_ops'), name='user_email_pattern_idx'),
+        ),
+        PostgresAddIndex(
+            model_name='user',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('first_name'), name='varchar_pattern_ops'), name='user_first_name_pattern_idx'),
+        ),
+        PostgresAddIndex(
+            model_name='user',
+            index=models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('last_name'), name='varchar_pattern_ops'), name='user_last_name_pattern_idx'),
+        ),
+        PostgresAddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('username'), name='gin_trgm_ops'), name='user_username_trgm_idx'),
+        ),
+        PostgresAddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('email'), name='gin_trgm_ops'), name='user_email_trgm_idx'),
+        ),
+        PostgresAddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('first_name'), name='gin_trgm_ops'), name='user_first_name_trgm_idx'),
+        ),
+        PostgresAddIndex(
+            model_name='user',
+            index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('last_name'), name='gin_trgm_ops'), name='user_last_name_trgm_idx'),
+        ),
+    ]
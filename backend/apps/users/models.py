@@ -1,7 +1,14 @@
+from django.conf import settings
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.core.cache import cache
 from django.db import models
+from django.db.models.functions import Lower
 from .utils import generate_unique_filename
 
+# Campos de la búsqueda de usuarios de la administración
+SEARCH_FIELDS = ('username', 'email', 'first_name', 'last_name')
+
 
 def user_profile_picture_path(instance, filename):
     """Genera path único para foto de perfil"""
@@ -9,6 +16,11 @@ def user_profile_picture_path(instance, filename):
     return f'profile_pics/{unique_filename}'
 
 
+def email_domain(email):
+    """Dominio del email en minúsculas (``ana@Spam.com`` -> ``spam.com``)"""
+    return email.rpartition('@')[2].lower()
+
+
 def user_cover_picture_path(instance, filename):
     """Genera path único para foto de portada"""
     unique_filename = generate_unique_filename(filename)
@@ -45,12 +57,31 @@ class User(AbstractUser):
     ban_reason = models.TextField(blank=True)
     banned_at = models.DateTimeField(null=True, blank=True)
     theme_preference = models.CharField(max_length=10, choices=THEME_CHOICES, default='light')
+    # Copia indexada del dominio del email para buscar oleadas de spam (se rellena en save())
+    email_domain = models.CharField(max_length=254, blank=True, editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    class Meta(AbstractUser.Meta):
+        # Búsqueda sin distinguir mayúsculas (administración). SQLite usa los
+        # índices de LOWER() para el prefijo por rango; PostgreSQL, los de
+        # varchar_pattern_ops para LIKE 'term%' y los de trigramas para
+        # match=contains (estos dos solo se crean allí: migración 0008)
+        indexes = [
+            *(models.Index(Lower(field), name=f'user_{field}_lower_idx') for field in SEARCH_FIELDS),
+            *(
+                models.Index(OpClass(Lower(field), name='varchar_pattern_ops'), name=f'user_{field}_pattern_idx')
+                for field in SEARCH_FIELDS
+            ),
+            *(
+                GinIndex(OpClass(Lower(field), name='gin_trgm_ops'), name=f'user_{field}_trgm_idx')
+                for field in SEARCH_FIELDS
+            ),
+        ]
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} (@{self.username})"
 
@@ -58,6 +89,26 @@ class User(AbstractUser):
     def full_name(self):
         return f"{self.first_name} {self.last_name}"
 
+    def save(self, *args, **kwargs):
+        # Con el email diferido (caché de autenticación) no se carga solo para esto
+        if 'email' not in self.get_deferred_fields():
+            self.email_domain = email_domain(self.email)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'email' in update_fields:
+                kwargs['update_fields'] = {*update_fields, 'email_domain'}
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None):
+        # Los usuarios de la caché de autenticación (apps.users.auth_cache) solo
+        # traen algunos campos: al usar cualquier otro se cargan todos a la vez
+        deferred = self.get_deferred_fields()
+        if fields is not None and deferred and set(fields) <= deferred:
+            fields = list(deferred)
+        super().refresh_from_db(using=using, fields=fields)
+        if fields is not None and hasattr(self, '_public_profile'):
+            from .signals import public_profile_snapshot
+            self._public_profile = {**public_profile_snapshot(self), **self._public_profile}
+
     def get_followers_count(self):
         return self.followers.count()
 
@@ -96,4 +147,26 @@ class SystemSetting(models.Model):
     description = models.CharField(max_length=200, blank=True)
     
     def __str__(self):
-        return f"{self.key}: {self.value}"
\ No newline at end of file
+        return f"{self.key}: {self.value}"
+
+    @staticmethod
+    def cache_key(key):
+        return f'system_setting:{key}'
+
+    @classmethod
+    def get_value(cls, key):
+        """Valor de la clave desde la caché (también se cachean las claves inexistentes)"""
+        value = cache.get(cls.cache_key(key))
+        if value is None:
+            setting = cls.objects.filter(key=key).values_list('value', flat=True).first()
+            value = (setting,)
+            cache.set(cls.cache_key(key), value, settings.SYSTEM_SETTING_CACHE_TTL)
+        return value[0]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        cache.delete(self.cache_key(self.key))
+
+    def delete(self, *args, **kwargs):
+        cache.delete(self.cache_key(self.key))
+        return super().delete(*args, **kwargs)
\ No newline at end of file
@@ -0,0 +1,50 @@
+"""
+Perfiles públicos en caché (``config.tiered_cache``).
+
+``public_profile`` guarda ``PROFILE_CACHE_TTL`` segundos el perfil
+serializado sin ``is_following``, que depende de quién lo consulta. Cada
+entrada lleva la etiqueta ``user:<id>``: guardar el usuario o cambiar sus
+seguidores llama a ``invalidate_profiles``. Los seguimientos que se borran en
+cascada (al eliminar una cuenta) no la invalidan y se corrigen con el TTL.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.http import Http404
+
+from config.tiered_cache import cached, get_or_set, invalidate_tags
+
+
+def profile_tag(user_id):
+    return f'user:{user_id}'
+
+
+@cached('users:id:{0}', ttl=lambda: settings.PROFILE_CACHE_TTL)
+def user_id_for_username(username):
+    # Http404 no se guarda en caché: un usuario nuevo con ese nombre se ve al momento
+    user_id = get_user_model().objects.filter(username=username).values_list('id', flat=True).first()
+    if user_id is None:
+        raise Http404
+    return user_id
+
+
+def public_profile(request, username):
+    """Perfil de ``username`` serializado (sin ``is_following``)"""
+    from .serializers import PublicUserSerializer
+
+    user_id = user_id_for_username(username)
+
+    def load():
+        user = get_user_model().objects.filter(id=user_id).first()
+        if user is None:
+            raise Http404
+        return dict(PublicUserSerializer(user, context={'request': request}).data)
+
+    # Las URLs de las imágenes son absolutas: una entrada por host
+    return get_or_set(
+        f'users:profile:{user_id}:{request.get_host()}', load,
+        settings.PROFILE_CACHE_TTL, [profile_tag(user_id)],
+    )
+
+
+def invalidate_profiles(user_ids):
+    invalidate_tags(*(profile_tag(user_id) for user_id in user_ids))
@@ -52,6 +52,14 @@ class UserSerializer(serializers.ModelSerializer):
         return False
 
 
+class PublicUserSerializer(UserSerializer):
+    """``UserSerializer`` sin los campos que dependen de quién consulta (se puede cachear)"""
+    is_following = None
+
+    class Meta(UserSerializer.Meta):
+        fields = [field for field in UserSerializer.Meta.fields if field != 'is_following']
+
+
 class UserProfileSerializer(serializers.ModelSerializer):
     followers_count = serializers.SerializerMethodField()
     following_count = serializers.SerializerMethodField()
@@ -1,46 +1,103 @@
-from django.db.models.signals import post_save
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_init, post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from apps.chat.models import ChatRoom
+from notifications.outbox import publish_debounced
+from .auth_cache import invalidate_auth_cache
+from .models import Follow
+from .profile_cache import invalidate_profiles
 
 User = get_user_model()
 
+# Campos visibles para otros usuarios (chats, listas de conversaciones...)
+PUBLIC_PROFILE_FIELDS = ('username', 'first_name', 'last_name', 'profile_picture')
+
+
+def profile_watchers_group(user_id):
+    """Grupo de las conexiones interesadas en el perfil público de un usuario"""
+    return f'profile_watchers_{user_id}'
+
+
+def public_profile_snapshot(instance):
+    """Valores de los campos públicos cargados en la instancia (sin consultas)"""
+    deferred = instance.get_deferred_fields()
+    snapshot = {}
+    for field in PUBLIC_PROFILE_FIELDS:
+        if field in deferred:
+            continue
+        value = instance.__dict__.get(field)
+        # profile_picture puede ser el nombre del fichero o un FieldFile
+        snapshot[field] = getattr(value, 'name', value) or ''
+    return snapshot
+
+
+def public_profile_data(user):
+    profile_pic_url = None
+    if user.profile_picture:
+        profile_pic_url = user.profile_picture.url
+
+    return {
+        'id': user.id,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'full_name': f"{user.first_name} {user.last_name}",
+        'profile_picture': profile_pic_url
+    }
+
+
+@receiver(post_init, sender=User)
+def remember_public_profile(sender, instance, **kwargs):
+    instance._public_profile = public_profile_snapshot(instance)
+
 
 @receiver(post_save, sender=User)
-def user_profile_updated(sender, instance, created, **kwargs):
+def refresh_auth_cache(sender, instance, **kwargs):
+    # Rol, baneo, contraseña o estado pueden haber cambiado
+    invalidate_auth_cache([instance.id])
+
+
+@receiver(post_save, sender=User)
+def refresh_profile_cache(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    transaction.on_commit(lambda: invalidate_profiles([instance.id]))
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    # Cambian los contadores de seguidores/seguidos de ambos perfiles
+    if created:
+        transaction.on_commit(lambda: invalidate_profiles([instance.follower_id, instance.following_id]))
+
+
+@receiver(post_save, sender=User)
+def user_profile_updated(sender, instance, created, update_fields=None, **kwargs):
     """
     Señal que se ejecuta cuando se actualiza un usuario.
-    Envía una notificación via WebSocket a todos los chats donde participa.
+    Solo si cambió un campo público envía el nuevo perfil, una vez por ráfaga de
+    cambios, al grupo de conexiones que siguen ese perfil.
     """
-    if not created:
-        channel_layer = get_channel_layer()
-        
-        if channel_layer:
-            profile_pic_url = None
-            if instance.profile_picture:
-                profile_pic_url = instance.profile_picture.url
-            
-            user_data = {
-                'id': instance.id,
-                'username': instance.username,
-                'first_name': instance.first_name,
-                'last_name': instance.last_name,
-                'full_name': f"{instance.first_name} {instance.last_name}",
-                'profile_picture': profile_pic_url
-            }
-            
-            user_rooms = ChatRoom.objects.filter(
-                participants=instance
-            ).values_list('id', flat=True)
-            
-            for room_id in user_rooms:
-                async_to_sync(channel_layer.group_send)(
-                    f'chat_{room_id}',
-                    {
-                        'type': 'profile_update',
-                        'user_id': instance.id,
-                        'user_data': user_data
-                    }
-                )
\ No newline at end of file
+    if created:
+        return
+    if update_fields is not None and not set(update_fields) & set(PUBLIC_PROFILE_FIELDS):
+        # p. ej. el update_last_login de cada inicio de sesión
+        return
+
+    previous = getattr(instance, '_public_profile', {})
+    current = public_profile_snapshot(instance)
+    if all(field in previous and previous[field] == value for field, value in current.items()):
+        return
+    instance._public_profile = current
+
+    publish_debounced(
+        f'profile:{instance.id}',
+        profile_watchers_group(instance.id),
+        {
+            'type': 'profile_update',
+            'user_id': instance.id,
+            'user_data': public_profile_data(instance)
+        },
+        settings.PROFILE_UPDATE_DEBOUNCE
+    )
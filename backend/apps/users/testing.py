@@ -0,0 +1,16 @@
+"""
+Utilidades compartidas por los tests de las distintas apps.
+"""
+from django.contrib.auth import get_user_model
+
+
+def create_user(username, **extra):
+    """Crea un usuario de prueba con datos derivados del username."""
+    return get_user_model().objects.create_user(
+        username=username,
+        email=f'{username}@test.com',
+        password='testpass123',
+        first_name=username.capitalize(),
+        last_name='Test',
+        **extra
+    )
@@ -1,7 +1,15 @@
+from unittest.mock import patch
+
 from django.test import TestCase
 from django.contrib.auth import get_user_model
-from rest_framework.test import APITestCase, APIClient
+from django.contrib.auth.models import update_last_login
+from django.core.cache import cache
+from rest_framework.test import APITestCase, APIClient, APIRequestFactory
 from rest_framework import status
+from rest_framework_simplejwt.tokens import AccessToken
+from apps.authentication.authentication import CachedJWTAuthentication
+from config.tiered_cache import clear_local
+from .auth_cache import full_user
 from .models import Follow
 
 User = get_user_model()
@@ -307,3 +315,146 @@ class FollowModelTestCase(TestCase):
         from django.db import IntegrityError
         with self.assertRaises(IntegrityError):
             Follow.objects.create(follower=self.user1, following=self.user2)
+
+
+class ProfileUpdateBroadcastTestCase(TestCase):
+    """Tests de la difusión de cambios de perfil"""
+    
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@test.com',
+            password='testpass123',
+            first_name='Test',
+            last_name='User'
+        )
+        patcher = patch('apps.users.signals.publish_debounced')
+        self.publish = patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def test_login_does_not_broadcast(self):
+        """Actualizar last_login no difunde el perfil"""
+        update_last_login(None, self.user)
+        self.publish.assert_not_called()
+    
+    def test_save_without_public_changes_does_not_broadcast(self):
+        self.user.bio = 'Nueva bio'
+        self.user.save()
+        User.objects.get(pk=self.user.pk).save()
+        self.publish.assert_not_called()
+    
+    def test_public_change_is_sent_to_profile_watchers(self):
+        """Un cambio de nombre se envía una vez al grupo de observadores del perfil"""
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name = 'Nuevo'
+        user.save()
+        user.save()
+        
+        self.publish.assert_called_once()
+        key, group, message, _ = self.publish.call_args.args
+        self.assertEqual(group, f'profile_watchers_{self.user.id}')
+        self.assertEqual(message['user_data']['first_name'], 'Nuevo')
+
+
+class CachedJWTAuthenticationTestCase(TestCase):
+    """Tests de la autenticación JWT con copias reducidas del usuario en caché"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='cached',
+            email='cached@test.com',
+            password='testpass123',
+            first_name='Cached',
+            last_name='User',
+            bio='Bio larga'
+        )
+        self.token = str(AccessToken.for_user(self.user))
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        user, _ = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_second_request_does_not_query(self):
+        with self.assertNumQueries(1):
+            self.authenticate()
+        with self.assertNumQueries(0):
+            user = self.authenticate()
+            self.assertEqual(user.username, 'cached')
+            self.assertFalse(user.is_staff_member())
+
+    def test_other_fields_load_once_on_demand(self):
+        user = self.authenticate()
+        with self.assertNumQueries(1):
+            self.assertEqual(user.bio, 'Bio larga')
+            self.assertEqual(user.theme_preference, 'light')
+        self.assertEqual(full_user(user), user)
+
+    def test_save_invalidates_snapshot(self):
+        self.authenticate()
+        self.user.role = 'moderator'
+        self.user.is_banned = True
+        self.user.save(update_fields=['role', 'is_banned'])
+
+        user = self.authenticate()
+        self.assertTrue(user.is_staff_member())
+        self.assertTrue(user.is_banned)
+
+    def test_change_password_with_cached_user(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        client.get('/api/users/profile/')
+
+        response = client.post('/api/users/change-password/', {
+            'current_password': 'testpass123', 'new_password': 'NuevaClave_456'
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('NuevaClave_456'))
+
+
+class ProfileCacheTestCase(APITestCase):
+    """El perfil público se sirve desde la caché y se invalida al cambiar"""
+
+    def setUp(self):
+        cache.clear()
+        clear_local()
+        self.addCleanup(clear_local)
+        self.viewer = User.objects.create_user(username='viewer', email='viewer@test.com', password='testpass123')
+        self.author = User.objects.create_user(username='author', email='author@test.com', password='testpass123')
+        self.client.force_authenticate(user=self.viewer)
+
+    def get_profile(self):
+        response = self.client.get('/api/users/author/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_cached_profile_only_queries_is_following(self):
+        self.get_profile()
+        with self.assertNumQueries(1):
+            data = self.get_profile()
+        self.assertEqual(data['username'], 'author')
+        self.assertFalse(data['is_following'])
+
+    def test_follow_and_profile_changes_invalidate(self):
+        self.get_profile()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/users/follow/author/')
+        data = self.get_profile()
+        self.assertEqual(data['followers_count'], 1)
+        self.assertTrue(data['is_following'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete('/api/users/unfollow/author/')
+        self.assertEqual(self.get_profile()['followers_count'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.bio = 'Nueva bio'
+            self.author.save()
+        self.assertEqual(self.get_profile()['bio'], 'Nueva bio')
+
+    def test_unknown_username_is_not_cached(self):
+        self.assertEqual(self.client.get('/api/users/nobody/').status_code, status.HTTP_404_NOT_FOUND)
+        User.objects.create_user(username='nobody', email='nobody@test.com', password='testpass123')
+        self.assertEqual(self.client.get('/api/users/nobody/').status_code, status.HTTP_200_OK)
@@ -4,8 +4,11 @@ from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.models import Q
+from .auth_cache import full_user
 from .models import Follow, SystemSetting
+from .profile_cache import invalidate_profiles, public_profile
 from .serializers import UserSerializer, UserProfileSerializer, FollowSerializer
 
 User = get_user_model()
@@ -16,7 +19,7 @@ class UserProfileView(generics.RetrieveUpdateAPIView):
     permission_classes = [IsAuthenticated]
 
     def get_object(self):
-        return self.request.user
+        return full_user(self.request.user)
     
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -39,6 +42,14 @@ class UserDetailView(generics.RetrieveAPIView):
     serializer_class = UserSerializer
     lookup_field = 'username'
 
+    def retrieve(self, request, *args, **kwargs):
+        # El perfil sale de la caché; solo is_following se consulta en cada petición
+        data = public_profile(request, self.kwargs['username'])
+        is_following = request.user.is_authenticated and Follow.objects.filter(
+            follower=request.user, following_id=data['id']
+        ).exists()
+        return Response({**data, 'is_following': is_following})
+
 
 class UserDetailByIdView(generics.RetrieveAPIView):
     queryset = User.objects.all()
@@ -127,6 +138,8 @@ def unfollow_user(request, username):
             following=user_to_unfollow
         )
         follow.delete()
+        # Los borrados no tienen señal (dejaría de usarse el borrado rápido en cascada)
+        transaction.on_commit(lambda: invalidate_profiles([request.user.id, user_to_unfollow.id]))
         return Response(
             {'message': f'Has dejado de seguir a {user_to_unfollow.username}'}, 
             status=status.HTTP_200_OK
@@ -163,7 +176,7 @@ def delete_account(request):
     Elimina la cuenta del usuario autenticado y todos sus datos relacionados.
     Esta acción es irreversible.
     """
-    user = request.user
+    user = full_user(request.user)
     
     # Confirmar que el usuario proporcionó su contraseña para mayor seguridad
     password = request.data.get('password')
@@ -202,7 +215,7 @@ def change_password(request):
     """
     Cambia la contraseña del usuario autenticado
     """
-    user = request.user
+    user = full_user(request.user)
     
     current_password = request.data.get('current_password')
     new_password = request.data.get('new_password')
@@ -240,8 +253,7 @@ def change_password(request):
 @permission_classes([AllowAny])
 def get_system_setting(request, key):
     """Obtiene una configuración del sistema por su clave"""
-    try:
-        setting = SystemSetting.objects.get(key=key)
-        return Response({'key': key, 'value': setting.value})
-    except SystemSetting.DoesNotExist:
-        return Response({'error': 'Setting not found'}, status=status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+    value = SystemSetting.get_value(key)
+    if value is None:
+        return Response({'error': 'Setting not found'}, status=status.HTTP_404_NOT_FOUND)
+    return Response({'key': key, 'value': value})
\ No newline at end of file
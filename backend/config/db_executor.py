@@ -0,0 +1,108 @@
+"""
+Pool de hilos para el acceso a base de datos de los consumers.
+
+``database_sync_to_async`` es thread-sensitive por defecto: bajo Daphne todas
+las llamadas de todos los sockets (guardar mensajes, comentarios, contadores…)
+se ejecutan de una en una en el mismo hilo. ``consumer_db`` las envía en su
+lugar a un pool de ``CONSUMER_DB_WORKERS`` hilos; cada hilo tiene su propia
+conexión, que se revisa con ``close_old_connections`` antes y después de cada
+llamada (igual que hace Channels). Con ``CONSUMER_DB_WORKERS=0`` se mantiene
+el comportamiento de Channels.
+
+El pool publica en ``config.metrics`` la cola pendiente, el tiempo de espera
+hasta que un hilo queda libre y la duración de cada llamada.
+"""
+import functools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from channels.db import DatabaseSyncToAsync
+from django.conf import settings
+from django.db import connection
+
+from .metrics import DURATION_BUCKETS, registry
+
+_lock = threading.Lock()
+_state = {'executor': None, 'configured': False}
+
+
+class ConsumerDBExecutor(ThreadPoolExecutor):
+    """``ThreadPoolExecutor`` que mide la cola y la espera de cada tarea"""
+
+    def __init__(self, workers):
+        super().__init__(max_workers=workers, thread_name_prefix='consumer-db')
+        self.workers = workers
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        registry.set('consumer_db_workers', {}, workers, 'Hilos del pool de base de datos de los consumers')
+
+    def _track(self, delta):
+        with self._pending_lock:
+            self.pending += delta
+            pending = self.pending
+        registry.set('consumer_db_queue_depth', {}, pending, 'Llamadas pendientes o en curso en el pool')
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued_at = time.perf_counter()
+        self._track(1)
+
+        def run():
+            started = time.perf_counter()
+            registry.observe('consumer_db_wait_seconds', {}, started - queued_at, DURATION_BUCKETS,
+                             'Espera hasta que un hilo del pool queda libre')
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                registry.observe('consumer_db_call_seconds', {}, time.perf_counter() - started,
+                                 DURATION_BUCKETS, 'Duración de las llamadas en el pool')
+                self._track(-1)
+
+        try:
+            return super().submit(run)
+        except RuntimeError:
+            self._track(-1)
+            raise
+
+
+def _default_workers():
+    if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+        # SQLite en memoria (tests) usa caché compartida, que no espera a los
+        # bloqueos: escrituras desde varios hilos fallarían al momento
+        return 0
+    return settings.CONSUMER_DB_WORKERS
+
+
+def get_executor():
+    """Pool compartido del proceso (``None`` si ``CONSUMER_DB_WORKERS`` es 0)"""
+    if not _state['configured']:
+        configure_executor()
+    return _state['executor']
+
+
+def configure_executor(workers=None):
+    """
+    Sustituye el pool por uno de ``workers`` hilos (benchmarks y tests); sin
+    argumento vuelve al tamaño de la configuración.
+    """
+    if workers is None:
+        workers = _default_workers()
+    with _lock:
+        previous = _state['executor']
+        _state.update(executor=ConsumerDBExecutor(workers) if workers > 0 else None, configured=True)
+    if previous is not None:
+        previous.shutdown(wait=True)
+    return _state['executor']
+
+
+def consumer_db(func):
+    """Como ``database_sync_to_async``, pero ejecutado en el pool de los consumers"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        executor = get_executor()
+        if executor is None:
+            call = DatabaseSyncToAsync(func)
+        else:
+            call = DatabaseSyncToAsync(func, thread_sensitive=False, executor=executor)
+        return await call(*args, **kwargs)
+    return wrapper
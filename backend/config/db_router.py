@@ -0,0 +1,259 @@
+"""
+Lecturas en réplicas con read-your-writes.
+
+``PrimaryReplicaRouter`` envía todas las escrituras al primario (``default``)
+y las lecturas a una réplica de ``DATABASE_REPLICAS`` solo cuando
+``ReplicaRoutingMiddleware`` lo permite para la petición en curso:
+
+- la vista está marcada con ``replica_reads`` (decorador para vistas
+  función, atributo ``replica_reads = True`` o un conjunto de acciones en
+  vistas de clase y viewsets) y la petición es GET/HEAD;
+- el usuario no ha escrito en los últimos ``DB_READ_YOUR_WRITES_WINDOW``
+  segundos (marca en la caché compartida, por usuario del token JWT);
+- la petición no ha escrito todavía y no está dentro de una transacción;
+- la consulta no es sobre el modelo de usuario (autenticación y permisos).
+
+Fuera de una petición (consumers, comandos, tareas) todo va al primario.
+
+El retraso de cada réplica se mide con un heartbeat: cada
+``DB_REPLICA_CHECK_INTERVAL`` segundos un proceso actualiza
+``ReplicationHeartbeat`` en el primario y compara su valor con el de cada
+réplica. Las que pasan de ``DB_REPLICA_MAX_LAG`` (o fallan) salen de la
+rotación hasta la siguiente medida. Funciona con cualquier motor, también con
+dos ficheros SQLite copiados a mano.
+"""
+import contextvars
+import itertools
+import logging
+import math
+import threading
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.utils import timezone
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+PRIMARY = 'default'
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+@dataclass
+class RoutingState:
+    """Decisión de enrutado de la petición en curso"""
+    user_id: int = None
+    replica_ok: bool = False
+    wrote: bool = False
+
+
+_state = contextvars.ContextVar('db_routing', default=None)
+
+
+def replica_reads(view):
+    """Marca una vista función como segura para leer de una réplica"""
+    view.replica_reads = True
+    return view
+
+
+def _allows_replica(view_func):
+    flag = getattr(view_func, 'replica_reads', None)
+    if flag is None:
+        # as_view() de Django (view_class) y de DRF (cls)
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        flag = getattr(view_class, 'replica_reads', False)
+    if isinstance(flag, (set, frozenset, list, tuple)):
+        # Acciones de un viewset: {'get': 'list'} -> 'list'
+        actions = getattr(view_func, 'actions', None) or {}
+        return actions.get('get') in flag
+    return bool(flag)
+
+
+# ---------------------------------------------------------------------------
+# Read-your-writes
+# ---------------------------------------------------------------------------
+
+def pin_key(user_id):
+    return f'db:pinned:{user_id}'
+
+
+def pin_user(user_id):
+    """Envía las lecturas del usuario al primario durante la ventana configurada"""
+    cache.set(pin_key(user_id), 1, settings.DB_READ_YOUR_WRITES_WINDOW)
+
+
+def is_pinned(user_id):
+    return cache.get(pin_key(user_id)) is not None
+
+
+def _request_user_id(request):
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Bearer '):
+        try:
+            return AccessToken(header[7:]).get('user_id')
+        except TokenError:
+            return None
+    # Sesión (admin de Django); no carga el usuario
+    session = getattr(request, 'session', None)
+    return session.get('_auth_user_id') if session is not None else None
+
+
+# ---------------------------------------------------------------------------
+# Réplicas y retraso
+# ---------------------------------------------------------------------------
+
+class ReplicaPool:
+    """Réplicas de ``DATABASE_REPLICAS`` con su último retraso medido"""
+
+    def __init__(self):
+        self.lags = {}
+        self.checked_at = None
+        self._lock = threading.Lock()
+        self._next = itertools.count()
+
+    def healthy(self):
+        self.refresh()
+        return [
+            alias for alias in settings.DATABASE_REPLICAS
+            if self.lags.get(alias, math.inf) <= settings.DB_REPLICA_MAX_LAG
+        ]
+
+    def choose(self):
+        """Réplica en turno rotatorio, o None si ninguna está al día"""
+        healthy = self.healthy()
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and self.checked_at is not None \
+                and now - self.checked_at < settings.DB_REPLICA_CHECK_INTERVAL:
+            return
+        # Solo un hilo mide; el resto sigue con la medida anterior (salvo la primera vez)
+        if not self._lock.acquire(blocking=self.checked_at is None):
+            return
+        try:
+            if force or self.checked_at is None or now - self.checked_at >= settings.DB_REPLICA_CHECK_INTERVAL:
+                self.lags = measure_replica_lag(settings.DATABASE_REPLICAS)
+                self.checked_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def reset(self):
+        self.lags = {}
+        self.checked_at = None
+
+
+def beat():
+    """Actualiza el heartbeat del primario y devuelve su valor"""
+    from apps.administration.models import ReplicationHeartbeat
+
+    now = timezone.now()
+    heartbeats = ReplicationHeartbeat.objects.using(PRIMARY)
+    # Con varios procesos, solo escribe el primero de cada intervalo
+    stale = now - timedelta(seconds=settings.DB_REPLICA_CHECK_INTERVAL / 2)
+    if not heartbeats.filter(pk=1, beat_at__gte=stale).exists():
+        heartbeats.update_or_create(pk=1, defaults={'beat_at': now})
+    return heartbeats.values_list('beat_at', flat=True).get(pk=1)
+
+
+def measure_replica_lag(aliases):
+    """Segundos de retraso de cada réplica (infinito si falla o no tiene heartbeat)"""
+    from apps.administration.models import ReplicationHeartbeat
+
+    if not aliases:
+        return {}
+    try:
+        primary_beat = beat()
+    except Exception:
+        # Sin heartbeat en el primario (p. ej. migraciones sin aplicar) no se usa ninguna réplica
+        logger.warning('No se pudo escribir el heartbeat en el primario', exc_info=True)
+        return {alias: math.inf for alias in aliases}
+    lags = {}
+    for alias in aliases:
+        try:
+            replica_beat = ReplicationHeartbeat.objects.using(alias).values_list(
+                'beat_at', flat=True
+            ).filter(pk=1).first()
+        except Exception:
+            logger.warning('No se pudo leer el heartbeat de la réplica %s', alias, exc_info=True)
+            replica_beat = None
+        lag = math.inf if replica_beat is None else max((primary_beat - replica_beat).total_seconds(), 0.0)
+        lags[alias] = lag
+        registry.set('db_replica_lag_seconds', {'alias': alias}, -1 if math.isinf(lag) else lag,
+                     'Retraso de cada réplica (-1 si no responde)')
+        if math.isinf(lag):
+            logger.warning('Réplica %s fuera de rotación: sin heartbeat', alias)
+        elif lag > settings.DB_REPLICA_MAX_LAG:
+            logger.warning('Réplica %s fuera de rotación: %.1fs de retraso', alias, lag)
+    return lags
+
+
+replicas = ReplicaPool()
+
+
+# ---------------------------------------------------------------------------
+# Router y middleware
+# ---------------------------------------------------------------------------
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or not state.replica_ok or state.wrote:
+            return None
+        if model._meta.label == settings.AUTH_USER_MODEL:
+            # La autenticación y los permisos (baneos, roles) no pueden ir con
+            # retraso, y un usuario recién registrado tiene que poder entrar
+            return None
+        if connections[PRIMARY].in_atomic_block:
+            # Dentro de una transacción se lee lo que ella misma ha escrito
+            return None
+        return replicas.choose()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas tienen los mismos datos que el primario
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+
+        state = RoutingState(user_id=_request_user_id(request))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote and state.user_id is not None:
+            pin_user(state.user_id)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = _state.get()
+        if state is None or request.method not in SAFE_METHODS or not _allows_replica(view_func):
+            return None
+        state.replica_ok = state.user_id is None or not is_pinned(state.user_id)
+        return None
@@ -0,0 +1,166 @@
+"""
+Servicio de ficheros de ``MEDIA_ROOT``.
+
+Sustituye a ``django.views.static.serve`` con:
+
+- peticiones ``Range`` de un solo rango (``206``/``416``), para poder
+  avanzar en los vídeos sin descargarlos enteros,
+- ETag fuerte calculado con el hash del contenido (se guarda en la caché por
+  ruta, tamaño y fecha de modificación) y respuestas ``304`` para
+  ``If-None-Match``/``If-Modified-Since``,
+- ``Cache-Control: immutable`` para los ficheros con nombre único
+  (``MEDIA_IMMUTABLE_PATTERN``), que nunca cambian de contenido.
+
+Detrás de nginx, con ``MEDIA_ACCEL_REDIRECT_PREFIX`` la vista solo resuelve las
+cabeceras de caché y delega el envío (y los rangos) en ``X-Accel-Redirect``.
+"""
+import hashlib
+import mimetypes
+import posixpath
+import re
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from django.views.decorators.http import require_safe
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+HASH_BLOCK_SIZE = 1024 * 1024
+STREAM_BLOCK_SIZE = 64 * 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def file_etag(path, stat):
+    """ETag fuerte con el hash del contenido, calculado una vez por versión del fichero"""
+    key = f'media:etag:{path}:{stat.st_size}:{stat.st_mtime_ns}'
+    etag = cache.get(key)
+    if etag is None:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+                digest.update(block)
+        etag = quote_etag(digest.hexdigest()[:32])
+        cache.set(key, etag, None)
+    return etag
+
+
+def _is_private(fullpath):
+    # Las subidas de vídeo en curso viven por defecto dentro de MEDIA_ROOT
+    uploads = Path(settings.STORY_UPLOAD_TEMP_DIR).resolve()
+    return fullpath.resolve().is_relative_to(uploads)
+
+
+def cache_control(name):
+    if re.search(settings.MEDIA_IMMUTABLE_PATTERN, name):
+        return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    return f'public, max-age={settings.MEDIA_CACHE_MAX_AGE}'
+
+
+def parse_range(header, size):
+    """
+    ``(inicio, fin)`` del rango pedido, ``None`` si se debe servir el fichero
+    entero o ``False`` si el rango no es satisfacible.
+    """
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        # Varios rangos o sintaxis desconocida: se ignora la cabecera
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Sufijo: los últimos N bytes
+        length = int(last)
+        if not length:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or (last and int(last) < start):
+        return False
+    return start, end
+
+
+def _range_applies(request, etag, mtime):
+    """``If-Range``: solo se sirve el rango si el fichero no cambió"""
+    if_range = request.headers.get('If-Range')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def _iter_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            block = f.read(min(STREAM_BLOCK_SIZE, length))
+            if not block:
+                break
+            length -= len(block)
+            yield block
+
+
+@require_safe
+def serve_media(request, path):
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = Path(safe_join(settings.MEDIA_ROOT, name))
+        stat = fullpath.stat()
+    except (OSError, ValueError):
+        raise Http404('Fichero no encontrado')
+    if not fullpath.is_file() or _is_private(fullpath):
+        raise Http404('Fichero no encontrado')
+
+    etag = file_etag(fullpath, stat)
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control(name),
+        'Accept-Ranges': 'bytes',
+    }
+
+    not_modified = get_conditional_response(
+        request, etag=etag, last_modified=int(stat.st_mtime)
+    )
+    if not_modified is not None:
+        for header, value in headers.items():
+            not_modified.headers[header] = value
+        return not_modified
+
+    content_type, encoding = mimetypes.guess_type(name)
+    content_type = content_type or 'application/octet-stream'
+
+    if settings.MEDIA_ACCEL_REDIRECT_PREFIX:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + name
+    else:
+        byte_range = None
+        if 'Range' in request.headers and _range_applies(request, etag, stat.st_mtime):
+            byte_range = parse_range(request.headers['Range'], stat.st_size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+        elif byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(
+                _iter_range(fullpath, start, end - start + 1),
+                status=206, content_type=content_type
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            response = FileResponse(open(fullpath, 'rb'), content_type=content_type)
+
+    for header, value in headers.items():
+        response.headers[header] = value
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    return response
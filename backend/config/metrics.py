@@ -0,0 +1,294 @@
+"""
+Instrumentación de peticiones HTTP y eventos WebSocket.
+
+``RequestMetricsMiddleware`` y ``InstrumentedConsumerMixin`` miden, por
+endpoint y por evento de consumer:
+
+- tiempo total,
+- número y tiempo de consultas SQL (``execute_wrapper`` instalado en cada
+  conexión nueva),
+- consultas repetidas con la misma forma (firmas N+1) a partir de
+  ``METRICS_NPLUSONE_THRESHOLD`` repeticiones,
+- envíos al channel layer (``outbox.publish*`` y ``group_send``/``send`` de
+  los consumers).
+
+Cada respuesta lleva una cabecera ``Server-Timing`` y los valores se acumulan
+en histogramas del proceso que ``metrics_view`` expone en formato de texto de
+Prometheus (solo staff). Con varios workers cada uno expone sus propios datos.
+"""
+import contextvars
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+@dataclass
+class RequestMetrics:
+    """Datos de una petición o de un evento WebSocket en curso"""
+    started_at: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    query_time: float = 0.0
+    channel_sends: int = 0
+    signatures: Counter = field(default_factory=Counter)
+
+    def duplicated_signatures(self):
+        threshold = settings.METRICS_NPLUSONE_THRESHOLD
+        return {sql: count for sql, count in self.signatures.items() if count >= threshold}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Registry:
+    """Histogramas, contadores y gauges del proceso, con etiquetas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.histograms = {}
+        self.counters = defaultdict(float)
+        self.help = {}
+
+    def observe(self, name, labels, value, buckets, help_text=''):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.help.setdefault(name, ('histogram', help_text))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name, labels, value=1, help_text=''):
+        with self._lock:
+            self.help.setdefault(name, ('counter', help_text))
+            self.counters[(name, tuple(sorted(labels.items())))] += value
+
+    def set(self, name, labels, value, help_text=''):
+        """Valor instantáneo (gauge)"""
+        with self._lock:
+            self.help.setdefault(name, ('gauge', help_text))
+            self.counters[(name, tuple(sorted(labels.items())))] = value
+
+    def render(self):
+        """Formato de texto de Prometheus (0.0.4)"""
+        lines = []
+        with self._lock:
+            for name in sorted(self.help):
+                kind, help_text = self.help[name]
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                if kind in ('counter', 'gauge'):
+                    for (metric, labels), value in sorted(self.counters.items()):
+                        if metric == name:
+                            lines.append(f'{name}{_labels(labels)} {value:g}')
+                    continue
+                for (metric, labels), histogram in sorted(self.histograms.items()):
+                    if metric != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{_labels(labels + (("le", f"{bound:g}"),))} {count}')
+                    lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {histogram.count}')
+                    lines.append(f'{name}_sum{_labels(labels)} {histogram.sum:g}')
+                    lines.append(f'{name}_count{_labels(labels)} {histogram.count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+registry = Registry()
+
+
+# ---------------------------------------------------------------------------
+# SQL
+# ---------------------------------------------------------------------------
+
+_IN_LIST_RE = re.compile(r'\((?:%s,\s*)+%s\)')
+
+
+def query_signature(sql):
+    """Forma de la consulta: los parámetros ya van aparte; se agrupan las listas IN"""
+    return _IN_LIST_RE.sub('(%s...)', sql)
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.query_time += time.perf_counter() - start
+        metrics.signatures[query_signature(sql)] += 1
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+connection_created.connect(install_query_wrapper)
+
+
+def _start():
+    # Las conexiones abiertas antes de importar este módulo no recibieron la señal
+    for connection in connections.all(initialized_only=True):
+        install_query_wrapper(None, connection)
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def record_channel_send(count=1):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.channel_sends += count
+
+
+# ---------------------------------------------------------------------------
+# Registro por petición / evento
+# ---------------------------------------------------------------------------
+
+def _finish(metrics, kind, labels):
+    duration = time.perf_counter() - metrics.started_at
+    prefix = 'http_request' if kind == 'http' else 'websocket_event'
+    registry.observe(f'{prefix}_duration_seconds', labels, duration, DURATION_BUCKETS,
+                     'Tiempo total')
+    registry.observe(f'{prefix}_db_queries', labels, metrics.queries, QUERY_BUCKETS,
+                     'Consultas SQL')
+    registry.observe(f'{prefix}_db_duration_seconds', labels, metrics.query_time, DURATION_BUCKETS,
+                     'Tiempo en consultas SQL')
+    if metrics.channel_sends:
+        registry.inc(f'{prefix}_channel_sends_total', labels, metrics.channel_sends,
+                     'Envíos al channel layer')
+
+    duplicated = metrics.duplicated_signatures()
+    if duplicated:
+        registry.inc(f'{prefix}_nplusone_total', labels, 1,
+                     'Peticiones o eventos con consultas repetidas (posible N+1)')
+        for sql, count in duplicated.items():
+            logger.warning('Posible N+1 en %s (%d veces): %s', labels, count, sql[:300])
+    return duration
+
+
+class RequestMetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+
+        metrics, token = _start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        match = getattr(request, 'resolver_match', None)
+        labels = {
+            'method': request.method,
+            'route': match.route if match else 'unmatched',
+        }
+        duration = _finish(metrics, 'http', labels)
+        registry.inc('http_requests_total', {**labels, 'status': response.status_code},
+                     help_text='Peticiones HTTP')
+
+        response['Server-Timing'] = (
+            f'db;dur={metrics.query_time * 1000:.1f};desc="{metrics.queries} queries", '
+            f'app;dur={duration * 1000:.1f}'
+        )
+        return response
+
+
+class _CountingChannelLayer:
+    """Envuelve el channel layer de un consumer para contar los envíos"""
+
+    def __init__(self, layer):
+        self._layer = layer
+
+    def __getattr__(self, name):
+        return getattr(self._layer, name)
+
+    async def send(self, channel, message):
+        record_channel_send()
+        return await self._layer.send(channel, message)
+
+    async def group_send(self, group, message):
+        record_channel_send()
+        return await self._layer.group_send(group, message)
+
+
+class InstrumentedConsumerMixin:
+    """Mide cada mensaje que procesa un consumer (eventos del cliente y del grupo)"""
+
+    async def dispatch(self, message):
+        if not settings.METRICS_ENABLED:
+            return await super().dispatch(message)
+        if self.channel_layer is not None and not isinstance(self.channel_layer, _CountingChannelLayer):
+            self.channel_layer = _CountingChannelLayer(self.channel_layer)
+
+        metrics, token = _start()
+        try:
+            return await super().dispatch(message)
+        finally:
+            _current.reset(token)
+            _finish(metrics, 'websocket', {
+                'consumer': type(self).__name__,
+                'event': message.get('type', 'unknown'),
+            })
+
+
+def metrics_view(request):
+    """Métricas en formato Prometheus; staff o ``Authorization: Bearer METRICS_TOKEN``"""
+    from apps.authentication.authentication import CachedJWTAuthentication
+    from rest_framework.exceptions import AuthenticationFailed
+
+    token = settings.METRICS_TOKEN
+    if not (token and request.headers.get('Authorization') == f'Bearer {token}'):
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            result = None
+        user = result[0] if result else request.user
+        if not (user.is_authenticated and user.is_staff_member()):
+            return HttpResponseForbidden('Solo staff')
+
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
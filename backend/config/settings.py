@@ -28,6 +28,8 @@ DJANGO_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    # Índices con opclass en PostgreSQL (búsqueda de usuarios); inofensivo en SQLite
+    'django.contrib.postgres',
 ]
 
 THIRD_PARTY_APPS = [
@@ -51,6 +53,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'config.metrics.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -58,8 +61,10 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'apps.administration.middleware.SiteConfigurationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'config.db_router.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -95,6 +100,22 @@ DATABASES = {
     }
 }
 
+# Réplicas de solo lectura (config.db_router), separadas por comas: rutas de
+# SQLite o nombres de base de datos con el mismo motor y credenciales que 'default'.
+# Para probar en local basta copiar la base de datos con sqlite3 ".backup".
+DB_REPLICAS = config('DB_REPLICAS', default='', cast=lambda v: [s.strip() for s in v.split(',') if s.strip()])
+DATABASE_REPLICAS = []
+for number, name in enumerate(DB_REPLICAS, start=1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'NAME': name, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{number}')
+DATABASE_ROUTERS = ['config.db_router.PrimaryReplicaRouter']
+# Segundos que un usuario lee del primario después de escribir (read-your-writes)
+DB_READ_YOUR_WRITES_WINDOW = config('DB_READ_YOUR_WRITES_WINDOW', default=5, cast=int)
+# Retraso máximo (segundos) de una réplica antes de sacarla de la rotación
+DB_REPLICA_MAX_LAG = config('DB_REPLICA_MAX_LAG', default=10, cast=float)
+# Cada cuántos segundos se escribe el heartbeat y se mide el retraso de las réplicas
+DB_REPLICA_CHECK_INTERVAL = config('DB_REPLICA_CHECK_INTERVAL', default=5, cast=float)
+
 # Configuración alternativa para MongoDB (comentada por ahora)
 # DATABASES = {
 #     'default': {
@@ -138,6 +159,12 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # Media files
 MEDIA_URL = config('MEDIA_URL', default='/media/')
 MEDIA_ROOT = BASE_DIR / config('MEDIA_ROOT', default='media')
+# Segundos de caché en el navegador para los ficheros media que pueden cambiar
+MEDIA_CACHE_MAX_AGE = config('MEDIA_CACHE_MAX_AGE', default=3600, cast=int)
+# Ficheros con nombre único (utils.generate_unique_filename): caché de un año e immutable
+MEDIA_IMMUTABLE_PATTERN = config('MEDIA_IMMUTABLE_PATTERN', default=r'(^|/)\d{8}_\d{6}_[0-9a-f]{8}\.\w+$')
+# Prefijo interno de nginx para delegar el envío con X-Accel-Redirect (vacío = lo sirve Django)
+MEDIA_ACCEL_REDIRECT_PREFIX = config('MEDIA_ACCEL_REDIRECT_PREFIX', default='')
 
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -148,7 +175,7 @@ AUTH_USER_MODEL = 'users.User'
 # Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'apps.authentication.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -164,6 +191,8 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=config('JWT_REFRESH_TOKEN_LIFETIME', default=7, cast=int)),
     'ROTATE_REFRESH_TOKENS': config('JWT_ROTATE_REFRESH_TOKENS', default=True, cast=bool),
 }
+# Segundos que se cachean los datos de autenticación de cada usuario (apps.users.auth_cache)
+AUTH_USER_CACHE_TTL = config('AUTH_USER_CACHE_TTL', default=60, cast=int)
 
 # CORS settings
 if DEBUG:
@@ -185,6 +214,34 @@ else:
 # Permitir credenciales en CORS
 CORS_ALLOW_CREDENTIALS = True
 
+# ====================================
+# CACHÉ
+# ====================================
+# Caché compartida entre procesos: redis://host:6379/1, file:///ruta/al/directorio
+# o vacío para la memoria de cada proceso (desarrollo y tests)
+CACHE_URL = config('CACHE_URL', default='')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+elif CACHE_URL.startswith('file://'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                          'LOCATION': CACHE_URL[len('file://'):]}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+# Entradas de la LRU del proceso delante de la caché compartida (config.tiered_cache)
+TIERED_CACHE_LOCAL_SIZE = config('TIERED_CACHE_LOCAL_SIZE', default=1000, cast=int)
+# Segundos que la LRU del proceso sirve una entrada sin volver a la caché compartida
+TIERED_CACHE_LOCAL_TTL = config('TIERED_CACHE_LOCAL_TTL', default=5, cast=float)
+# Segundos que se conserva una entrada caducada para servirla mientras otro la recalcula
+TIERED_CACHE_STALE_GRACE = config('TIERED_CACHE_STALE_GRACE', default=30, cast=int)
+# Expiración anticipada probabilística: mayor = recalcula antes (0 = desactivada)
+TIERED_CACHE_BETA = config('TIERED_CACHE_BETA', default=1.0, cast=float)
+# Segundos máximos esperando a que otro proceso termine de calcular la misma clave
+TIERED_CACHE_LOCK_TIMEOUT = config('TIERED_CACHE_LOCK_TIMEOUT', default=10, cast=int)
+# Segundos de caché de hashtags en tendencia, directos activos y perfiles públicos
+TRENDING_CACHE_TTL = config('TRENDING_CACHE_TTL', default=60, cast=int)
+ACTIVE_STREAMS_CACHE_TTL = config('ACTIVE_STREAMS_CACHE_TTL', default=10, cast=int)
+PROFILE_CACHE_TTL = config('PROFILE_CACHE_TTL', default=120, cast=int)
+
 # Channels - Configuración para desarrollo
 # Usando InMemoryChannelLayer porque Redis 3.x no soporta BZPOPMIN
 # Para producción, actualiza Redis a 5.0+ y usa RedisChannelLayer
@@ -193,6 +250,110 @@ CHANNEL_LAYERS = {
         'BACKEND': 'channels.layers.InMemoryChannelLayer',
     },
 }
+# Hilos del pool para las consultas de los consumers (config.db_executor);
+# 0 = el hilo único compartido de database_sync_to_async
+CONSUMER_DB_WORKERS = config('CONSUMER_DB_WORKERS', default=4, cast=int)
+
+# ====================================
+# LIVE STREAMING
+# ====================================
+# Segundos que una conexión sigue contando como espectador sin heartbeat
+LIVE_PRESENCE_TTL = config('LIVE_PRESENCE_TTL', default=30, cast=int)
+# Cada cuántos segundos se vuelcan viewers_count/peak_viewers a la base de datos
+LIVE_PRESENCE_FLUSH_INTERVAL = config('LIVE_PRESENCE_FLUSH_INTERVAL', default=5, cast=float)
+# Intervalo mínimo entre broadcasts del conteo de espectadores de un stream
+LIVE_VIEWERS_BROADCAST_INTERVAL = config('LIVE_VIEWERS_BROADCAST_INTERVAL', default=2, cast=float)
+# Comentarios del chat en vivo: replay para quien se une tarde y escritura por lotes
+LIVE_COMMENT_REPLAY_SIZE = config('LIVE_COMMENT_REPLAY_SIZE', default=50, cast=int)
+LIVE_COMMENT_FLUSH_INTERVAL = config('LIVE_COMMENT_FLUSH_INTERVAL', default=2, cast=float)
+LIVE_COMMENT_BATCH_SIZE = config('LIVE_COMMENT_BATCH_SIZE', default=100, cast=int)
+
+# ====================================
+# STORIES
+# ====================================
+# Barrido de historias caducadas (python manage.py sweep_stories)
+STORY_SWEEP_BATCH_SIZE = config('STORY_SWEEP_BATCH_SIZE', default=500, cast=int)
+# Margen tras la caducidad para no borrar historias que alguien está viendo
+STORY_SWEEP_GRACE_SECONDS = config('STORY_SWEEP_GRACE_SECONDS', default=3600, cast=int)
+# Conservar las historias caducadas (y sus ficheros) en el archivo del autor
+STORY_ARCHIVE_ENABLED = config('STORY_ARCHIVE_ENABLED', default=False, cast=bool)
+# Vídeos: tamaño máximo, subida por partes y transcodificación con ffmpeg
+STORY_VIDEO_MAX_SIZE = config('STORY_VIDEO_MAX_SIZE', default=50 * 1024 * 1024, cast=int)
+STORY_UPLOAD_CHUNK_SIZE = config('STORY_UPLOAD_CHUNK_SIZE', default=5 * 1024 * 1024, cast=int)
+STORY_UPLOAD_TEMP_DIR = config('STORY_UPLOAD_TEMP_DIR', default=str(MEDIA_ROOT / 'uploads'))
+# Segundos sin actividad tras los que se descarta una subida incompleta
+STORY_UPLOAD_EXPIRY_SECONDS = config('STORY_UPLOAD_EXPIRY_SECONDS', default=86400, cast=int)
+FFMPEG_BINARY = config('FFMPEG_BINARY', default='ffmpeg')
+STORY_TRANSCODE_WORKERS = config('STORY_TRANSCODE_WORKERS', default=1, cast=int)
+# Segundos máximos por ejecución de ffmpeg
+STORY_TRANSCODE_TIMEOUT = config('STORY_TRANSCODE_TIMEOUT', default=300, cast=int)
+
+# ====================================
+# NOTIFICATIONS
+# ====================================
+# Destinatarios por lote en los envíos masivos (seguidores de un directo, etc.)
+NOTIFICATION_FANOUT_CHUNK_SIZE = config('NOTIFICATION_FANOUT_CHUNK_SIZE', default=1000, cast=int)
+# Segundos sin progreso tras los que un fan-out en curso se considera abandonado
+NOTIFICATION_FANOUT_STALE_SECONDS = config('NOTIFICATION_FANOUT_STALE_SECONDS', default=300, cast=int)
+# Notificar a los seguidores de cada nueva publicación
+NOTIFY_FOLLOWERS_ON_POST = config('NOTIFY_FOLLOWERS_ON_POST', default=False, cast=bool)
+# Agrupar likes/comentarios/seguidores sobre el mismo objeto en una notificación
+NOTIFICATION_AGGREGATION_ENABLED = config('NOTIFICATION_AGGREGATION_ENABLED', default=True, cast=bool)
+# Segundos durante los que una notificación no leída sigue agrupando eventos
+NOTIFICATION_AGGREGATION_WINDOW = config('NOTIFICATION_AGGREGATION_WINDOW', default=3600, cast=int)
+# Segundos durante los que se agrupan los envíos de una notificación agrupada (se envía el último estado)
+NOTIFICATION_PUSH_INTERVAL = config('NOTIFICATION_PUSH_INTERVAL', default=5, cast=int)
+# Segundos que vive en caché el contador de no leídas de cada usuario
+NOTIFICATION_UNREAD_COUNT_TTL = config('NOTIFICATION_UNREAD_COUNT_TTL', default=86400, cast=int)
+# Retención: días que se conservan las notificaciones leídas, por defecto y por tipo
+# (formato "tipo=días,tipo=días"); 0 las conserva siempre
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+NOTIFICATION_RETENTION_DAYS_BY_TYPE = config(
+    'NOTIFICATION_RETENTION_DAYS_BY_TYPE',
+    default='live_stream=7,message=30',
+    cast=lambda v: {
+        notification_type.strip(): int(days)
+        for notification_type, days in (item.split('=') for item in v.split(',') if item.strip())
+    }
+)
+# Días tras los que se borran también las notificaciones sin leer (0 = nunca)
+NOTIFICATION_UNREAD_RETENTION_DAYS = config('NOTIFICATION_UNREAD_RETENTION_DAYS', default=365, cast=int)
+# Días tras los que las notificaciones leídas pasan a la tabla de archivo (0 = sin archivo)
+NOTIFICATION_ARCHIVE_AFTER_DAYS = config('NOTIFICATION_ARCHIVE_AFTER_DAYS', default=0, cast=int)
+# Filas por transacción al purgar o archivar
+NOTIFICATION_RETENTION_CHUNK_SIZE = config('NOTIFICATION_RETENTION_CHUNK_SIZE', default=5000, cast=int)
+# Outbox de eventos WebSocket (notifications.outbox): envíos por lote y reintentos
+WEBSOCKET_OUTBOX_BATCH_SIZE = config('WEBSOCKET_OUTBOX_BATCH_SIZE', default=100, cast=int)
+WEBSOCKET_OUTBOX_MAX_ATTEMPTS = config('WEBSOCKET_OUTBOX_MAX_ATTEMPTS', default=3, cast=int)
+WEBSOCKET_OUTBOX_RETRY_DELAY = config('WEBSOCKET_OUTBOX_RETRY_DELAY', default=0.5, cast=float)
+# Segundos en los que se agrupan los cambios de perfil de un usuario antes de difundirlos
+PROFILE_UPDATE_DEBOUNCE = config('PROFILE_UPDATE_DEBOUNCE', default=1, cast=float)
+
+# ====================================
+# ADMINISTRATION
+# ====================================
+# Segundos que se cachean las estadísticas del dashboard
+ADMIN_STATS_CACHE_TTL = config('ADMIN_STATS_CACHE_TTL', default=60, cast=int)
+# Días que rellena la primera ejecución de rollup_daily_stats
+ADMIN_STATS_ROLLUP_DAYS = config('ADMIN_STATS_ROLLUP_DAYS', default=90, cast=int)
+# Usuarios como máximo en cada ban/unban/cambio de rol masivo
+ADMIN_BULK_MAX_USERS = config('ADMIN_BULK_MAX_USERS', default=5000, cast=int)
+# Segundos que cada worker usa su copia de SiteConfiguration sin comprobar la versión
+SITE_CONFIG_LOCAL_TTL = config('SITE_CONFIG_LOCAL_TTL', default=5, cast=float)
+# Segundos tras los que la copia se recarga de la base de datos aunque no cambie la versión
+SITE_CONFIG_MAX_AGE = config('SITE_CONFIG_MAX_AGE', default=60, cast=int)
+# Segundos que se cachea cada SystemSetting (/api/users/settings/<key>/)
+SYSTEM_SETTING_CACHE_TTL = config('SYSTEM_SETTING_CACHE_TTL', default=300, cast=int)
+
+# ====================================
+# METRICS
+# ====================================
+# Instrumentación por petición y por evento WebSocket (config.metrics)
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+# Repeticiones de una misma consulta en una petición a partir de las que se avisa de un N+1
+METRICS_NPLUSONE_THRESHOLD = config('METRICS_NPLUSONE_THRESHOLD', default=5, cast=int)
+# Token para que Prometheus lea /api/metrics/ sin ser staff (vacío = solo staff)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
 
 # ====================================
 # SECURITY SETTINGS
@@ -237,39 +398,51 @@ LOG_DIR = BASE_DIR / config('LOG_DIR', default='logs')
 # Crear directorio de logs si no existe
 LOG_DIR.mkdir(exist_ok=True)
 
+# Fracción de registros (por debajo de WARNING) que se conservan por logger,
+# p. ej. "apps.chat.consumers=0.05,live.consumers=0.05"
+LOG_SAMPLING = config(
+    'LOG_SAMPLING',
+    default='apps.chat.consumers=0.05,live.consumers=0.05',
+    cast=lambda v: {
+        name.strip(): float(rate) for name, rate in (item.split('=') for item in v.split(',') if item.strip())
+    }
+)
+# Registros que caben en la cola de logging antes de empezar a descartar
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+# Ocupación de la cola (fracción) a partir de la cual se descartan los registros por debajo de WARNING
+LOG_QUEUE_HIGH_WATER = config('LOG_QUEUE_HIGH_WATER', default=0.8, cast=float)
+# Salida JSON también en consola (contenedores); el fichero siempre es JSON
+LOG_CONSOLE_JSON = config('LOG_CONSOLE_JSON', default=False, cast=bool)
+
+# Los loggers solo encolan; un hilo escribe en consola y fichero (config.structured_logging)
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
-    'formatters': {
-        'verbose': {
-            'format': '{levelname} {asctime} {module} {message}',
-            'style': '{',
-        },
-        'simple': {
-            'format': '{levelname} {message}',
-            'style': '{',
+    'filters': {
+        'sampling': {
+            '()': 'config.structured_logging.SamplingFilter',
+            'rates': LOG_SAMPLING,
         },
     },
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
-            'formatter': 'simple',
-        },
-        'file': {
-            'class': 'logging.handlers.RotatingFileHandler',
-            'filename': LOG_DIR / 'django.log',
-            'maxBytes': 1024 * 1024 * 10,  # 10 MB
-            'backupCount': 5,
-            'formatter': 'verbose',
+        'queue': {
+            '()': 'config.structured_logging.queue_handler',
+            'filters': ['sampling'],
+            'log_file': LOG_DIR / 'django.log',
+            'max_bytes': 1024 * 1024 * 10,  # 10 MB
+            'backup_count': 5,
+            'console_json': LOG_CONSOLE_JSON,
+            'queue_size': LOG_QUEUE_SIZE,
+            'high_water': LOG_QUEUE_HIGH_WATER,
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
+        'handlers': ['queue'],
         'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': LOG_LEVEL,
             'propagate': False,
         },
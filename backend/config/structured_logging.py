@@ -0,0 +1,169 @@
+"""
+Logging sin bloqueos en formato JSON.
+
+Los loggers solo escriben en ``NonBlockingQueueHandler``, que deja cada
+registro en una cola acotada (``LOG_QUEUE_SIZE``) y vuelve al momento; un
+``QueueListener`` en un hilo aparte lo escribe en consola y en el fichero
+rotado. Así ni las peticiones ni el event loop de los consumers hacen I/O de
+disco al registrar algo.
+
+- ``JsonFormatter``: una línea JSON por registro con los campos pasados en
+  ``extra``.
+- ``SamplingFilter``: deja pasar solo una fracción de los registros por
+  debajo de WARNING de los loggers de ``LOG_SAMPLING`` (eventos muy
+  frecuentes como mensajes de chat o señalización).
+- Contrapresión: con la cola casi llena (``LOG_QUEUE_HIGH_WATER``) se
+  descartan los registros por debajo de WARNING; con la cola llena, todos. Los
+  descartes y el muestreo se cuentan en ``config.metrics``.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+from datetime import datetime, timezone
+
+# Atributos propios de LogRecord: el resto son campos pasados con ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_state = {'listener': None}
+
+
+def _count(name, labels, help_text):
+    # Importación diferida: el logging se configura antes de cargar las apps
+    from .metrics import registry
+    registry.inc(name, labels, help_text=help_text)
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+            'thread': record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    ``rates`` es ``{logger: fracción}``; se aplica la del prefijo más largo
+    que coincida con el nombre del logger. WARNING y superiores pasan siempre.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self._resolved = {}
+
+    def rate_for(self, name):
+        rate = self._resolved.get(name)
+        if rate is None:
+            rate = 1.0
+            best = -1
+            for prefix, value in self.rates.items():
+                if (name == prefix or name.startswith(prefix + '.')) and len(prefix) > best:
+                    rate, best = value, len(prefix)
+            self._resolved[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rate_for(record.name)
+        if rate >= 1 or random.random() < rate:
+            return True
+        _count('log_records_sampled_out_total', {'logger': record.name},
+               'Registros descartados por muestreo')
+        return False
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """``QueueHandler`` que nunca espera: descarta según la ocupación de la cola"""
+
+    def __init__(self, log_queue, high_water=0.8):
+        super().__init__(log_queue)
+        self.high_water = max(int(log_queue.maxsize * high_water), 1) if log_queue.maxsize else 0
+        self.dropped = 0
+
+    def emit(self, record):
+        # Se decide antes de preparar el registro: descartar no cuesta nada
+        if self.high_water and record.levelno < logging.WARNING and self.queue.qsize() >= self.high_water:
+            self._drop(record)
+            return
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self._drop(record)
+        except Exception:
+            self.handleError(record)
+
+    def _drop(self, record):
+        self.dropped += 1
+        _count('log_records_dropped_total', {'level': record.levelname},
+               'Registros descartados con la cola de logging llena')
+
+    def prepare(self, record):
+        # Mensaje y traza como texto: el registro no retiene argumentos ni frames
+        # mientras espera en la cola, y el formateador JSON conserva los extra
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def queue_handler(log_file=None, max_bytes=10 * 1024 * 1024, backup_count=5,
+                  console_json=False, queue_size=10000, high_water=0.8):
+    """
+    Factoría para ``LOGGING['handlers']``: crea los handlers de consola y
+    fichero, arranca el ``QueueListener`` que los alimenta y devuelve el
+    handler de la cola.
+    """
+    console = logging.StreamHandler()
+    console.setFormatter(JsonFormatter() if console_json else logging.Formatter('{levelname} {message}', style='{'))
+    handlers = [console]
+    if log_file:
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter())
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=queue_size)
+    # Si se reconfigura el logging, el listener anterior vacía su cola y se para
+    stop_listener()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    _state['listener'] = listener
+    return NonBlockingQueueHandler(log_queue, high_water)
+
+
+def stop_listener():
+    """Escribe lo pendiente y para el hilo del listener"""
+    listener = _state['listener']
+    if listener is not None:
+        _state['listener'] = None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+
+atexit.register(stop_listener)
@@ -0,0 +1,422 @@
+import json
+import logging
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from config.db_executor import configure_executor, consumer_db
+from apps.posts.models import Post
+from config import db_router, tiered_cache
+from config.metrics import RequestMetricsMiddleware, query_signature, registry
+from config.structured_logging import JsonFormatter, NonBlockingQueueHandler, SamplingFilter
+
+User = get_user_model()
+
+
+class MediaServingTests(TestCase):
+    """Tests del servicio de media con Range, ETag y 304"""
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root, STORY_UPLOAD_TEMP_DIR=os.path.join(media_root, 'uploads')
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+        os.makedirs(os.path.join(media_root, 'stories', 'videos'))
+        with open(os.path.join(media_root, 'stories', 'videos', 'clip.mp4'), 'wb') as f:
+            f.write(b'0123456789')
+        self.url = '/media/stories/videos/clip.mp4'
+
+    def test_full_response_has_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), b'0123456789')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_partial_content(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(response['Content-Length'], '4')
+
+    def test_open_and_suffix_ranges(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=7-')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        self.assertEqual(response['Content-Range'], 'bytes 7-9/10')
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-3')
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+
+        # Un final más allá del tamaño se recorta
+        response = self.client.get(self.url, HTTP_RANGE='bytes=8-100')
+        self.assertEqual(response['Content-Range'], 'bytes 8-9/10')
+
+    def test_unsatisfiable_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-20')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */10')
+
+    def test_if_range_mismatch_serves_whole_file(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE='"otro"')
+        self.assertEqual(response.status_code, 200)
+
+        etag = response['ETag']
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-5', HTTP_IF_RANGE=etag)
+        self.assertEqual(response.status_code, 206)
+
+    def test_conditional_requests(self):
+        first = self.client.get(self.url)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH='"otro"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unique_names_are_immutable(self):
+        with open(os.path.join(settings.MEDIA_ROOT, '20240101_120000_abcdef12.jpg'), 'wb') as f:
+            f.write(b'jpeg')
+        response = self.client.get('/media/20240101_120000_abcdef12.jpg')
+        self.assertIn('immutable', response['Cache-Control'])
+
+    def test_missing_files_and_pending_uploads_are_not_served(self):
+        self.assertEqual(self.client.get('/media/nope.mp4').status_code, 404)
+        # Rutas fuera de MEDIA_ROOT: SuspiciousFileOperation
+        self.assertEqual(self.client.get('/media/../settings.py').status_code, 400)
+
+        os.makedirs(settings.STORY_UPLOAD_TEMP_DIR)
+        with open(os.path.join(settings.STORY_UPLOAD_TEMP_DIR, 'x.part'), 'wb') as f:
+            f.write(b'partial')
+        self.assertEqual(self.client.get('/media/uploads/x.part').status_code, 404)
+
+
+class RequestMetricsTests(TestCase):
+    """Tests de la instrumentación por petición y del endpoint de métricas"""
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.user = User.objects.create_user(
+            username='normal', email='normal@test.com', password='testpass123'
+        )
+        self.admin = User.objects.create_user(
+            username='admin', email='admin@test.com', password='testpass123', role='admin'
+        )
+
+    def _run(self, view):
+        request = RequestFactory().get('/api/test/')
+        return RequestMetricsMiddleware(view)(request)
+
+    def test_server_timing_counts_queries(self):
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.filter(is_banned=True))
+            return HttpResponse()
+
+        response = self._run(view)
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertIn('app;dur=', response['Server-Timing'])
+        self.assertIn('http_requests_total{method="GET",route="unmatched",status="200"} 1', registry.render())
+
+    def test_repeated_queries_are_reported_as_nplusone(self):
+        def view(request):
+            for pk in range(settings.METRICS_NPLUSONE_THRESHOLD):
+                User.objects.filter(pk=pk).first()
+            return HttpResponse()
+
+        with self.assertLogs('config.metrics', 'WARNING'):
+            self._run(view)
+        self.assertIn('http_request_nplusone_total', registry.render())
+
+    def test_in_lists_share_signature(self):
+        self.assertEqual(
+            query_signature('SELECT 1 WHERE id IN (%s, %s)'),
+            query_signature('SELECT 1 WHERE id IN (%s, %s, %s)'),
+        )
+
+    def test_metrics_endpoint_is_staff_only(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+        response = self.client.get(
+            '/api/metrics/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}'
+        )
+        self.assertEqual(response.status_code, 403)
+
+        self.client.get('/api/posts/')
+        response = self.client.get(
+            '/api/metrics/', HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.admin)}'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="api/posts/",le="+Inf"} 1',
+                      response.content.decode())
+
+    @override_settings(METRICS_TOKEN='secreto')
+    def test_metrics_endpoint_accepts_token(self):
+        response = self.client.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secreto')
+        self.assertEqual(response.status_code, 200)
+
+
+class ConsumerDBExecutorTests(TestCase):
+    """Tests del pool de base de datos de los consumers"""
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.addCleanup(configure_executor)
+
+    def test_calls_run_in_pool_and_are_measured(self):
+        configure_executor(2)
+        thread_name = async_to_sync(consumer_db(lambda: threading.current_thread().name))()
+
+        self.assertTrue(thread_name.startswith('consumer-db'))
+        metrics = registry.render()
+        self.assertIn('consumer_db_workers 2', metrics)
+        self.assertIn('consumer_db_queue_depth 0', metrics)
+        self.assertIn('consumer_db_wait_seconds_count 1', metrics)
+
+    def test_zero_workers_keeps_channels_behaviour(self):
+        configure_executor(0)
+        thread_name = async_to_sync(consumer_db(lambda: threading.current_thread().name))()
+        self.assertFalse(thread_name.startswith('consumer-db'))
+
+
+@override_settings(TIERED_CACHE_BETA=0, TIERED_CACHE_LOCAL_TTL=60)
+class TieredCacheTests(TestCase):
+    """Tests de la caché en dos niveles"""
+
+    def setUp(self):
+        cache.clear()
+        tiered_cache.clear_local()
+        self.addCleanup(tiered_cache.clear_local)
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return self.calls
+
+    def test_local_and_shared_hits(self):
+        self.assertEqual(tiered_cache.get_or_set('k', self.compute, 60), 1)
+        self.assertEqual(tiered_cache.get_or_set('k', self.compute, 60), 1)
+        # Otro proceso: LRU vacía, se sirve desde la caché compartida
+        tiered_cache.clear_local()
+        self.assertEqual(tiered_cache.get_or_set('k', self.compute, 60), 1)
+        self.assertEqual(self.calls, 1)
+
+    def test_tag_invalidation(self):
+        tiered_cache.get_or_set('a', self.compute, 60, ['t1'])
+        tiered_cache.get_or_set('b', self.compute, 60, ['t2'])
+        tiered_cache.invalidate_tags('t1')
+        self.assertEqual(tiered_cache.get_or_set('a', self.compute, 60, ['t1']), 3)
+        self.assertEqual(tiered_cache.get_or_set('b', self.compute, 60, ['t2']), 2)
+
+    def test_invalidation_from_another_process(self):
+        tiered_cache.get_or_set('a', self.compute, 60, ['t'])
+        # Simula otro proceso: la versión cambia en la caché compartida
+        cache.incr(tiered_cache.TAG_PREFIX + 't')
+        with override_settings(TIERED_CACHE_LOCAL_TTL=0):
+            self.assertEqual(tiered_cache.get_or_set('a', self.compute, 60, ['t']), 2)
+
+    def test_errors_are_not_cached(self):
+        def fail():
+            raise ValueError('sin datos')
+
+        with self.assertRaises(ValueError):
+            tiered_cache.get_or_set('k', fail, 60)
+        self.assertEqual(tiered_cache.get_or_set('k', self.compute, 60), 1)
+
+    def test_concurrent_misses_compute_once(self):
+        started = threading.Event()
+
+        def slow():
+            started.set()
+            time.sleep(0.2)
+            return self.compute()
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(tiered_cache.get_or_set('k', slow, 60)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, [1] * 5)
+        self.assertEqual(self.calls, 1)
+
+    @override_settings(TIERED_CACHE_LOCAL_TTL=0)
+    def test_stale_value_served_while_another_process_refreshes(self):
+        tiered_cache.get_or_set('k', self.compute, 0.05)
+        time.sleep(0.1)
+        cache.add(tiered_cache.LOCK_PREFIX + 'k', 1, 10)
+        self.assertEqual(tiered_cache.get_or_set('k', self.compute, 60), 1)
+        cache.delete(tiered_cache.LOCK_PREFIX + 'k')
+        self.assertEqual(tiered_cache.get_or_set('k', self.compute, 60), 2)
+
+    @override_settings(TIERED_CACHE_LOCAL_TTL=0, TIERED_CACHE_BETA=1)
+    def test_expensive_values_are_refreshed_early(self):
+        entry = tiered_cache.Entry('viejo', time.time() + 1, delta=1000)
+        cache.set(tiered_cache.KEY_PREFIX + 'k', entry, 60)
+        self.assertEqual(tiered_cache.get_or_set('k', lambda: 'nuevo', 60), 'nuevo')
+
+    def test_lru_evicts_least_recently_used(self):
+        lru = tiered_cache.LocalLRU(2)
+        for key in 'abc':
+            lru.set(key, tiered_cache.Entry(key, time.time() + 60, 0))
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 2)
+
+    def test_decorator_formats_key_and_tags(self):
+        @tiered_cache.cached('doble:{0}', ttl=60, tags=('num:{0}',))
+        def double(value):
+            self.calls += 1
+            return value * 2
+
+        self.assertEqual(double(2), 4)
+        self.assertEqual(double(2), 4)
+        self.assertEqual(double.cache_key(2), 'doble:2')
+        tiered_cache.invalidate_tags('num:2')
+        double(2)
+        self.assertEqual(self.calls, 2)
+
+
+# 'default' hace de réplica: el router devuelve su alias en vez de None (primario)
+@override_settings(DATABASE_REPLICAS=['default'], DB_REPLICA_MAX_LAG=10)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Tests del enrutado de lecturas a réplicas"""
+
+    def setUp(self):
+        cache.clear()
+        db_router.replicas.reset()
+        self.addCleanup(db_router.replicas.reset)
+        self.user = User.objects.create_user(username='lector', email='lector@test.com', password='x')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.router = db_router.PrimaryReplicaRouter()
+
+    def call(self, view, method='get', write=False, model=Post):
+        """Ejecuta ``view`` a través del middleware y devuelve la base de datos de lectura elegida"""
+        chosen = {}
+
+        def inner(request):
+            middleware.process_view(request, view, (), {})
+            chosen['db'] = self.router.db_for_read(model)
+            if write:
+                self.router.db_for_write(Post)
+            return HttpResponse()
+
+        middleware = db_router.ReplicaRoutingMiddleware(inner)
+        middleware(getattr(RequestFactory(), method)('/', **self.auth))
+        return chosen['db']
+
+    def test_only_marked_safe_views_read_from_replica(self):
+        marked = db_router.replica_reads(lambda request: None)
+        self.assertEqual(self.call(marked), 'default')
+        self.assertIsNone(self.call(lambda request: None))
+        self.assertIsNone(self.call(marked, method='post'))
+        # El modelo de usuario siempre va al primario
+        self.assertIsNone(self.call(marked, model=User))
+
+    def test_viewset_actions(self):
+        view = lambda request: None
+        view.cls = type('Vista', (), {'replica_reads': {'list'}})
+        view.actions = {'get': 'list'}
+        self.assertEqual(self.call(view), 'default')
+        view.actions = {'get': 'retrieve'}
+        self.assertIsNone(self.call(view))
+
+    def test_user_reads_primary_after_writing(self):
+        marked = db_router.replica_reads(lambda request: None)
+        self.call(marked, method='post', write=True)
+        self.assertTrue(db_router.is_pinned(self.user.id))
+        self.assertIsNone(self.call(marked))
+        cache.delete(db_router.pin_key(self.user.id))
+        self.assertEqual(self.call(marked), 'default')
+
+    def test_lagging_replicas_leave_rotation(self):
+        self.assertEqual(db_router.measure_replica_lag(['default']), {'default': 0.0})
+        self.assertEqual(db_router.measure_replica_lag(['inexistente']), {'inexistente': float('inf')})
+
+        db_router.replicas.lags = {'default': 30.0}
+        db_router.replicas.checked_at = time.monotonic()
+        self.assertIsNone(db_router.replicas.choose())
+        db_router.replicas.lags = {'default': 1.0}
+        self.assertEqual(db_router.replicas.choose(), 'default')
+
+
+class StructuredLoggingTests(TestCase):
+    """Tests del formato JSON, el muestreo y la contrapresión de la cola de logging"""
+
+    def setUp(self):
+        registry.reset()
+        self.addCleanup(registry.reset)
+
+    def record(self, level=logging.INFO, name='apps.chat.consumers', msg='hola %s', args=('mundo',), **extra):
+        record = logging.LogRecord(name, level, __file__, 10, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra_and_exception(self):
+        try:
+            raise ValueError('roto')
+        except ValueError:
+            record = logging.LogRecord('x', logging.ERROR, __file__, 1, 'fallo', (), sys.exc_info())
+        record.room = 7
+        data = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(data['level'], 'ERROR')
+        self.assertEqual(data['message'], 'fallo')
+        self.assertEqual(data['room'], 7)
+        self.assertIn('ValueError: roto', data['exception'])
+
+    def test_sampling_drops_info_but_keeps_warnings(self):
+        sampling = SamplingFilter({'apps.chat': 0, 'apps.chat.consumers': 1})
+
+        self.assertTrue(sampling.filter(self.record(name='apps.chat.consumers')))
+        self.assertFalse(sampling.filter(self.record(name='apps.chat.views')))
+        self.assertTrue(sampling.filter(self.record(level=logging.WARNING, name='apps.chat.views')))
+        self.assertTrue(sampling.filter(self.record(name='apps.posts')))
+        self.assertIn('log_records_sampled_out_total{logger="apps.chat.views"} 1', registry.render())
+
+    def test_queue_handler_sheds_load_without_blocking(self):
+        log_queue = queue.Queue(maxsize=10)
+        handler = NonBlockingQueueHandler(log_queue, high_water=0.5)
+
+        for _ in range(8):
+            handler.emit(self.record())
+        # Por encima del 50% solo entran avisos y errores, hasta llenar la cola
+        self.assertEqual(log_queue.qsize(), 5)
+        for _ in range(8):
+            handler.emit(self.record(level=logging.WARNING))
+        self.assertEqual(log_queue.qsize(), 10)
+        self.assertEqual(handler.dropped, 6)
+
+        queued = log_queue.get_nowait()
+        self.assertEqual(queued.msg, 'hola mundo')
+        self.assertIsNone(queued.args)
+        metrics = registry.render()
+        self.assertIn('log_records_dropped_total{level="INFO"} 3', metrics)
+        self.assertIn('log_records_dropped_total{level="WARNING"} 3', metrics)
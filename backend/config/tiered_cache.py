@@ -0,0 +1,275 @@
+"""
+Caché en dos niveles para resultados caros de calcular.
+
+``get_or_set`` (y el decorador ``cached``) busca primero en una LRU del
+proceso (``TIERED_CACHE_LOCAL_SIZE`` entradas) y después en la caché
+compartida (``CACHES['default']``: Redis en producción). Cada entrada guarda
+su caducidad lógica, lo que costó calcularla y la versión de sus etiquetas:
+
+- **Etiquetas**: ``invalidate_tags`` incrementa la versión de cada etiqueta en
+  la caché compartida y las entradas con una versión anterior dejan de
+  valer. La versión se lee en la misma ida a la caché que la entrada. La LRU
+  local no vuelve a comprobarla durante ``TIERED_CACHE_LOCAL_TTL`` segundos:
+  en el proceso que invalida el cambio es inmediato y en el resto tarda como
+  mucho ese tiempo.
+- **Expiración anticipada probabilística**: cuanto más cerca está de caducar
+  una entrada y más costó calcularla, más probable es que una lectura la
+  recalcule antes de tiempo (``TIERED_CACHE_BETA``), así que no caducan todas
+  a la vez para todos los procesos.
+- **Una sola carga (single-flight)**: en cada proceso solo un hilo calcula
+  cada clave, y entre procesos un lock en la caché compartida
+  (``cache.add``). Los demás sirven el valor anterior si lo hay (se conserva
+  ``TIERED_CACHE_STALE_GRACE`` segundos después de caducar) o esperan al
+  resultado hasta ``TIERED_CACHE_LOCK_TIMEOUT`` segundos.
+"""
+import functools
+import math
+import random
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import registry
+
+KEY_PREFIX = 'tiered:'
+TAG_PREFIX = 'tiered:tag:'
+LOCK_PREFIX = 'tiered:lock:'
+
+# Intervalo de sondeo mientras otro proceso calcula la misma clave
+LOCK_POLL_INTERVAL = 0.05
+
+
+@dataclass
+class Entry:
+    value: object
+    expires_at: float
+    # Segundos que costó calcular el valor
+    delta: float
+    tags: dict = field(default_factory=dict)
+    # Momento en que la LRU local la guardó (no se comparte)
+    cached_at: float = 0.0
+
+    def expired(self, now):
+        return now >= self.expires_at
+
+    def should_refresh(self, now, beta):
+        """XFetch: adelanta el recálculo con una probabilidad que crece al acercarse la caducidad"""
+        return now - self.delta * beta * math.log(1.0 - random.random()) >= self.expires_at
+
+
+class LocalLRU:
+    """LRU en memoria del proceso con el número de entradas limitado"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_tagged(self, tags):
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if tags & entry.tags.keys()]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _Flight:
+    """Cálculo en curso de una clave en este proceso"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+        self.value = None
+
+
+_local = {'lru': None}
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+def local_cache():
+    if _local['lru'] is None:
+        _local['lru'] = LocalLRU(settings.TIERED_CACHE_LOCAL_SIZE)
+    return _local['lru']
+
+
+def _record(result):
+    registry.inc('tiered_cache_requests_total', {'result': result},
+                 help_text='Lecturas de la caché en dos niveles por resultado')
+
+
+def _tag_versions(tags, found):
+    """Versión actual de cada etiqueta; las que no existen se crean con una versión nueva"""
+    versions = {tag: found.get(TAG_PREFIX + tag) for tag in tags}
+    missing = [tag for tag, version in versions.items() if version is None]
+    if missing:
+        # Una versión basada en el reloj: si la caché pierde la etiqueta, las
+        # entradas antiguas no vuelven a coincidir con la nueva
+        for tag in missing:
+            cache.add(TAG_PREFIX + tag, time.time_ns(), None)
+        created = cache.get_many([TAG_PREFIX + tag for tag in missing])
+        for tag in missing:
+            versions[tag] = created.get(TAG_PREFIX + tag)
+    return versions
+
+
+def get_or_set(key, compute, ttl, tags=()):
+    """
+    Valor de ``key``; si no está en caché (o sus etiquetas se invalidaron) lo
+    calcula con ``compute()`` y lo guarda ``ttl`` segundos.
+    """
+    lru = local_cache()
+    now = time.time()
+    entry = lru.get(key)
+    if (entry is not None and not entry.expired(now)
+            and now - entry.cached_at < settings.TIERED_CACHE_LOCAL_TTL):
+        _record('local')
+        return entry.value
+
+    tags = tuple(tags)
+    found = cache.get_many([KEY_PREFIX + key, *(TAG_PREFIX + tag for tag in tags)])
+    versions = _tag_versions(tags, found)
+    entry = found.get(KEY_PREFIX + key)
+    if entry is not None and entry.tags != versions:
+        entry = None
+
+    if entry is not None and not entry.should_refresh(now, settings.TIERED_CACHE_BETA):
+        _record('shared')
+        entry.cached_at = now
+        lru.set(key, entry)
+        return entry.value
+    return _refresh(key, compute, ttl, versions, stale=entry)
+
+
+def _refresh(key, compute, ttl, versions, stale):
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = _Flight()
+
+    if not leader:
+        # Otro hilo del proceso ya lo está calculando
+        if stale is not None:
+            _record('stale')
+            return stale.value
+        if flight.done.wait(settings.TIERED_CACHE_LOCK_TIMEOUT) and flight.ok:
+            _record('coalesced')
+            return flight.value
+        return compute()
+
+    try:
+        value = _compute_once(key, compute, ttl, versions, stale)
+        flight.value, flight.ok = value, True
+        return value
+    finally:
+        with _flights_lock:
+            _flights.pop(key, None)
+        flight.done.set()
+
+
+def _compute_once(key, compute, ttl, versions, stale):
+    lock_key = LOCK_PREFIX + key
+    timeout = settings.TIERED_CACHE_LOCK_TIMEOUT
+    locked = cache.add(lock_key, 1, timeout)
+    if not locked:
+        # Otro proceso lo está calculando
+        if stale is not None:
+            _record('stale')
+            return stale.value
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(KEY_PREFIX + key)
+            if entry is not None and entry.tags == versions and not entry.expired(time.time()):
+                _record('coalesced')
+                entry.cached_at = time.time()
+                local_cache().set(key, entry)
+                return entry.value
+
+    _record('early' if stale is not None else 'miss')
+    try:
+        started = time.perf_counter()
+        value = compute()
+        delta = time.perf_counter() - started
+        now = time.time()
+        entry = Entry(value, now + ttl, delta, versions, cached_at=now)
+        cache.set(KEY_PREFIX + key, entry, ttl + settings.TIERED_CACHE_STALE_GRACE)
+        local_cache().set(key, entry)
+        return value
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def cached(key, ttl, tags=()):
+    """
+    Decorador de ``get_or_set``. ``key`` y cada etiqueta son plantillas de
+    ``str.format`` con los argumentos de la función (``'perfil:{0}'``,
+    ``'user:{user_id}'``) o funciones que reciben esos argumentos. ``ttl``
+    puede ser una función sin argumentos (p. ej. para leerlo de settings).
+    """
+    def build(template, args, kwargs):
+        return template(*args, **kwargs) if callable(template) else template.format(*args, **kwargs)
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return get_or_set(
+                build(key, args, kwargs),
+                lambda: func(*args, **kwargs),
+                ttl() if callable(ttl) else ttl,
+                [build(tag, args, kwargs) for tag in tags],
+            )
+        wrapper.cache_key = lambda *args, **kwargs: build(key, args, kwargs)
+        return wrapper
+    return decorator
+
+
+def invalidate_tags(*tags):
+    """Invalida en todos los procesos las entradas con alguna de ``tags``"""
+    for tag in tags:
+        try:
+            cache.incr(TAG_PREFIX + tag)
+        except ValueError:
+            cache.set(TAG_PREFIX + tag, time.time_ns(), None)
+    local_cache().delete_tagged(set(tags))
+
+
+def delete(key):
+    cache.delete(KEY_PREFIX + key)
+    local_cache().delete(key)
+
+
+def clear_local():
+    """Vacía la LRU del proceso (tests)"""
+    local_cache().clear()
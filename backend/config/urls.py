@@ -1,8 +1,8 @@
 from django.contrib import admin
 from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
-from django.views.static import serve
+from config.media import serve_media
+from config.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,15 +14,11 @@ urlpatterns = [
     path('api/notifications/', include('notifications.urls')),
     path('api/administration/', include('apps.administration.urls')),
     path('api/live/', include('live.urls')),
+    path('api/metrics/', metrics_view, name='metrics'),
 ]
 
-# Servir archivos media en desarrollo
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-else:
-    # Servir archivos media en producción (PythonAnywhere)
-    urlpatterns += [
-        re_path(r'^media/(?P<path>.*)$', serve, {
-            'document_root': settings.MEDIA_ROOT,
-        }),
-    ]
\ No newline at end of file
+# Servir archivos media (en desarrollo y en producción en PythonAnywhere) con
+# soporte de Range, ETag y 304
+urlpatterns += [
+    re_path(r'^%s(?P<path>.*)$' % settings.MEDIA_URL.lstrip('/'), serve_media),
+]
@@ -0,0 +1,129 @@
+"""
+Buffer de comentarios del chat en vivo.
+
+Los comentarios recibidos por WebSocket se serializan en memoria (sin consultas:
+los roles salen de ``live.roles``) y se guardan en la base de datos por lotes
+con ``bulk_create`` cada ``LIVE_COMMENT_FLUSH_INTERVAL`` segundos o al llegar a
+``LIVE_COMMENT_BATCH_SIZE`` pendientes.
+
+Cada proceso mantiene además un ring buffer con los últimos
+``LIVE_COMMENT_REPLAY_SIZE`` comentarios de los streams con conexiones locales,
+alimentado por los eventos ``new_comment`` del grupo, para enviarlos a quien se
+une tarde sin tocar la base de datos.
+"""
+import asyncio
+import logging
+import uuid
+from collections import deque
+
+from config.db_executor import consumer_db
+from django.conf import settings
+from django.utils import timezone
+
+from .models import LiveStreamComment
+from .roles import load_stream_roles
+from .serializers import LiveStreamCommentSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_comment(comment, roles):
+    """Serializa un comentario añadiendo el ``uid`` usado para deduplicar el replay"""
+    data = dict(LiveStreamCommentSerializer(comment, context={'roles': roles}).data)
+    data['uid'] = uuid.uuid4().hex
+    return data
+
+
+def load_recent_comments(stream_id, limit):
+    """Últimos comentarios guardados de un stream, del más antiguo al más reciente"""
+    comments = list(
+        LiveStreamComment.objects.filter(live_stream_id=stream_id)
+        .select_related('user').order_by('-id')[:limit]
+    )
+    roles = load_stream_roles(stream_id)
+    return [serialize_comment(comment, roles) for comment in reversed(comments)]
+
+
+class StreamCommentBuffer:
+    """Escritura por lotes y replay de comentarios por stream"""
+
+    def __init__(self):
+        self._pending = []
+        self._recent = {}
+        self._uids = {}
+        self._connections = {}
+        self._flush_task = None
+
+    def add(self, stream_id, user, content, roles):
+        """Encola un comentario para guardarlo y devuelve su versión serializada"""
+        comment = LiveStreamComment(
+            live_stream_id=stream_id,
+            user=user,
+            content=content,
+            created_at=timezone.now(),
+        )
+        self._pending.append(comment)
+        self._schedule_flush()
+        return serialize_comment(comment, roles)
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._pending:
+            if len(self._pending) < settings.LIVE_COMMENT_BATCH_SIZE:
+                await asyncio.sleep(settings.LIVE_COMMENT_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self):
+        """Guarda los comentarios pendientes en lotes de ``LIVE_COMMENT_BATCH_SIZE``"""
+        batch_size = settings.LIVE_COMMENT_BATCH_SIZE
+        while self._pending:
+            batch, self._pending = self._pending[:batch_size], self._pending[batch_size:]
+            try:
+                await consumer_db(LiveStreamComment.objects.bulk_create)(batch)
+            except Exception:
+                # Normalmente el stream se borró mientras había comentarios en cola
+                logger.exception('No se pudieron guardar %d comentarios en vivo', len(batch))
+
+    def acquire(self, stream_id):
+        """Registra una conexión local del stream para mantener su replay en memoria"""
+        self._connections[stream_id] = self._connections.get(stream_id, 0) + 1
+
+    def release(self, stream_id):
+        remaining = self._connections.get(stream_id, 0) - 1
+        if remaining > 0:
+            self._connections[stream_id] = remaining
+        else:
+            self._connections.pop(stream_id, None)
+            self._recent.pop(stream_id, None)
+            self._uids.pop(stream_id, None)
+
+    async def recent(self, stream_id):
+        """Últimos comentarios del stream; la primera vez se cargan de la base de datos"""
+        if stream_id not in self._recent:
+            limit = settings.LIVE_COMMENT_REPLAY_SIZE
+            comments = await consumer_db(load_recent_comments)(stream_id, limit)
+            if stream_id not in self._recent and self._connections.get(stream_id):
+                self._recent[stream_id] = deque(maxlen=limit)
+                self._uids[stream_id] = set()
+                for comment in comments:
+                    self.remember(stream_id, comment)
+            else:
+                return comments
+        return list(self._recent[stream_id])
+
+    def remember(self, stream_id, comment):
+        """Añade un comentario difundido al replay (una vez aunque llegue a varias conexiones)"""
+        recent = self._recent.get(stream_id)
+        uid = comment.get('uid') if comment else None
+        if recent is None or uid is None or uid in self._uids[stream_id]:
+            return
+        if len(recent) == recent.maxlen:
+            self._uids[stream_id].discard(recent[0]['uid'])
+        recent.append(comment)
+        self._uids[stream_id].add(uid)
+
+
+comment_buffer = StreamCommentBuffer()
@@ -1,26 +1,34 @@
+import asyncio
 import json
+import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from config.db_executor import consumer_db
+from config.metrics import InstrumentedConsumerMixin
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import LiveStream, LiveStreamComment, StreamModerator, StreamVIP
-from .serializers import LiveStreamCommentSerializer
+from django.db import IntegrityError
+from .comments import comment_buffer
+from .models import LiveStream, StreamModerator, StreamVIP
+from .presence import presence
+from .roles import role_cache
 
 User = get_user_model()
+# Señalización y comentarios generan muchos registros: se muestrean con LOG_SAMPLING
+logger = logging.getLogger(__name__)
 
 
-class LiveStreamConsumer(AsyncWebsocketConsumer):
+class LiveStreamConsumer(InstrumentedConsumerMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer para transmisiones en vivo.
     Maneja la señalización WebRTC y los comentarios en tiempo real.
     """
     
-    # Diccionario para trackear viewers conectados por stream
-    connected_viewers = {}
-    
     async def connect(self):
         self.user = self.scope['user']
         self.stream_id = self.scope['url_route']['kwargs']['stream_id']
         self.room_group_name = f'live_stream_{self.stream_id}'
+        self.is_viewer = False
+        self.registered = False
         
         # Aceptar la conexión primero para poder enviar mensajes de error si es necesario
         await self.accept()
@@ -33,9 +41,12 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        # Verificar que el stream existe
-        stream_exists = await self.check_stream_exists()
-        if not stream_exists:
+        # Cargar los roles del stream (también verifica que existe)
+        role_cache.acquire(self.stream_id)
+        comment_buffer.acquire(self.stream_id)
+        self.registered = True
+        roles = await role_cache.get(self.stream_id)
+        if roles is None:
             await self.send(text_data=json.dumps({
                 'type': 'error',
                 'message': 'La transmisión no existe'
@@ -43,36 +54,23 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        # Unirse al grupo del stream
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
-        
-        # Incrementar contador de espectadores
-        is_streamer = await self.is_user_streamer()
+        # Unirse al grupo del stream y registrar la conexión en el servicio de presencia
+        is_streamer = roles.is_streamer(self.user.id)
+        calls = [self.channel_layer.group_add(self.room_group_name, self.channel_name)]
         if not is_streamer:
-            await self.increment_viewers()
-            # Añadir viewer a la lista de conectados
-            if self.stream_id not in self.connected_viewers:
-                self.connected_viewers[self.stream_id] = set()
-            self.connected_viewers[self.stream_id].add(self.user.username)
-        
-        # Notificar a todos sobre el nuevo espectador
-        viewers_count = await self.get_viewers_count()
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'viewers_update',
-                'count': viewers_count
-            }
-        )
+            self.is_viewer = True
+            calls.append(presence.join(
+                self.stream_id, self.channel_name, self.user.id, self.user.username
+            ))
+        await asyncio.gather(*calls)
+        if self.is_viewer:
+            self.heartbeat_task = asyncio.ensure_future(self.heartbeat_loop())
         
         # Enviar lista de viewers al streamer
-        if is_streamer and self.stream_id in self.connected_viewers:
+        if is_streamer:
             await self.send(text_data=json.dumps({
                 'type': 'viewers_list',
-                'viewers': list(self.connected_viewers[self.stream_id])
+                'viewers': await presence.viewers(self.stream_id)
             }))
  
         # Notificar que un usuario se unió (para WebRTC)
@@ -85,14 +83,9 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
                     'username': self.user.username
                 }
             )
-            # Broadcast actualización de lista de viewers
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'viewers_list_update',
-                    'viewers': list(self.connected_viewers[self.stream_id])
-                }
-            )
+        
+        # Conteo y lista de espectadores (limitado en frecuencia)
+        await presence.broadcast_viewers(self.stream_id, self.channel_layer)
         
         # Enviar mensaje de bienvenida
         await self.send(text_data=json.dumps({
@@ -102,48 +95,48 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             'is_streamer': is_streamer,
             'user_id': self.user.id
         }))
+        
+        # Últimos comentarios para quien se une tarde
+        await self.send(text_data=json.dumps({
+            'type': 'recent_comments',
+            'comments': await comment_buffer.recent(self.stream_id)
+        }))
     
     async def disconnect(self, close_code):
-        # Decrementar contador de espectadores
-        is_streamer = await self.is_user_streamer()
-        if not is_streamer:
-            await self.decrement_viewers()
-            # Remover viewer de la lista
-            if self.stream_id in self.connected_viewers:
-                self.connected_viewers[self.stream_id].discard(self.user.username)
-                # Broadcast actualización de lista
-                await self.channel_layer.group_send(
-                    self.room_group_name,
-                    {
-                        'type': 'viewers_list_update',
-                        'viewers': list(self.connected_viewers[self.stream_id])
-                    }
-                )
-        
-        # Notificar sobre la actualización de espectadores
-        viewers_count = await self.get_viewers_count()
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'viewers_update',
-                'count': viewers_count
-            }
-        )
+        if not getattr(self, 'room_group_name', None):
+            return
 
-        # Notificar que un usuario salió
-        if not is_streamer:
-            await self.channel_layer.group_send(
+        if self.registered:
+            role_cache.release(self.stream_id)
+            comment_buffer.release(self.stream_id)
+
+        # Salir del grupo y, si era espectador, de la presencia a la vez
+        calls = [self.channel_layer.group_discard(self.room_group_name, self.channel_name)]
+        if self.is_viewer:
+            self.heartbeat_task.cancel()
+            calls.append(presence.leave(self.stream_id, self.channel_name))
+            # Notificar que un usuario salió
+            calls.append(self.channel_layer.group_send(
                 self.room_group_name,
                 {
                     'type': 'user_left',
                     'user_id': self.user.id
                 }
-            )
-        
-        # Salir del grupo
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
+            ))
+        await asyncio.gather(*calls)
+        if self.is_viewer:
+            await presence.broadcast_viewers(self.stream_id, self.channel_layer)
+    
+    async def heartbeat_loop(self):
+        """Renueva el TTL de presencia mientras la conexión siga abierta"""
+        interval = max(1, settings.LIVE_PRESENCE_TTL / 3)
+        while True:
+            await asyncio.sleep(interval)
+            await self.refresh_presence()
+    
+    async def refresh_presence(self):
+        await presence.heartbeat(
+            self.stream_id, self.channel_name, self.user.id, self.user.username
         )
     
     async def receive(self, text_data):
@@ -151,8 +144,17 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
         try:
             data = json.loads(text_data)
             message_type = data.get('type')
+            if message_type != 'heartbeat':
+                logger.info('Evento de directo %s', message_type, extra={
+                    'stream_id': self.stream_id, 'user_id': self.user.id, 'event': message_type,
+                })
             
-            if message_type == 'comment':
+            if message_type == 'heartbeat':
+                # Heartbeat explícito del cliente
+                if self.is_viewer:
+                    await self.refresh_presence()
+
+            elif message_type == 'comment':
                 # Guardar y transmitir comentario
                 content = data.get('content', '').strip()
                 if content:
@@ -218,9 +220,11 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             
             elif message_type == 'stream_ended':
                 # El streamer finalizó la transmisión
-                is_streamer = await self.is_user_streamer()
-                if is_streamer:
+                roles = await role_cache.get(self.stream_id)
+                if roles and roles.is_streamer(self.user.id):
+                    await comment_buffer.flush()
                     await self.end_stream()
+                    await presence.flush([self.stream_id])
                     await self.channel_layer.group_send(
                         self.room_group_name,
                         {
@@ -238,6 +242,7 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
     # Handlers para mensajes del grupo
     async def new_comment(self, event):
         """Enviar nuevo comentario a todos los clientes"""
+        comment_buffer.remember(self.stream_id, event['comment'])
         await self.send(text_data=json.dumps({
             'type': 'new_comment',
             'comment': event['comment']
@@ -320,6 +325,17 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             'viewers': event['viewers']
         }))
     
+    async def system_message(self, event):
+        """Enviar mensaje del sistema a todos los clientes"""
+        await self.send(text_data=json.dumps({
+            'type': 'system_message',
+            'message': event['message']
+        }))
+    
+    async def roles_changed(self, event):
+        """Descartar la tabla de roles en caché tras un /mod o /vip"""
+        role_cache.invalidate(self.stream_id)
+    
     async def user_kicked(self, event):
         """Notificar que un usuario fue expulsado"""
         if event['user_id'] == self.user.id:
@@ -335,14 +351,17 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
         parts = content.split()
         command = parts[0].lower()
         
-        is_streamer = await self.is_user_streamer()
-        is_mod = await self.is_user_moderator()
+        roles = await role_cache.get(self.stream_id)
+        if roles is None:
+            return
+        is_streamer = roles.is_streamer(self.user.id)
+        is_mod = roles.is_moderator(self.user.id)
         
         if len(parts) >= 2:
             target_username = parts[1].lstrip('@')
             
             # PROTECCIÓN SUPREMA AL STREAMER
-            if await self.is_username_streamer(target_username):
+            if roles.is_username_streamer(target_username):
                 await self.send(text_data=json.dumps({
                     'type': 'system_message',
                     'message': '⛔ No puedes realizar acciones contra el Streamer.'
@@ -352,6 +371,7 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             if command == '/mod' and is_streamer:
                 success = await self.add_moderator(target_username)
                 if success:
+                    await self.broadcast_roles_changed()
                     await self.send(text_data=json.dumps({
                         'type': 'system_message',
                         'message': f'🛡️ {target_username} ahora es moderador'
@@ -360,6 +380,7 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             elif command == '/vip' and is_streamer:
                 success = await self.add_vip(target_username)
                 if success:
+                    await self.broadcast_roles_changed()
                     await self.send(text_data=json.dumps({
                         'type': 'system_message',
                         'message': f'💎 {target_username} ahora es VIP'
@@ -367,7 +388,7 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
             
             elif command == '/kick' and (is_streamer or is_mod):
                 # Protección adicional: Mods no pueden kickear a otros Mods
-                if await self.is_username_moderator(target_username) and not is_streamer:
+                if roles.is_username_moderator(target_username) and not is_streamer:
                      await self.send(text_data=json.dumps({
                         'type': 'system_message',
                         'message': '⛔ No puedes expulsar a un moderador.'
@@ -393,75 +414,23 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
                         }
                     )
     
-    # Métodos de base de datos
-    @database_sync_to_async
-    def check_stream_exists(self):
-        return LiveStream.objects.filter(id=self.stream_id).exists()
-    
-    @database_sync_to_async
-    def is_user_streamer(self):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            return stream.streamer.id == self.user.id
-        except LiveStream.DoesNotExist:
-            return False
-
-    @database_sync_to_async
-    def is_username_streamer(self, username):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            return stream.streamer.username == username
-        except LiveStream.DoesNotExist:
-            return False
-            
-    @database_sync_to_async
-    def is_username_moderator(self, username):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            return StreamModerator.objects.filter(live_stream=stream, user__username=username).exists()
-        except (LiveStream.DoesNotExist, User.DoesNotExist):
-            return False
-    
-    @database_sync_to_async
-    def increment_viewers(self):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            stream.update_viewers(stream.viewers_count + 1)
-        except LiveStream.DoesNotExist:
-            pass
-    
-    @database_sync_to_async
-    def decrement_viewers(self):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            new_count = max(0, stream.viewers_count - 1)
-            stream.update_viewers(new_count)
-        except LiveStream.DoesNotExist:
-            pass
-    
-    @database_sync_to_async
-    def get_viewers_count(self):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            return stream.viewers_count
-        except LiveStream.DoesNotExist:
-            return 0
+    async def broadcast_roles_changed(self):
+        """Invalidar la tabla de roles en todos los procesos del stream"""
+        role_cache.invalidate(self.stream_id)
+        await self.channel_layer.group_send(
+            self.room_group_name,
+            {'type': 'roles_changed'}
+        )
     
-    @database_sync_to_async
-    def save_comment(self, content):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            comment = LiveStreamComment.objects.create(
-                live_stream=stream,
-                user=self.user,
-                content=content
-            )
-            serializer = LiveStreamCommentSerializer(comment)
-            return serializer.data
-        except LiveStream.DoesNotExist:
+    async def save_comment(self, content):
+        """Encolar el comentario para guardarlo por lotes y devolverlo serializado"""
+        roles = await role_cache.get(self.stream_id)
+        if roles is None:
             return None
+        return comment_buffer.add(self.stream_id, self.user, content, roles)
     
-    @database_sync_to_async
+    # Métodos de base de datos
+    @consumer_db
     def end_stream(self):
         try:
             stream = LiveStream.objects.get(id=self.stream_id)
@@ -469,39 +438,30 @@ class LiveStreamConsumer(AsyncWebsocketConsumer):
         except LiveStream.DoesNotExist:
             pass
     
-    @database_sync_to_async
-    def is_user_moderator(self):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            return StreamModerator.objects.filter(live_stream=stream, user=self.user).exists()
-        except LiveStream.DoesNotExist:
-            return False
-    
-    @database_sync_to_async
+    @consumer_db
     def add_moderator(self, username):
-        try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            target_user = User.objects.get(username=username)
-            StreamModerator.objects.get_or_create(live_stream=stream, user=target_user)
-            return True
-        except (LiveStream.DoesNotExist, User.DoesNotExist):
-            return False
+        return self.add_role(StreamModerator, username)
     
-    @database_sync_to_async
+    @consumer_db
     def add_vip(self, username):
+        return self.add_role(StreamVIP, username)
+    
+    def add_role(self, model, username):
+        """
+        Asigna el rol de ``model`` a ``username``. Solo se llega aquí con los
+        roles del stream cargados, así que el stream existe y basta con buscar
+        el id del usuario.
+        """
+        user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+        if user_id is None:
+            return False
         try:
-            stream = LiveStream.objects.get(id=self.stream_id)
-            target_user = User.objects.get(username=username)
-            StreamVIP.objects.get_or_create(live_stream=stream, user=target_user)
-            return True
-        except (LiveStream.DoesNotExist, User.DoesNotExist):
+            model.objects.get_or_create(live_stream_id=self.stream_id, user_id=user_id)
+        except IntegrityError:
+            # El stream se borró después de cargar los roles
             return False
+        return True
     
-    @database_sync_to_async
+    @consumer_db
     def get_user_id_by_username(self, username):
-        try:
-            user = User.objects.get(username=username)
-            return user.id
-        except User.DoesNotExist:
-            return None
-
+        return User.objects.filter(username=username).values_list('id', flat=True).first()
@@ -0,0 +1,289 @@
+"""
+Servicio de presencia para las transmisiones en vivo.
+
+Cuenta conexiones (no usernames): dos pestañas del mismo usuario suman un solo
+espectador y cerrar una de ellas no lo saca de la lista. Cada conexión tiene un
+TTL que se renueva con heartbeats, así que si un proceso muere sin ejecutar
+``disconnect`` sus conexiones caducan solas.
+
+``viewers_count`` y ``peak_viewers`` se vuelcan a la base de datos por lotes con
+``UPDATE`` atómicos, y el conteo de espectadores se difunde como mucho una vez
+cada ``LIVE_VIEWERS_BROADCAST_INTERVAL`` segundos por stream.
+
+Cada proceso revisa cada ``LIVE_PRESENCE_TTL`` segundos los streams en los que
+ha tenido espectadores: si han caducado conexiones (las de un proceso caído),
+vuelca y difunde el nuevo conteo sin esperar a que alguien entre o salga.
+"""
+import asyncio
+import time
+
+from channels.layers import get_channel_layer
+from config.db_executor import consumer_db
+from django.conf import settings
+from django.db.models import Value
+from django.db.models.functions import Greatest
+
+from .models import LiveStream
+
+
+class LocalPresenceBackend:
+    """Backend en memoria del proceso (desarrollo / InMemoryChannelLayer)"""
+
+    def __init__(self):
+        # stream_id -> {channel_name: (user_id, username, expira_en)}
+        self._streams = {}
+
+    async def touch(self, stream_id, channel_name, user_id, username, ttl):
+        connections = self._streams.setdefault(stream_id, {})
+        connections[channel_name] = (user_id, username, time.monotonic() + ttl)
+
+    async def remove(self, stream_id, channel_name):
+        connections = self._streams.get(stream_id)
+        if connections is None:
+            return
+        connections.pop(channel_name, None)
+        if not connections:
+            del self._streams[stream_id]
+
+    async def prune(self, stream_id):
+        """Quita las conexiones caducadas; devuelve cuántas había"""
+        connections = self._streams.get(stream_id)
+        if not connections:
+            return 0
+
+        now = time.monotonic()
+        expired = [c for c, entry in connections.items() if entry[2] <= now]
+        for channel_name in expired:
+            del connections[channel_name]
+        if not connections:
+            del self._streams[stream_id]
+        return len(expired)
+
+    async def members(self, stream_id):
+        await self.prune(stream_id)
+        connections = self._streams.get(stream_id)
+        if not connections:
+            return {}
+
+        members = {}
+        for user_id, username, _ in connections.values():
+            _, count = members.get(user_id, (username, 0))
+            members[user_id] = (username, count + 1)
+        return members
+
+
+class RedisPresenceBackend:
+    """
+    Backend compartido entre procesos sobre el Redis del channel layer.
+
+    Por stream guarda un sorted set ``canal -> expira_en`` y un hash
+    ``canal -> user_id:username``.
+    """
+
+    key_prefix = 'live:presence'
+
+    def __init__(self, url):
+        self._url = url
+        self._client = None
+        self._loop = None
+
+    @property
+    def client(self):
+        # Los clientes de redis.asyncio están ligados al event loop que los crea
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            import redis.asyncio as aioredis
+            self._client = aioredis.from_url(self._url)
+            self._loop = loop
+        return self._client
+
+    def _keys(self, stream_id):
+        base = f'{self.key_prefix}:{stream_id}'
+        return base, f'{base}:users'
+
+    async def touch(self, stream_id, channel_name, user_id, username, ttl):
+        expires_key, users_key = self._keys(stream_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zadd(expires_key, {channel_name: time.time() + ttl})
+            pipe.hset(users_key, channel_name, f'{user_id}:{username}')
+            # Los streams vacíos desaparecen solos
+            pipe.expire(expires_key, ttl * 2)
+            pipe.expire(users_key, ttl * 2)
+            await pipe.execute()
+
+    async def remove(self, stream_id, channel_name):
+        expires_key, users_key = self._keys(stream_id)
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.zrem(expires_key, channel_name)
+            pipe.hdel(users_key, channel_name)
+            await pipe.execute()
+
+    async def prune(self, stream_id):
+        """Quita las conexiones caducadas; devuelve cuántas había"""
+        expires_key, users_key = self._keys(stream_id)
+        expired = await self.client.zrangebyscore(expires_key, '-inf', time.time())
+        if expired:
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.zrem(expires_key, *expired)
+                pipe.hdel(users_key, *expired)
+                await pipe.execute()
+        return len(expired)
+
+    async def members(self, stream_id):
+        _, users_key = self._keys(stream_id)
+        await self.prune(stream_id)
+
+        members = {}
+        for raw in (await self.client.hgetall(users_key)).values():
+            user_id, username = raw.decode().split(':', 1)
+            user_id = int(user_id)
+            _, count = members.get(user_id, (username, 0))
+            members[user_id] = (username, count + 1)
+        return members
+
+
+def get_presence_backend():
+    """Usa el Redis del channel layer si existe; si no, el backend local"""
+    layer = settings.CHANNEL_LAYERS.get('default', {})
+    if not layer.get('BACKEND', '').startswith('channels_redis.'):
+        return LocalPresenceBackend()
+
+    host = layer.get('CONFIG', {}).get('hosts', ['redis://localhost:6379'])[0]
+    if isinstance(host, dict):
+        host = host.get('address')
+    if isinstance(host, (list, tuple)):
+        host = f'redis://{host[0]}:{host[1]}'
+    return RedisPresenceBackend(host)
+
+
+def save_viewer_counts(counts):
+    """Vuelca {stream_id: espectadores} con un UPDATE atómico por stream"""
+    for stream_id, count in counts.items():
+        LiveStream.objects.filter(id=stream_id).update(
+            viewers_count=count,
+            peak_viewers=Greatest('peak_viewers', Value(count)),
+        )
+
+
+class PresenceService:
+    """Registro de espectadores por stream con volcado y broadcast diferidos"""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+        self._dirty = set()
+        self._last_broadcast = {}
+        self._scheduled_broadcasts = {}
+        self._flush_task = None
+        # Streams con espectadores en este proceso: se revisan por si caducan conexiones
+        self._watched = set()
+        self._sweep_task = None
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            self._backend = get_presence_backend()
+        return self._backend
+
+    async def join(self, stream_id, channel_name, user_id, username):
+        await self.heartbeat(stream_id, channel_name, user_id, username)
+        self._mark_dirty(stream_id)
+        self._watched.add(stream_id)
+        if self._sweep_task is None or self._sweep_task.done():
+            self._sweep_task = asyncio.ensure_future(self._sweep_loop())
+
+    async def heartbeat(self, stream_id, channel_name, user_id, username):
+        await self.backend.touch(
+            stream_id, channel_name, user_id, username, settings.LIVE_PRESENCE_TTL
+        )
+
+    async def leave(self, stream_id, channel_name):
+        await self.backend.remove(stream_id, channel_name)
+        self._mark_dirty(stream_id)
+
+    async def viewers(self, stream_id):
+        """Usernames de los espectadores conectados (uno por usuario)"""
+        members = await self.backend.members(stream_id)
+        return sorted(username for username, _ in members.values())
+
+    async def viewers_count(self, stream_id):
+        return len(await self.backend.members(stream_id))
+
+    def _mark_dirty(self, stream_id):
+        self._dirty.add(stream_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._dirty:
+            await asyncio.sleep(settings.LIVE_PRESENCE_FLUSH_INTERVAL)
+            await self.flush()
+
+    async def flush(self, stream_ids=None):
+        """Escribe en la base de datos el conteo de los streams modificados"""
+        if stream_ids is None:
+            stream_ids, self._dirty = self._dirty, set()
+        else:
+            self._dirty.difference_update(stream_ids)
+
+        counts = {}
+        for stream_id in stream_ids:
+            counts[stream_id] = await self.viewers_count(stream_id)
+            if not counts[stream_id]:
+                self._watched.discard(stream_id)
+        if counts:
+            await consumer_db(save_viewer_counts)(counts)
+
+    async def _sweep_loop(self):
+        while self._watched:
+            await asyncio.sleep(max(settings.LIVE_PRESENCE_TTL, 1))
+            await self.sweep()
+
+    async def sweep(self):
+        """Vuelca y difunde el conteo de los streams vigilados que han perdido conexiones por TTL"""
+        changed = [stream_id for stream_id in list(self._watched) if await self.backend.prune(stream_id)]
+        if not changed:
+            return
+        await self.flush(changed)
+        channel_layer = get_channel_layer()
+        if channel_layer is not None:
+            for stream_id in changed:
+                await self.broadcast_viewers(stream_id, channel_layer)
+
+    async def broadcast_viewers(self, stream_id, channel_layer):
+        """Difunde conteo y lista de espectadores, como mucho una vez por intervalo"""
+        if stream_id in self._scheduled_broadcasts:
+            return
+
+        interval = settings.LIVE_VIEWERS_BROADCAST_INTERVAL
+        wait = self._last_broadcast.get(stream_id, 0) + interval - time.monotonic()
+        if wait <= 0:
+            await self._broadcast(stream_id, channel_layer)
+        else:
+            self._scheduled_broadcasts[stream_id] = asyncio.ensure_future(
+                self._delayed_broadcast(stream_id, channel_layer, wait)
+            )
+
+    async def _delayed_broadcast(self, stream_id, channel_layer, wait):
+        try:
+            await asyncio.sleep(wait)
+            await self._broadcast(stream_id, channel_layer)
+        finally:
+            self._scheduled_broadcasts.pop(stream_id, None)
+
+    async def _broadcast(self, stream_id, channel_layer):
+        self._last_broadcast[stream_id] = time.monotonic()
+        viewers = await self.viewers(stream_id)
+        group_name = f'live_stream_{stream_id}'
+        await channel_layer.group_send(group_name, {
+            'type': 'viewers_update',
+            'count': len(viewers),
+        })
+        await channel_layer.group_send(group_name, {
+            'type': 'viewers_list_update',
+            'viewers': viewers,
+        })
+        if not viewers:
+            self._last_broadcast.pop(stream_id, None)
+
+
+presence = PresenceService()
@@ -0,0 +1,111 @@
+"""
+Tabla de roles por stream (streamer, moderadores y VIPs).
+
+Se carga una vez por stream y proceso y la comparten todas las conexiones de
+ese stream, de modo que los comandos de chat y la serialización de comentarios
+no consultan la base de datos para comprobar roles. Al asignar un moderador o
+VIP el consumer difunde ``roles_changed`` al grupo del stream y cada proceso
+descarta su copia.
+"""
+import asyncio
+
+from config.db_executor import consumer_db
+
+from .models import LiveStream, StreamModerator, StreamVIP
+
+
+class StreamRoles:
+    """Instantánea inmutable de los roles de un stream"""
+
+    def __init__(self, streamer_id, streamer_username, moderators=None, vips=None):
+        self.streamer_id = streamer_id
+        self.streamer_username = streamer_username
+        # user_id -> username
+        self.moderators = moderators or {}
+        self.vips = vips or {}
+
+    def is_streamer(self, user_id):
+        return user_id == self.streamer_id
+
+    def is_moderator(self, user_id):
+        return user_id in self.moderators
+
+    def is_vip(self, user_id):
+        return user_id in self.vips
+
+    def is_username_streamer(self, username):
+        return username == self.streamer_username
+
+    def is_username_moderator(self, username):
+        return username in self.moderators.values()
+
+
+def load_stream_roles(stream_id):
+    """Carga los roles de un stream; devuelve None si el stream no existe"""
+    stream = LiveStream.objects.filter(id=stream_id).values(
+        'streamer_id', 'streamer__username'
+    ).first()
+    if stream is None:
+        return None
+
+    moderators = dict(
+        StreamModerator.objects.filter(live_stream_id=stream_id)
+        .values_list('user_id', 'user__username')
+    )
+    vips = dict(
+        StreamVIP.objects.filter(live_stream_id=stream_id)
+        .values_list('user_id', 'user__username')
+    )
+    return StreamRoles(stream['streamer_id'], stream['streamer__username'], moderators, vips)
+
+
+class StreamRoleCache:
+    """Caché en proceso de ``StreamRoles`` compartida por las conexiones de cada stream"""
+
+    def __init__(self):
+        self._roles = {}
+        self._loading = {}
+        self._connections = {}
+        self._generations = {}
+
+    async def get(self, stream_id):
+        roles = self._roles.get(stream_id)
+        if roles is not None:
+            return roles
+
+        # Una sola carga aunque varias conexiones pidan el mismo stream a la vez
+        loading = self._loading.get(stream_id)
+        if loading is None:
+            generation = self._generations.get(stream_id, 0)
+            loading = asyncio.ensure_future(consumer_db(load_stream_roles)(stream_id))
+            self._loading[stream_id] = loading
+            try:
+                roles = await loading
+            finally:
+                del self._loading[stream_id]
+            # No guardar una carga que empezó antes de una invalidación
+            stale = generation != self._generations.get(stream_id, 0)
+            if roles is not None and not stale and self._connections.get(stream_id):
+                self._roles[stream_id] = roles
+            return roles
+        return await asyncio.shield(loading)
+
+    def acquire(self, stream_id):
+        """Registra una conexión del stream para mantener sus roles en caché"""
+        self._connections[stream_id] = self._connections.get(stream_id, 0) + 1
+
+    def release(self, stream_id):
+        remaining = self._connections.get(stream_id, 0) - 1
+        if remaining > 0:
+            self._connections[stream_id] = remaining
+        else:
+            self._connections.pop(stream_id, None)
+            self._roles.pop(stream_id, None)
+            self._generations.pop(stream_id, None)
+
+    def invalidate(self, stream_id):
+        self._roles.pop(stream_id, None)
+        self._generations[stream_id] = self._generations.get(stream_id, 0) + 1
+
+
+role_cache = StreamRoleCache()
@@ -21,9 +21,16 @@ class LiveStreamCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'user', 'created_at', 'live_stream']
     
     def get_is_mod(self, obj):
+        # Con la tabla de roles del stream en el contexto no se consulta la base de datos
+        roles = self.context.get('roles')
+        if roles is not None:
+            return roles.is_moderator(obj.user_id)
         return StreamModerator.objects.filter(live_stream=obj.live_stream, user=obj.user).exists()
     
     def get_is_vip(self, obj):
+        roles = self.context.get('roles')
+        if roles is not None:
+            return roles.is_vip(obj.user_id)
         return StreamVIP.objects.filter(live_stream=obj.live_stream, user=obj.user).exists()
 
 
@@ -0,0 +1,12 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import LiveStream
+from .utils import invalidate_active_streams
+
+
+@receiver(post_save, sender=LiveStream)
+@receiver(post_delete, sender=LiveStream)
+def live_stream_changed(sender, instance, **kwargs):
+    """Inicio, fin o cambios de un stream: descartar la lista de directos en caché"""
+    transaction.on_commit(invalidate_active_streams)
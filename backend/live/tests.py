@@ -1,3 +1,282 @@
-from django.test import TestCase
+import asyncio
+from unittest.mock import AsyncMock, patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from apps.users.testing import create_user
+from .comments import StreamCommentBuffer
+from .consumers import LiveStreamConsumer
+from .models import LiveStream, LiveStreamComment, StreamModerator, StreamVIP
+from .presence import LocalPresenceBackend, PresenceService, save_viewer_counts
+from .roles import load_stream_roles
+from .serializers import LiveStreamCommentSerializer
+
+
+class PresenceServiceTests(TestCase):
+    """Tests del servicio de presencia de espectadores"""
+
+    def setUp(self):
+        self.presence = PresenceService(backend=LocalPresenceBackend())
+
+    def test_two_tabs_count_as_one_viewer(self):
+        """Dos conexiones del mismo usuario cuentan como un solo espectador"""
+        async def scenario():
+            await self.presence.join('1', 'chan-a', 7, 'ana')
+            await self.presence.join('1', 'chan-b', 7, 'ana')
+            self.assertEqual(await self.presence.viewers('1'), ['ana'])
+
+            # Cerrar una pestaña no saca al usuario de la lista
+            await self.presence.leave('1', 'chan-a')
+            self.assertEqual(await self.presence.viewers_count('1'), 1)
+
+            await self.presence.leave('1', 'chan-b')
+            self.assertEqual(await self.presence.viewers_count('1'), 0)
+
+        with patch.object(PresenceService, '_mark_dirty'):
+            asyncio.run(scenario())
+
+    @override_settings(LIVE_PRESENCE_TTL=0)
+    def test_connections_without_heartbeat_expire(self):
+        """Las conexiones sin heartbeat caducan al cumplirse el TTL"""
+        async def scenario():
+            await self.presence.join('1', 'chan-a', 7, 'ana')
+            self.assertEqual(await self.presence.viewers_count('1'), 0)
+
+        with patch.object(PresenceService, '_mark_dirty'):
+            asyncio.run(scenario())
+
+
+class SaveViewerCountsTests(TestCase):
+    """Tests del volcado atómico de contadores"""
+
+    def setUp(self):
+        self.stream = LiveStream.objects.create(
+            streamer=create_user('streamer'), status='live', peak_viewers=5
+        )
+
+    def test_peak_viewers_never_decreases(self):
+        """peak_viewers solo aumenta y viewers_count refleja el valor actual"""
+        save_viewer_counts({self.stream.id: 3})
+        self.stream.refresh_from_db()
+        self.assertEqual(self.stream.viewers_count, 3)
+        self.assertEqual(self.stream.peak_viewers, 5)
+
+        save_viewer_counts({self.stream.id: 8})
+        self.stream.refresh_from_db()
+        self.assertEqual(self.stream.peak_viewers, 8)
+
+
+class PresenceSweepTests(TransactionTestCase):
+    """Tests de la caducidad de conexiones de procesos caídos"""
+
+    def test_expired_connections_update_count(self):
+        """Sin join/leave, las conexiones caducadas bajan el conteo guardado y difundido"""
+        stream = LiveStream.objects.create(streamer=create_user('streamer'), status='live')
+        stream_id = str(stream.id)
+        backend = LocalPresenceBackend()
+        service = PresenceService(backend=backend)
+        channel_layer = AsyncMock()
+
+        async def scenario():
+            await service.join(stream_id, 'chan-a', 7, 'ana')
+            await service.join(stream_id, 'chan-b', 8, 'luis')
+            await service.flush()
+            self.assertEqual(await LiveStream.objects.values_list('viewers_count', flat=True).aget(), 2)
+
+            # El proceso de chan-b muere: su conexión deja de renovarse y caduca
+            backend._streams[stream_id]['chan-b'] = (8, 'luis', 0)
+            with patch('live.presence.get_channel_layer', return_value=channel_layer):
+                await service.sweep()
+
+        with patch.object(PresenceService, '_flush_loop'), patch.object(PresenceService, '_sweep_loop'):
+            async_to_sync(scenario)()
+        stream.refresh_from_db()
+        self.assertEqual(stream.viewers_count, 1)
+        self.assertEqual(stream.peak_viewers, 2)
+        channel_layer.group_send.assert_any_await(
+            f'live_stream_{stream_id}', {'type': 'viewers_update', 'count': 1}
+        )
+
+
+class StreamRolesTests(TestCase):
+    """Tests de la tabla de roles por stream"""
+
+    def setUp(self):
+        self.streamer = create_user('streamer')
+        self.mod = create_user('mod')
+        self.vip = create_user('vip')
+        self.stream = LiveStream.objects.create(streamer=self.streamer, status='live')
+        StreamModerator.objects.create(live_stream=self.stream, user=self.mod)
+        StreamVIP.objects.create(live_stream=self.stream, user=self.vip)
+
+    def test_load_stream_roles(self):
+        """La tabla refleja streamer, moderadores y VIPs"""
+        roles = load_stream_roles(self.stream.id)
+        self.assertTrue(roles.is_streamer(self.streamer.id))
+        self.assertTrue(roles.is_moderator(self.mod.id))
+        self.assertTrue(roles.is_vip(self.vip.id))
+        self.assertTrue(roles.is_username_moderator('mod'))
+        self.assertFalse(roles.is_username_streamer('mod'))
+
+    def test_missing_stream_has_no_roles(self):
+        self.assertIsNone(load_stream_roles(self.stream.id + 1))
+
+    def test_comment_serialization_uses_roles_without_queries(self):
+        """Con la tabla de roles en el contexto no hay consultas de is_mod/is_vip"""
+        comment = LiveStreamComment.objects.select_related('user').get(
+            pk=LiveStreamComment.objects.create(
+                live_stream=self.stream, user=self.mod, content='hola'
+            ).pk
+        )
+        roles = load_stream_roles(self.stream.id)
+        with self.assertNumQueries(0):
+            data = LiveStreamCommentSerializer(comment, context={'roles': roles}).data
+        self.assertTrue(data['is_mod'])
+        self.assertFalse(data['is_vip'])
+
+
+class StreamCommentBufferTests(TransactionTestCase):
+    """Tests del buffer de comentarios en vivo"""
+
+    def setUp(self):
+        self.streamer = create_user('streamer')
+        self.stream = LiveStream.objects.create(streamer=self.streamer, status='live')
+        self.stream_id = str(self.stream.id)
+        self.roles = load_stream_roles(self.stream.id)
+
+    def test_comments_are_written_in_batches(self):
+        """Los comentarios se guardan al volcar el buffer, no uno a uno"""
+        buffer = StreamCommentBuffer()
+
+        async def scenario():
+            with patch.object(StreamCommentBuffer, '_schedule_flush'):
+                first = buffer.add(self.stream_id, self.streamer, 'uno', self.roles)
+                buffer.add(self.stream_id, self.streamer, 'dos', self.roles)
+            self.assertEqual(first['content'], 'uno')
+            self.assertEqual(await LiveStreamComment.objects.acount(), 0)
+            await buffer.flush()
+
+        async_to_sync(scenario)()
+        self.assertEqual(
+            list(LiveStreamComment.objects.order_by('id').values_list('content', flat=True)),
+            ['uno', 'dos']
+        )
+
+    @override_settings(LIVE_COMMENT_REPLAY_SIZE=2)
+    def test_replay_keeps_last_comments_once(self):
+        """El replay guarda los últimos N comentarios sin duplicados"""
+        buffer = StreamCommentBuffer()
+        LiveStreamComment.objects.create(live_stream=self.stream, user=self.streamer, content='guardado')
+
+        async def scenario():
+            buffer.acquire(self.stream_id)
+            recent = await buffer.recent(self.stream_id)
+            self.assertEqual([c['content'] for c in recent], ['guardado'])
+
+            with patch.object(StreamCommentBuffer, '_schedule_flush'):
+                comment = buffer.add(self.stream_id, self.streamer, 'nuevo', self.roles)
+            # El mismo evento llega a cada conexión local del proceso
+            buffer.remember(self.stream_id, comment)
+            buffer.remember(self.stream_id, comment)
+
+            recent = await buffer.recent(self.stream_id)
+            self.assertEqual([c['content'] for c in recent], ['guardado', 'nuevo'])
+
+        async_to_sync(scenario)()
+
+
+class LiveStreamCommentsHistoryTests(TestCase):
+    """Tests del historial REST de comentarios"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.streamer = create_user('streamer')
+        self.client.force_authenticate(user=self.streamer)
+        self.stream = LiveStream.objects.create(streamer=self.streamer, status='live')
+        LiveStreamComment.objects.bulk_create([
+            LiveStreamComment(live_stream=self.stream, user=self.streamer, content=f'c{i}')
+            for i in range(5)
+        ])
+
+    def test_history_is_cursor_paginated(self):
+        """El historial se pagina por cursor, del más reciente al más antiguo"""
+        url = f'/api/live/streams/{self.stream.id}/comments/?page_size=3'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['content'] for c in response.data['results']], ['c4', 'c3', 'c2'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([c['content'] for c in response.data['results']], ['c1', 'c0'])
+        self.assertIsNone(response.data['next'])
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    LIVE_VIEWERS_BROADCAST_INTERVAL=0,
+)
+class LiveStreamConsumerPresenceTests(TransactionTestCase):
+    """Tests de presencia a través del consumer"""
+
+    def setUp(self):
+        self.streamer = create_user('streamer')
+        self.viewer = create_user('viewer')
+        self.stream = LiveStream.objects.create(streamer=self.streamer, status='live')
+
+    def connect(self, user):
+        communicator = WebsocketCommunicator(
+            LiveStreamConsumer.as_asgi(), f'/ws/live/{self.stream.id}/'
+        )
+        communicator.scope['user'] = user
+        communicator.scope['url_route'] = {'kwargs': {'stream_id': str(self.stream.id)}}
+        return communicator
+
+    async def receive_until(self, communicator, message_type):
+        while True:
+            message = await communicator.receive_json_from(timeout=2)
+            if message['type'] == message_type:
+                return message
+
+    def test_viewer_with_two_tabs_is_listed_once(self):
+        """Un usuario con dos pestañas aparece una sola vez en la lista"""
+        async def scenario():
+            tab_a = self.connect(self.viewer)
+            await tab_a.connect()
+            await self.receive_until(tab_a, 'connection_established')
+
+            tab_b = self.connect(self.viewer)
+            await tab_b.connect()
+            viewers = await self.receive_until(tab_b, 'viewers_list')
+            self.assertEqual(viewers['viewers'], ['viewer'])
+
+            await tab_a.disconnect()
+            await tab_b.disconnect()
+
+        service = PresenceService(LocalPresenceBackend())
+        with patch('live.consumers.presence', service), \
+                patch.object(PresenceService, '_mark_dirty'):
+            async_to_sync(scenario)()
+
+    def test_mod_command_assigns_role(self):
+        """/mod asigna el rol y avisa al resto de conexiones del stream"""
+        create_user('newmod')
+
+        async def scenario():
+            streamer = self.connect(self.streamer)
+            await streamer.connect()
+            await self.receive_until(streamer, 'recent_comments')
+            await streamer.send_json_to({'type': 'comment', 'content': '/mod @newmod'})
+            message = await self.receive_until(streamer, 'system_message')
+            self.assertIn('newmod', message['message'])
+            await streamer.disconnect()
+
+        service = PresenceService(LocalPresenceBackend())
+        with patch('live.consumers.presence', service), \
+                patch.object(PresenceService, '_mark_dirty'):
+            async_to_sync(scenario)()
+        self.assertTrue(
+            StreamModerator.objects.filter(live_stream=self.stream, user__username='newmod').exists()
+        )
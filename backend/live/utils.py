@@ -1,50 +1,30 @@
-from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
-from notifications.models import Notification
-from notifications.serializers import NotificationSerializer
+from django.conf import settings
+from config.tiered_cache import cached, invalidate_tags
+from notifications.fanout import enqueue_fanout
+from notifications.outbox import publish
+
+ACTIVE_STREAMS_TAG = 'live:active'
 
 
 def notify_followers_live_stream(live_stream):
     """
-    Notificar a los seguidores cuando un usuario inicia un directo
+    Notificar a los seguidores cuando un usuario inicia un directo.
+    El envío se hace en segundo plano por lotes (ver notifications.fanout).
     """
-    from apps.users.models import Follow
-    
-    # Obtener todos los seguidores del streamer
-    followers = Follow.objects.filter(
-        following=live_stream.streamer
-    ).select_related('follower')
-    
-    channel_layer = get_channel_layer()
-    
-    for follow in followers:
-        # Crear notificación en la base de datos
-        notification = Notification.objects.create(
-            recipient=follow.follower,
-            sender=live_stream.streamer,
-            notification_type='live_stream',
-            title='¡Nuevo directo!',
-            message=f'{live_stream.streamer.first_name} ha iniciado una transmisión en vivo',
-            related_live_stream_id=live_stream.id
-        )
-        
-        # Enviar notificación en tiempo real vía WebSocket
-        serializer = NotificationSerializer(notification)
-        async_to_sync(channel_layer.group_send)(
-            f'notifications_{follow.follower.id}',
-            {
-                'type': 'new_notification',
-                'notification': serializer.data
-            }
-        )
+    return enqueue_fanout(
+        live_stream.streamer,
+        'followers',
+        notification_type='live_stream',
+        title='¡Nuevo directo!',
+        message=f'{live_stream.streamer.first_name} ha iniciado una transmisión en vivo',
+        related_live_stream_id=live_stream.id,
+    )
 
 
 def broadcast_stream_update(stream_id, update_type, data=None):
     """
     Transmitir actualizaciones del stream a todos los conectados
     """
-    channel_layer = get_channel_layer()
-    
     message = {
         'type': update_type,
     }
@@ -52,7 +32,23 @@ def broadcast_stream_update(stream_id, update_type, data=None):
     if data:
         message.update(data)
     
-    async_to_sync(channel_layer.group_send)(
-        f'live_stream_{stream_id}',
-        message
-    )
+    publish(f'live_stream_{stream_id}', message)
+
+
+@cached('live:active', ttl=lambda: settings.ACTIVE_STREAMS_CACHE_TTL, tags=(ACTIVE_STREAMS_TAG,))
+def active_streams_data():
+    """
+    Transmisiones en vivo serializadas. Se invalida al guardar cualquier
+    stream; ``viewers_count`` se vuelca con UPDATE y se refresca con el TTL.
+    """
+    from .models import LiveStream
+    from .serializers import LiveStreamListSerializer
+
+    active_streams = LiveStream.objects.filter(
+        status='live'
+    ).select_related('streamer').order_by('-started_at')
+    return list(LiveStreamListSerializer(active_streams, many=True).data)
+
+
+def invalidate_active_streams():
+    invalidate_tags(ACTIVE_STREAMS_TAG)
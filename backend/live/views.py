@@ -1,17 +1,28 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import serializers
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from notifications.outbox import publish
 from .models import LiveStream, LiveStreamComment
 from .serializers import (
     LiveStreamSerializer, 
     LiveStreamListSerializer,
     LiveStreamCommentSerializer
 )
-from .utils import notify_followers_live_stream
+from .comments import serialize_comment
+from .roles import load_stream_roles
+from .utils import active_streams_data, notify_followers_live_stream
+
+
+class LiveStreamCommentPagination(CursorPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = '-id'
 
 
 class LiveStreamViewSet(viewsets.ModelViewSet):
@@ -66,15 +77,15 @@ class LiveStreamViewSet(viewsets.ModelViewSet):
         
         live_stream.start_stream()
         
-        # Notificar a los seguidores
-        notify_followers_live_stream(live_stream)
+        # Notificar a los seguidores (en segundo plano)
+        notification_job = notify_followers_live_stream(live_stream)
         
         # Notificar a los espectadores conectados
         from .utils import broadcast_stream_update
         broadcast_stream_update(live_stream.id, 'stream_started')
         
         serializer = self.get_serializer(live_stream)
-        return Response(serializer.data)
+        return Response({**serializer.data, 'notification_job': notification_job.id})
     
     @action(detail=True, methods=['post'])
     def end(self, request, pk=None):
@@ -101,20 +112,18 @@ class LiveStreamViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def active(self, request):
         """Obtener todas las transmisiones activas"""
-        active_streams = LiveStream.objects.filter(
-            status='live'
-        ).select_related('streamer').order_by('-started_at')
-        
-        serializer = LiveStreamListSerializer(active_streams, many=True)
-        return Response(serializer.data)
+        return Response(active_streams_data())
     
     @action(detail=True, methods=['get'])
     def comments(self, request, pk=None):
-        """Obtener comentarios de una transmisión"""
+        """Historial de comentarios de una transmisión (paginado por cursor, más recientes primero)"""
         live_stream = self.get_object()
         comments = live_stream.comments.select_related('user').all()
-        serializer = LiveStreamCommentSerializer(comments, many=True)
-        return Response(serializer.data)
+        paginator = LiveStreamCommentPagination()
+        page = paginator.paginate_queryset(comments, request, view=self)
+        roles = load_stream_roles(live_stream.id)
+        serializer = LiveStreamCommentSerializer(page, many=True, context={'roles': roles})
+        return paginator.get_paginated_response(serializer.data)
     
     @action(detail=True, methods=['post'])
     def comment(self, request, pk=None):
@@ -133,21 +142,16 @@ class LiveStreamViewSet(viewsets.ModelViewSet):
                 user=request.user,
                 live_stream=live_stream
             )
+            comment_data = serialize_comment(comment, load_stream_roles(live_stream.id))
             
             # Broadcast del comentario vía WebSocket
-            from channels.layers import get_channel_layer
-            from asgiref.sync import async_to_sync
-            
-            channel_layer = get_channel_layer()
-            room_group_name = f'live_stream_{live_stream.id}'
-            
-            async_to_sync(channel_layer.group_send)(
-                room_group_name,
+            publish(
+                f'live_stream_{live_stream.id}',
                 {
                     'type': 'new_comment',
-                    'comment': serializer.data
+                    'comment': comment_data
                 }
             )
             
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+            return Response(comment_data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
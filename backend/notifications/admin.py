@@ -1,3 +1,17 @@
 from django.contrib import admin
+from .models import FanoutJob, NotificationArchive
 
-# Register your models here.
+
+@admin.register(FanoutJob)
+class FanoutJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'sender', 'audience', 'status', 'processed', 'total', 'created_at', 'finished_at']
+    list_filter = ['status', 'audience', 'created_at']
+    search_fields = ['sender__username']
+    readonly_fields = ['cursor', 'processed', 'total', 'error', 'created_at', 'updated_at', 'finished_at']
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ['id', 'recipient', 'notification_type', 'created_at', 'archived_at']
+    list_filter = ['notification_type', 'created_at']
+    search_fields = ['recipient__username', 'message']
@@ -0,0 +1,120 @@
+"""
+Agregación de notificaciones.
+
+Los eventos del mismo tipo sobre el mismo objeto (likes de una publicación,
+comentarios, compartidos, nuevos seguidores...) que llegan dentro de
+``NOTIFICATION_AGGREGATION_WINDOW`` segundos se agrupan en una sola
+notificación no leída ("ana y 312 personas más..."), que se actualiza en el
+sitio en lugar de crear una fila nueva por evento.
+
+``actor_count`` cuenta usuarios distintos: quitar y volver a dar like o
+comentar varias veces no suma. La ventana se cuenta desde el primer evento
+(``group_started_at``), aunque la notificación suba arriba con cada uno.
+
+Los envíos por WebSocket se limitan por destinatario: el primero sale al
+momento y las notificaciones nuevas o actualizadas durante los siguientes
+``NOTIFICATION_PUSH_INTERVAL`` segundos salen juntas en un solo
+``notifications_batch`` (``created`` y ``updated``, cada notificación una vez
+y con su último estado). Con ``NOTIFICATION_AGGREGATION_ENABLED = False`` se
+mantiene una fila por evento.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Notification
+from .outbox import publish_throttled
+from .serializers import NotificationSerializer
+
+# Usuarios recientes que se guardan por notificación para no contarlos dos veces
+MAX_TRACKED_ACTORS = 500
+
+
+def merge_batches(pending, new):
+    """Une dos ``notifications_batch``; una notificación creada y luego actualizada sigue en ``created``"""
+    created = {data['id']: data for data in pending['created']}
+    updated = {data['id']: data for data in pending['updated']}
+    for data in new['created']:
+        created[data['id']] = data
+    for data in new['updated']:
+        if data['id'] in created:
+            created[data['id']] = data
+        else:
+            updated[data['id']] = data
+    return {**pending, 'created': list(created.values()), 'updated': list(updated.values())}
+
+
+def push_notification(notification, created=True):
+    """Enviar una notificación nueva o actualizada por WebSocket tras el commit"""
+    data = NotificationSerializer(notification).data
+    publish_throttled(
+        f'notifications:push:{notification.recipient_id}',
+        f'notifications_{notification.recipient_id}',
+        {
+            'type': 'notifications_batch',
+            'created': [data] if created else [],
+            'updated': [] if created else [data],
+        },
+        settings.NOTIFICATION_PUSH_INTERVAL,
+        merge_batches,
+    )
+
+
+def notify(recipient, sender, notification_type, title, message,
+           group='', aggregate_message='', **related):
+    """
+    Crea una notificación o la agrupa con una reciente del mismo ``group``.
+
+    ``aggregate_message`` es la plantilla del texto agrupado, con los campos
+    ``{actor}`` (último usuario) y ``{others}`` (resto de usuarios).
+    """
+    if settings.NOTIFICATION_AGGREGATION_ENABLED and group and aggregate_message:
+        notification = _collapse(recipient, sender, group, aggregate_message)
+        if notification is not None:
+            push_notification(notification, created=False)
+            return notification
+
+    notification = Notification.objects.create(
+        recipient=recipient,
+        sender=sender,
+        notification_type=notification_type,
+        title=title,
+        message=message,
+        group_key=group,
+        actor_ids=[sender.id] if sender else [],
+        group_started_at=timezone.now() if group else None,
+        **related
+    )
+    push_notification(notification)
+    return notification
+
+
+def _collapse(recipient, sender, group, aggregate_message):
+    now = timezone.now()
+    window_start = now - timedelta(seconds=settings.NOTIFICATION_AGGREGATION_WINDOW)
+    with transaction.atomic():
+        notification = Notification.objects.select_for_update().filter(
+            recipient=recipient,
+            group_key=group,
+            is_read=False,
+            group_started_at__gte=window_start,
+        ).order_by('-created_at').first()
+        if notification is None:
+            return None
+
+        actor_ids = [user_id for user_id in notification.actor_ids if user_id != sender.id]
+        if len(actor_ids) == len(notification.actor_ids):
+            notification.actor_count += 1
+        notification.actor_ids = (actor_ids + [sender.id])[-MAX_TRACKED_ACTORS:]
+        notification.sender = sender
+        notification.message = aggregate_message.format(
+            actor=sender.username, others=notification.actor_count - 1
+        )
+        # La notificación agrupada sube a la primera posición de la lista
+        notification.created_at = now
+        notification.save(update_fields=[
+            'actor_count', 'actor_ids', 'sender', 'message', 'created_at', 'updated_at'
+        ])
+    return notification
@@ -1,14 +1,17 @@
+import asyncio
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from channels.db import database_sync_to_async
+from config.db_executor import consumer_db
+from config.metrics import InstrumentedConsumerMixin
 from django.contrib.auth import get_user_model
+from notifications.counters import get_unread_count, set_read
 from notifications.models import Notification
 from notifications.serializers import NotificationSerializer
 
 User = get_user_model()
 
 
-class NotificationConsumer(AsyncWebsocketConsumer):
+class NotificationConsumer(InstrumentedConsumerMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer para notificaciones en tiempo real.
     Cada usuario tiene su propio grupo de notificaciones.
@@ -24,10 +27,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         # Grupo único para cada usuario
         self.notification_group_name = f'notifications_{self.user.id}'
         
-        # Unirse al grupo de notificaciones
-        await self.channel_layer.group_add(
-            self.notification_group_name,
-            self.channel_name
+        # Unirse al grupo de notificaciones mientras se lee el contador de no leídas
+        _, unread_count = await asyncio.gather(
+            self.channel_layer.group_add(self.notification_group_name, self.channel_name),
+            self.get_unread_count(),
         )
         
         await self.accept()
@@ -40,7 +43,6 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         }))
         
         # Enviar notificaciones no leídas al conectarse
-        unread_count = await self.get_unread_count()
         await self.send(text_data=json.dumps({
             'type': 'unread_count',
             'count': unread_count
@@ -97,35 +99,37 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'notification': event['notification']
         }))
     
-    @database_sync_to_async
+    async def unread_count_changed(self, event):
+        """Enviar el cambio del contador de no leídas"""
+        await self.send(text_data=json.dumps({
+            'type': 'unread_count_changed',
+            'delta': event['delta'],
+            'count': event['count']
+        }))
+    
+    async def notifications_batch(self, event):
+        """Enviar las notificaciones nuevas y actualizadas de una ventana de envío"""
+        await self.send(text_data=json.dumps({
+            'type': 'notifications_batch',
+            'created': event['created'],
+            'updated': event['updated']
+        }))
+    
+    @consumer_db
     def get_unread_count(self):
-        return Notification.objects.filter(
-            recipient=self.user,
-            is_read=False
-        ).count()
+        return get_unread_count(self.user.id)
     
-    @database_sync_to_async
+    @consumer_db
     def mark_notification_read(self, notification_id):
-        try:
-            notification = Notification.objects.get(
-                id=notification_id,
-                recipient=self.user
-            )
-            notification.is_read = True
-            notification.save()
-            return True
-        except Notification.DoesNotExist:
-            return False
+        notifications = Notification.objects.filter(id=notification_id, recipient=self.user)
+        # Solo hace falta comprobar que existe si ya estaba leída
+        return bool(set_read(self.user.id, notifications, True)) or notifications.exists()
     
-    @database_sync_to_async
+    @consumer_db
     def mark_all_notifications_read(self):
-        count = Notification.objects.filter(
-            recipient=self.user,
-            is_read=False
-        ).update(is_read=True)
-        return count
+        return set_read(self.user.id, Notification.objects.all(), True)
     
-    @database_sync_to_async
+    @consumer_db
     def get_recent_notifications(self):
         notifications = Notification.objects.filter(
             recipient=self.user
@@ -0,0 +1,125 @@
+"""
+Contador de notificaciones no leídas por usuario.
+
+El contador vive en la caché (``notifications:unread:<user_id>``) y se calcula
+con un ``COUNT`` solo cuando no está. Las rutas que crean, leen o borran
+notificaciones lo ajustan con ``cache.incr``/``decr`` tras el commit, sin
+volver a contar filas, y envían el cambio al usuario por WebSocket como
+``unread_count_changed`` (``delta`` y, si se conoce, ``count``). Las
+notificaciones nuevas no generan ese evento: ``new_notification`` y cada
+elemento de ``created`` en ``notifications_batch`` ya equivalen a un +1 en el
+cliente.
+
+Si el contador se desvía (transacciones revertidas, escrituras fuera de estas
+rutas) ``python manage.py reconcile_unread_counts`` lo corrige; además caduca
+a los ``NOTIFICATION_UNREAD_COUNT_TTL`` segundos.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Notification
+from .outbox import publish
+
+
+def unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def get_unread_count(user_id):
+    """Número de notificaciones no leídas, desde la caché si está disponible"""
+    key = unread_key(user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(recipient_id=user_id, is_read=False).count()
+        cache.add(key, count, settings.NOTIFICATION_UNREAD_COUNT_TTL)
+    return count
+
+
+def adjust_unread_count(user_id, delta):
+    """Suma ``delta`` al contador; devuelve el nuevo valor o None si no estaba en caché"""
+    key = unread_key(user_id)
+    if not delta:
+        return cache.get(key)
+    try:
+        count = cache.incr(key, delta)
+    except ValueError:
+        # Sin contador en caché: se calculará en la próxima lectura
+        return None
+    if count < 0:
+        cache.delete(key)
+        return None
+    return count
+
+
+def push_unread_delta(user_id, delta, count=None):
+    publish(
+        f'notifications_{user_id}',
+        {
+            'type': 'unread_count_changed',
+            'delta': delta,
+            'count': count,
+        }
+    )
+
+
+def unread_count_changed(user_id, delta):
+    """Ajusta el contador y envía el cambio al usuario"""
+    count = adjust_unread_count(user_id, delta)
+    push_unread_delta(user_id, delta, count)
+    return count
+
+
+def set_read(user_id, queryset, is_read=True):
+    """Marca como leídas (o no leídas) las notificaciones del usuario en ``queryset``"""
+    changed = queryset.filter(recipient_id=user_id, is_read=not is_read).update(
+        is_read=is_read, updated_at=timezone.now()
+    )
+    if changed:
+        delta = -changed if is_read else changed
+        transaction.on_commit(lambda: unread_count_changed(user_id, delta))
+    return changed
+
+
+def delete_notifications(user_id, queryset):
+    """Borra las notificaciones del usuario en ``queryset`` descontando las no leídas"""
+    queryset = queryset.filter(recipient_id=user_id)
+    unread, _ = queryset.filter(is_read=False).delete()
+    deleted, _ = queryset.delete()
+    if unread:
+        transaction.on_commit(lambda: unread_count_changed(user_id, -unread))
+    return unread + deleted
+
+
+def reconcile_unread_counts(user_ids):
+    """
+    Compara los contadores en caché de ``user_ids`` con la base de datos y
+    corrige los que se hayan desviado. Devuelve ``{user_id: valor_corregido}``.
+    """
+    keys = {unread_key(user_id): user_id for user_id in user_ids}
+    cached = cache.get_many(keys)
+    if not cached:
+        return {}
+
+    cached_ids = [keys[key] for key in cached]
+    actual = dict(
+        Notification.objects.filter(recipient_id__in=cached_ids, is_read=False)
+        .order_by().values('recipient_id').annotate(count=Count('id'))
+        .values_list('recipient_id', 'count')
+    )
+
+    fixed = {}
+    for key, count in cached.items():
+        user_id = keys[key]
+        if count != actual.get(user_id, 0):
+            fixed[user_id] = actual.get(user_id, 0)
+    if fixed:
+        cache.set_many(
+            {unread_key(user_id): count for user_id, count in fixed.items()},
+            settings.NOTIFICATION_UNREAD_COUNT_TTL
+        )
+        for user_id, count in fixed.items():
+            push_unread_delta(user_id, count - cached[unread_key(user_id)], count)
+    return fixed
@@ -0,0 +1,145 @@
+"""
+Fan-out de notificaciones uno-a-muchos en segundo plano.
+
+``enqueue_fanout`` registra un ``FanoutJob`` y, tras el commit de la
+transacción actual, lo procesa en un hilo aparte: recorre la audiencia por
+lotes de ``NOTIFICATION_FANOUT_CHUNK_SIZE``, crea las notificaciones con
+``bulk_create`` y las envía con un solo ``publish_many`` del outbox por lote.
+Cada lote avanza ``cursor`` en la misma transacción
+que sus inserts, así que un trabajo interrumpido se reanuda sin duplicados con
+``python manage.py run_fanout_jobs``.
+
+Las audiencias se registran en ``AUDIENCES``: funciones que reciben el trabajo
+y devuelven un queryset de tuplas ``(id_cursor, recipient_id)``.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.users.models import Follow
+from .counters import adjust_unread_count
+from .models import FanoutJob, Notification
+from .outbox import publish_many
+from .serializers import NotificationSerializer
+
+logger = logging.getLogger(__name__)
+
+
+def followers_audience(job):
+    return Follow.objects.filter(following_id=job.sender_id).order_by('id').values_list(
+        'id', 'follower_id'
+    )
+
+
+AUDIENCES = {
+    'followers': followers_audience,
+}
+
+
+def enqueue_fanout(sender, audience, **notification_fields):
+    """Crea un trabajo de fan-out y lo lanza en segundo plano tras el commit"""
+    if audience not in AUDIENCES:
+        raise ValueError(f'Audiencia de fan-out desconocida: {audience}')
+
+    job = FanoutJob.objects.create(sender=sender, audience=audience, payload=notification_fields)
+    transaction.on_commit(lambda: start_fanout(job.id))
+    return job
+
+
+def start_fanout(job_id):
+    thread = threading.Thread(target=_run_in_thread, args=(job_id,), daemon=True)
+    thread.start()
+    return thread
+
+
+def _run_in_thread(job_id):
+    try:
+        run_fanout_job(job_id)
+    finally:
+        connection.close()
+
+
+def claim_job(job_id):
+    """Marca el trabajo como en curso si está pendiente o abandonado"""
+    stale_before = timezone.now() - timedelta(seconds=settings.NOTIFICATION_FANOUT_STALE_SECONDS)
+    return FanoutJob.objects.filter(pk=job_id).filter(
+        Q(status='pending') | Q(status='running', updated_at__lt=stale_before)
+    ).update(status='running', updated_at=timezone.now()) == 1
+
+
+def run_fanout_job(job_id):
+    """Procesa un trabajo de fan-out desde su cursor hasta el final"""
+    close_old_connections()
+    if not claim_job(job_id):
+        return None
+
+    job = FanoutJob.objects.select_related('sender').get(pk=job_id)
+    audience = AUDIENCES[job.audience](job)
+    if not job.total:
+        job.total = audience.count()
+        FanoutJob.objects.filter(pk=job.pk).update(total=job.total)
+
+    chunk_size = settings.NOTIFICATION_FANOUT_CHUNK_SIZE
+    try:
+        while True:
+            chunk = list(audience.filter(id__gt=job.cursor)[:chunk_size])
+            if not chunk:
+                break
+            notifications = _create_chunk(job, chunk)
+            send_notifications(notifications)
+    except Exception as exc:
+        logger.exception('Fan-out %s interrumpido', job.pk)
+        FanoutJob.objects.filter(pk=job.pk).update(
+            status='failed', error=str(exc), updated_at=timezone.now()
+        )
+        return job
+
+    FanoutJob.objects.filter(pk=job.pk).update(
+        status='done', finished_at=timezone.now(), updated_at=timezone.now()
+    )
+    job.status = 'done'
+    return job
+
+
+def _create_chunk(job, chunk):
+    notifications = [
+        Notification(recipient_id=recipient_id, sender=job.sender, **job.payload)
+        for _, recipient_id in chunk
+    ]
+    with transaction.atomic():
+        Notification.objects.bulk_create(notifications)
+        job.cursor = chunk[-1][0]
+        job.processed += len(chunk)
+        FanoutJob.objects.filter(pk=job.pk).update(
+            cursor=job.cursor, processed=job.processed, updated_at=timezone.now()
+        )
+    # bulk_create no dispara post_save: ajustar aquí los contadores de no leídas
+    for notification in notifications:
+        adjust_unread_count(notification.recipient_id, 1)
+    return notifications
+
+
+def send_notifications(notifications):
+    """Envía un lote de notificaciones por WebSocket en un solo envío del outbox"""
+    publish_many(
+        (
+            f'notifications_{notification.recipient_id}',
+            {'type': 'new_notification', 'notification': data},
+        )
+        for notification, data in zip(
+            notifications, NotificationSerializer(notifications, many=True).data
+        )
+    )
+
+
+def resumable_jobs():
+    """Trabajos pendientes o abandonados (en curso sin progreso reciente)"""
+    stale_before = timezone.now() - timedelta(seconds=settings.NOTIFICATION_FANOUT_STALE_SECONDS)
+    return FanoutJob.objects.filter(
+        Q(status='pending') | Q(status='running', updated_at__lt=stale_before)
+    ).order_by('created_at')
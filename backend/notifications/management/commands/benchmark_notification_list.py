@@ -0,0 +1,119 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from apps.administration.synthetic import explicit_created_at
+from notifications.models import Notification
+from notifications.retention import archive_old, purge_expired
+from notifications.views import NotificationListView
+
+User = get_user_model()
+
+BENCH_PREFIX = 'bench_notifications_'
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide la latencia de NotificationListView antes y después de la purga/archivo '
+        'sobre una tabla de notificaciones sintética. Escribe en la base de datos '
+        'configurada: usar solo en entornos desechables.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10_000_000)
+        parser.add_argument('--recipients', type=int, default=1000)
+        parser.add_argument('--days', type=int, default=365, help='Antigüedad máxima de las filas')
+        parser.add_argument('--requests', type=int, default=200, help='Peticiones por medición')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--keep', action='store_true', help='No borrar los datos al terminar')
+
+    def handle(self, *args, **options):
+        recipients = self.create_recipients(options['recipients'])
+        try:
+            self.seed(recipients, options['rows'], options['days'], options['batch_size'])
+            before = self.measure(recipients, options['requests'])
+
+            started = time.perf_counter()
+            purged = purge_expired()
+            archived = archive_old()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Purga: {purged} borradas, {archived} archivadas en {elapsed:.1f}s'
+            )
+
+            after = self.measure(recipients, options['requests'])
+            self.report('antes', *before)
+            self.report('después', *after)
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=BENCH_PREFIX).delete()
+
+    def create_recipients(self, count):
+        User.objects.bulk_create(
+            [
+                User(
+                    username=f'{BENCH_PREFIX}{i}', email=f'{BENCH_PREFIX}{i}@example.com',
+                    email_domain='example.com',
+                )
+                for i in range(count)
+            ],
+            ignore_conflicts=True,
+        )
+        return list(
+            User.objects.filter(username__startswith=BENCH_PREFIX).values_list('id', flat=True)
+        )
+
+    def seed(self, recipients, rows, days, batch_size):
+        now = timezone.now()
+        types = [notification_type for notification_type, _ in Notification.NOTIFICATION_TYPES]
+        created = 0
+        started = time.perf_counter()
+        with explicit_created_at(Notification):
+            while created < rows:
+                size = min(batch_size, rows - created)
+                Notification.objects.bulk_create([
+                    Notification(
+                        recipient_id=random.choice(recipients),
+                        notification_type=random.choice(types),
+                        title='Benchmark',
+                        message='Notificación sintética',
+                        is_read=random.random() < 0.8,
+                        created_at=now - timedelta(seconds=random.randint(0, days * 86400)),
+                    )
+                    for _ in range(size)
+                ])
+                created += size
+                self.stdout.write(f'\r{created}/{rows} filas', ending='')
+        self.stdout.write(f'\nDatos generados en {time.perf_counter() - started:.1f}s')
+
+    def measure(self, recipients, requests):
+        # Host incluido en ALLOWED_HOSTS (la paginación construye URLs absolutas)
+        factory = APIRequestFactory(SERVER_NAME='localhost')
+        view = NotificationListView.as_view()
+        users = {user.id: user for user in User.objects.filter(id__in=recipients)}
+        timings = []
+        for i in range(requests):
+            user = users[random.choice(recipients)]
+            query = {'filter': 'unread'} if i % 2 else {}
+            request = factory.get('/api/notifications/', query)
+            force_authenticate(request, user=user)
+            started = time.perf_counter()
+            response = view(request)
+            response.render()
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings, Notification.objects.count()
+
+    def report(self, label, timings, rows):
+        timings = sorted(timings)
+        p95 = timings[int(len(timings) * 0.95) - 1]
+        p99 = timings[int(len(timings) * 0.99) - 1]
+        self.stdout.write(
+            f'{label}: p50={statistics.median(timings):.1f}ms p95={p95:.1f}ms '
+            f'p99={p99:.1f}ms ({rows} filas)'
+        )
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from notifications.retention import archive_old, purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Borra las notificaciones caducadas y archiva las leídas antiguas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=None,
+            help='Filas por transacción (por defecto NOTIFICATION_RETENTION_CHUNK_SIZE)',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Segundos de espera entre lotes para repartir la carga',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Solo contar las filas afectadas',
+        )
+
+    def handle(self, *args, **options):
+        kwargs = {
+            'chunk_size': options['chunk_size'],
+            'pause': options['pause'],
+            'dry_run': options['dry_run'],
+        }
+        purged = purge_expired(**kwargs)
+        archived = archive_old(**kwargs)
+
+        verb = 'se borrarían' if options['dry_run'] else 'borradas'
+        self.stdout.write(f'Notificaciones {verb}: {purged}')
+        verb = 'se archivarían' if options['dry_run'] else 'archivadas'
+        self.stdout.write(f'Notificaciones {verb}: {archived}')
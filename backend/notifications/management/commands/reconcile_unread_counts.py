@@ -0,0 +1,36 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from notifications.counters import reconcile_unread_counts
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Corrige los contadores de notificaciones no leídas que se hayan desviado'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Usuarios revisados por consulta',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        last_id = 0
+        checked = 0
+        fixed = 0
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id')
+                .values_list('id', flat=True)[:chunk_size]
+            )
+            if not user_ids:
+                break
+            fixed += len(reconcile_unread_counts(user_ids))
+            checked += len(user_ids)
+            last_id = user_ids[-1]
+
+        self.stdout.write(f'{checked} usuarios revisados, {fixed} contadores corregidos')
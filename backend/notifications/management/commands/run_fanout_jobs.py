@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from notifications.fanout import resumable_jobs, run_fanout_job
+from notifications.models import FanoutJob
+
+
+class Command(BaseCommand):
+    help = 'Procesa los fan-out de notificaciones pendientes o interrumpidos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='Reintentar también los trabajos marcados como fallidos',
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            FanoutJob.objects.filter(status='failed').update(status='pending', error='')
+
+        job_ids = list(resumable_jobs().values_list('id', flat=True))
+        if not job_ids:
+            self.stdout.write('No hay trabajos de fan-out pendientes')
+            return
+
+        for job_id in job_ids:
+            job = run_fanout_job(job_id)
+            if job is None:
+                self.stdout.write(f'Trabajo {job_id}: lo procesa otro worker')
+                continue
+            self.stdout.write(
+                f'Trabajo {job.id}: {job.status} ({job.processed}/{job.total} destinatarios)'
+            )
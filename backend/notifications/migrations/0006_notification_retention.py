@@ -0,0 +1,47 @@
+# Generated by Django 4.2.11 on 2026-10-19 15:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('notifications', '0005_notification_unread_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('sender_id', models.IntegerField(blank=True, null=True)),
+                ('notification_type', models.CharField(choices=[('like', 'Like'), ('comment', 'Comment'), ('follow', 'Follow'), ('message', 'Message'), ('post', 'Post'), ('live_stream', 'Live Stream')], max_length=20)),
+                ('message', models.TextField()),
+                ('actor_count', models.PositiveIntegerField(default=1)),
+                ('related_post_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('related_comment_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('related_live_stream_id', models.PositiveIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['notification_type', 'is_read', 'created_at'], name='notificatio_notific_33ab50_idx'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='recipient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_notifications', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='notificationarchive',
+            index=models.Index(fields=['recipient', '-created_at'], name='notificatio_recipie_914bcc_idx'),
+        ),
+    ]
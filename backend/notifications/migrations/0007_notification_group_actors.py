@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-19 17:04
+
+from django.db import migrations, models
+
+
+def backfill_open_groups(apps, schema_editor):
+    # Las agrupaciones abiertas conservan su ventana desde la creación y cuentan al último usuario
+    Notification = apps.get_model('notifications', 'Notification')
+    rows = Notification.objects.filter(is_read=False).exclude(group_key='').only('id', 'sender_id', 'created_at')
+    batch = []
+    for notification in rows.iterator(chunk_size=1000):
+        notification.group_started_at = notification.created_at
+        notification.actor_ids = [notification.sender_id] if notification.sender_id else []
+        batch.append(notification)
+        if len(batch) >= 1000:
+            Notification.objects.bulk_update(batch, ['group_started_at', 'actor_ids'])
+            batch = []
+    if batch:
+        Notification.objects.bulk_update(batch, ['group_started_at', 'actor_ids'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_notification_retention'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='actor_ids',
+            field=models.JSONField(blank=True, default=list),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='group_started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_open_groups, migrations.RunPython.noop),
+    ]
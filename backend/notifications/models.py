@@ -28,8 +28,92 @@ class Notification(models.Model):
     related_comment_id = models.PositiveIntegerField(null=True, blank=True)
     related_live_stream_id = models.PositiveIntegerField(null=True, blank=True)
     
+    # Agregación: eventos del mismo tipo sobre el mismo objeto se agrupan en una fila
+    group_key = models.CharField(max_length=100, blank=True)
+    actor_count = models.PositiveIntegerField(default=1)
+    # Usuarios ya contados en actor_count (los más recientes) e inicio de la ventana
+    actor_ids = models.JSONField(default=list, blank=True)
+    group_started_at = models.DateTimeField(null=True, blank=True)
+    
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'group_key', '-created_at']),
+            models.Index(fields=['recipient', 'is_read', '-created_at']),
+            # Purga y archivo por antigüedad (notifications.retention)
+            models.Index(fields=['notification_type', 'is_read', 'created_at']),
+        ]
         
     def __str__(self):
         return f"{self.notification_type} notification for {self.recipient.username}"
+
+
+class NotificationArchive(models.Model):
+    """
+    Copia compacta de notificaciones leídas antiguas, fuera de la tabla que
+    consultan las listas. Conserva el id original y descarta los campos que
+    solo sirven para mostrarla en tiempo real.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications')
+    sender_id = models.IntegerField(null=True, blank=True)
+    notification_type = models.CharField(max_length=20, choices=Notification.NOTIFICATION_TYPES)
+    message = models.TextField()
+    actor_count = models.PositiveIntegerField(default=1)
+    related_post_id = models.PositiveIntegerField(null=True, blank=True)
+    related_comment_id = models.PositiveIntegerField(null=True, blank=True)
+    related_live_stream_id = models.PositiveIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"archived {self.notification_type} notification for {self.recipient_id}"
+
+
+class FanoutJob(models.Model):
+    """
+    Envío de una misma notificación a muchos destinatarios (p. ej. todos los
+    seguidores de un usuario), procesado por lotes en segundo plano.
+    ``cursor`` guarda el último id de la audiencia ya procesado para poder
+    reanudar el trabajo tras una caída.
+    """
+    STATUS_CHOICES = (
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    )
+
+    sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='fanout_jobs')
+    audience = models.CharField(max_length=30)
+    # Campos de la Notification que se crea para cada destinatario
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    cursor = models.BigIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.audience} fan-out of {self.sender.username} ({self.status})"
+
+    @property
+    def progress(self):
+        if not self.total:
+            return 100 if self.status == 'done' else 0
+        return min(100, round(self.processed * 100 / self.total))
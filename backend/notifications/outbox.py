@@ -0,0 +1,227 @@
+"""
+Outbox de eventos WebSocket.
+
+El código síncrono (señales, vistas, tareas) no llama a ``group_send``
+directamente: ``publish``/``publish_many`` registran el evento en la
+transacción actual y solo se entrega tras el commit, de modo que una
+transacción revertida no envía nada.
+
+Tras el commit, si el código corre bajo el event loop del servidor ASGI los
+eventos se entregan a un ``OutboxDispatcher`` de ese loop sin bloquear la
+petición: el dispatcher agrupa hasta ``WEBSOCKET_OUTBOX_BATCH_SIZE`` eventos
+por ``asyncio.gather`` y reintenta los envíos fallidos hasta
+``WEBSOCKET_OUTBOX_MAX_ATTEMPTS`` veces con espera exponencial desde
+``WEBSOCKET_OUTBOX_RETRY_DELAY`` segundos. Fuera de un servidor ASGI (comandos,
+hilos propios, tests) se envían en el momento con los mismos reintentos.
+
+``publish_debounced`` agrupa los eventos con la misma clave que llegan dentro
+de ``delay`` segundos y envía solo el último al terminar la ventana.
+``publish_throttled`` envía el primero al momento y combina los que llegan
+durante la ventana en un solo envío al cerrarla.
+"""
+import asyncio
+import logging
+import os
+import weakref
+
+from asgiref.sync import SyncToAsync, async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+
+from config.metrics import record_channel_send
+
+logger = logging.getLogger(__name__)
+
+
+def publish(group, message):
+    """Envía ``message`` al grupo ``group`` cuando se confirme la transacción actual"""
+    publish_many([(group, message)])
+
+
+def publish_many(events):
+    """Como ``publish`` para una lista de ``(grupo, mensaje)``, en un solo envío"""
+    events = list(events)
+    if events:
+        record_channel_send(len(events))
+        transaction.on_commit(lambda: dispatch(events))
+
+
+def publish_debounced(key, group, message, delay):
+    """Como ``publish``, pero una ráfaga de eventos con la misma ``key`` se envía una vez"""
+    record_channel_send()
+    transaction.on_commit(lambda: _dispatch_debounced(key, (group, message), delay))
+
+
+def publish_throttled(key, group, message, delay, merge):
+    """
+    Como ``publish``, pero como mucho un envío por ``key`` cada ``delay``
+    segundos: el primero sale al momento y los siguientes se combinan con
+    ``merge(pendiente, nuevo)`` y salen juntos al terminar la ventana.
+    """
+    record_channel_send()
+    transaction.on_commit(lambda: _dispatch_throttled(key, (group, message), delay, merge))
+
+
+def _dispatch_throttled(key, event, delay, merge):
+    channel_layer = get_channel_layer()
+    loop = _server_event_loop()
+    if not channel_layer or loop is None or not delay:
+        dispatch([event])
+        return
+    loop.call_soon_threadsafe(_throttle, channel_layer, key, event, delay, merge)
+
+
+def _dispatch_debounced(key, event, delay):
+    channel_layer = get_channel_layer()
+    loop = _server_event_loop()
+    if not channel_layer or loop is None or not delay:
+        dispatch([event])
+        return
+    loop.call_soon_threadsafe(_debounce, channel_layer, key, event, delay)
+
+
+def dispatch(events):
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+
+    loop = _server_event_loop()
+    if loop is not None:
+        loop.call_soon_threadsafe(_enqueue, channel_layer, events)
+    else:
+        async_to_sync(send_events)(channel_layer, events)
+
+
+def _server_event_loop():
+    """Event loop del servidor ASGI si este hilo es un ``sync_to_async`` de ese loop"""
+    loop = getattr(SyncToAsync.threadlocal, 'main_event_loop', None)
+    pid = getattr(SyncToAsync.threadlocal, 'main_event_loop_pid', None)
+    if loop is not None and pid == os.getpid() and loop.is_running():
+        return loop
+    return None
+
+
+async def send_events(channel_layer, events):
+    """Envía los eventos con reintentos; devuelve los que no se pudieron entregar"""
+    attempts = settings.WEBSOCKET_OUTBOX_MAX_ATTEMPTS
+    delay = settings.WEBSOCKET_OUTBOX_RETRY_DELAY
+    for attempt in range(1, attempts + 1):
+        results = await _send_once(channel_layer, events)
+        events = [event for event, error in zip(events, results) if error]
+        if not events:
+            return []
+        if attempt < attempts:
+            await asyncio.sleep(delay * 2 ** (attempt - 1))
+    logger.error('Outbox: %d eventos descartados tras %d intentos', len(events), attempts)
+    return events
+
+
+async def _send_once(channel_layer, events):
+    """Envía los eventos en paralelo; devuelve la excepción de cada uno o None"""
+    results = await asyncio.gather(
+        *(channel_layer.group_send(group, message) for group, message in events),
+        return_exceptions=True
+    )
+    errors = []
+    for (group, _), result in zip(events, results):
+        if isinstance(result, Exception):
+            logger.warning('Outbox: fallo al enviar a %s: %r', group, result)
+            errors.append(result)
+        else:
+            errors.append(None)
+    return errors
+
+
+class OutboxDispatcher:
+    """Cola de eventos del event loop del servidor, enviados por lotes"""
+
+    def __init__(self, channel_layer):
+        self.channel_layer = channel_layer
+        self._queue = asyncio.Queue()
+        self._worker = None
+        self._debounced = {}
+        # key -> [evento pendiente o None, merge] mientras la ventana está abierta
+        self._throttled = {}
+
+    def enqueue(self, events, attempt=1):
+        for event in events:
+            self._queue.put_nowait((event, attempt))
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.ensure_future(self._run())
+
+    def debounce(self, key, event, delay):
+        """Guarda el último evento de ``key`` y lo encola al cumplirse ``delay``"""
+        pending = key in self._debounced
+        self._debounced[key] = event
+        if not pending:
+            asyncio.get_running_loop().call_later(delay, self._flush_debounced, key)
+
+    def _flush_debounced(self, key):
+        event = self._debounced.pop(key, None)
+        if event is not None:
+            self.enqueue([event])
+
+    def throttle(self, key, event, delay, merge):
+        """Encola ``event`` si ``key`` no tiene ventana abierta; si la tiene, lo combina con lo pendiente"""
+        if key not in self._throttled:
+            self._open_window(key, delay, merge)
+            self.enqueue([event])
+            return
+        pending = self._throttled[key][0]
+        if pending is not None:
+            event = (event[0], merge(pending[1], event[1]))
+        self._throttled[key][0] = event
+
+    def _open_window(self, key, delay, merge):
+        self._throttled[key] = [None, merge]
+        asyncio.get_running_loop().call_later(delay, self._close_window, key, delay)
+
+    def _close_window(self, key, delay):
+        pending, merge = self._throttled.pop(key)
+        if pending is not None:
+            # Lo acumulado sale ahora y abre otra ventana
+            self._open_window(key, delay, merge)
+            self.enqueue([pending])
+
+    async def _run(self):
+        batch_size = settings.WEBSOCKET_OUTBOX_BATCH_SIZE
+        while not self._queue.empty():
+            batch = []
+            while not self._queue.empty() and len(batch) < batch_size:
+                batch.append(self._queue.get_nowait())
+            errors = await _send_once(self.channel_layer, [event for event, _ in batch])
+            for (event, attempt), error in zip(batch, errors):
+                if error:
+                    self._retry(event, attempt)
+
+    def _retry(self, event, attempt):
+        if attempt >= settings.WEBSOCKET_OUTBOX_MAX_ATTEMPTS:
+            logger.error('Outbox: evento para %s descartado tras %d intentos', event[0], attempt)
+            return
+        delay = settings.WEBSOCKET_OUTBOX_RETRY_DELAY * 2 ** (attempt - 1)
+        asyncio.get_running_loop().call_later(delay, self.enqueue, [event], attempt + 1)
+
+
+_dispatchers = weakref.WeakKeyDictionary()
+
+
+def _loop_dispatcher(channel_layer):
+    """Dispatcher del event loop en curso (se llama dentro del loop del servidor)"""
+    loop = asyncio.get_running_loop()
+    dispatcher = _dispatchers.get(loop)
+    if dispatcher is None or dispatcher.channel_layer is not channel_layer:
+        dispatcher = _dispatchers[loop] = OutboxDispatcher(channel_layer)
+    return dispatcher
+
+
+def _enqueue(channel_layer, events):
+    _loop_dispatcher(channel_layer).enqueue(events)
+
+
+def _debounce(channel_layer, key, event, delay):
+    _loop_dispatcher(channel_layer).debounce(key, event, delay)
+
+
+def _throttle(channel_layer, key, event, delay, merge):
+    _loop_dispatcher(channel_layer).throttle(key, event, delay, merge)
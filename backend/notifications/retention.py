@@ -0,0 +1,127 @@
+"""
+Retención y archivo de notificaciones.
+
+``purge_expired`` borra las notificaciones leídas más antiguas que la retención
+de su tipo (``NOTIFICATION_RETENTION_DAYS`` / ``NOTIFICATION_RETENTION_DAYS_BY_TYPE``)
+y las no leídas más antiguas que ``NOTIFICATION_UNREAD_RETENTION_DAYS``.
+``archive_old`` mueve las leídas de más de ``NOTIFICATION_ARCHIVE_AFTER_DAYS``
+días a ``NotificationArchive``. Ambas trabajan por lotes de
+``NOTIFICATION_RETENTION_CHUNK_SIZE`` filas, cada lote en su propia transacción,
+para no bloquear la tabla durante toda la pasada. Se ejecutan con
+``python manage.py purge_notifications``.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .counters import adjust_unread_count
+from .models import Notification, NotificationArchive
+
+ARCHIVED_FIELDS = [
+    'id', 'recipient_id', 'sender_id', 'notification_type', 'message', 'actor_count',
+    'related_post_id', 'related_comment_id', 'related_live_stream_id', 'created_at',
+]
+
+
+def retention_cutoffs(now=None):
+    """Fecha límite de retención de cada tipo de notificación (sin entrada = sin límite)"""
+    now = now or timezone.now()
+    cutoffs = {}
+    for notification_type, _ in Notification.NOTIFICATION_TYPES:
+        days = settings.NOTIFICATION_RETENTION_DAYS_BY_TYPE.get(
+            notification_type, settings.NOTIFICATION_RETENTION_DAYS
+        )
+        if days:
+            cutoffs[notification_type] = now - timedelta(days=days)
+    return cutoffs
+
+
+def expired_querysets(now=None):
+    """Querysets de filas caducadas, cada uno apoyado en un índice"""
+    now = now or timezone.now()
+    for notification_type, cutoff in retention_cutoffs(now).items():
+        yield Notification.objects.filter(
+            notification_type=notification_type, is_read=True, created_at__lt=cutoff
+        )
+        yield NotificationArchive.objects.filter(
+            notification_type=notification_type, created_at__lt=cutoff
+        )
+
+    if settings.NOTIFICATION_UNREAD_RETENTION_DAYS:
+        cutoff = now - timedelta(days=settings.NOTIFICATION_UNREAD_RETENTION_DAYS)
+        for notification_type, _ in Notification.NOTIFICATION_TYPES:
+            yield Notification.objects.filter(
+                notification_type=notification_type, is_read=False, created_at__lt=cutoff
+            )
+
+
+def purge_expired(chunk_size=None, pause=0, dry_run=False):
+    """Borra las notificaciones caducadas; devuelve el número de filas"""
+    chunk_size = chunk_size or settings.NOTIFICATION_RETENTION_CHUNK_SIZE
+    total = 0
+    for queryset in expired_querysets():
+        if dry_run:
+            total += queryset.count()
+        else:
+            total += _delete_in_chunks(queryset, chunk_size, pause)
+    return total
+
+
+def _delete_in_chunks(queryset, chunk_size, pause):
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by().values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+
+        chunk = queryset.filter(id__in=ids)
+        unread = {}
+        with transaction.atomic():
+            if queryset.model is Notification:
+                unread = dict(
+                    chunk.filter(is_read=False).order_by().values('recipient_id')
+                    .annotate(count=Count('id')).values_list('recipient_id', 'count')
+                )
+            deleted += chunk.delete()[0]
+        for recipient_id, count in unread.items():
+            adjust_unread_count(recipient_id, -count)
+
+        if pause:
+            time.sleep(pause)
+
+
+def archive_old(chunk_size=None, pause=0, dry_run=False):
+    """Mueve las notificaciones leídas antiguas a ``NotificationArchive``"""
+    if not settings.NOTIFICATION_ARCHIVE_AFTER_DAYS:
+        return 0
+
+    chunk_size = chunk_size or settings.NOTIFICATION_RETENTION_CHUNK_SIZE
+    cutoff = timezone.now() - timedelta(days=settings.NOTIFICATION_ARCHIVE_AFTER_DAYS)
+    archived = 0
+    for notification_type, _ in Notification.NOTIFICATION_TYPES:
+        queryset = Notification.objects.filter(
+            notification_type=notification_type, is_read=True, created_at__lt=cutoff
+        )
+        if dry_run:
+            archived += queryset.count()
+            continue
+
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    queryset.select_for_update().order_by().values(*ARCHIVED_FIELDS)[:chunk_size]
+                )
+                if not rows:
+                    break
+                NotificationArchive.objects.bulk_create(
+                    [NotificationArchive(**row) for row in rows], ignore_conflicts=True
+                )
+                queryset.filter(id__in=[row['id'] for row in rows]).delete()
+            archived += len(rows)
+            if pause:
+                time.sleep(pause)
+    return archived
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Notification
+from .models import FanoutJob, Notification
 
 
 class NotificationSerializer(serializers.ModelSerializer):
@@ -12,7 +12,7 @@ class NotificationSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'notification_type', 'title', 'message', 'is_read',
             'created_at', 'updated_at', 'sender_username', 'sender_avatar',
-            'time_ago', 'related_post_id', 'related_comment_id'
+            'time_ago', 'related_post_id', 'related_comment_id', 'actor_count'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
@@ -37,4 +37,16 @@ class NotificationSerializer(serializers.ModelSerializer):
             minutes = diff.seconds // 60
             return f"{minutes}m"
         else:
-            return "now"
\ No newline at end of file
+            return "now"
+
+
+class FanoutJobSerializer(serializers.ModelSerializer):
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = FanoutJob
+        fields = [
+            'id', 'audience', 'status', 'total', 'processed', 'progress',
+            'created_at', 'updated_at', 'finished_at'
+        ]
+        read_only_fields = fields
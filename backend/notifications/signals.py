@@ -1,32 +1,25 @@
+from django.conf import settings
+from django.db import transaction
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from datetime import timedelta
-from asgiref.sync import async_to_sync
-from channels.layers import get_channel_layer
-from apps.posts.models import Like, Comment, CommentLike, SharedPost
+from apps.posts.models import Post, Like, Comment, CommentLike, SharedPost
 from apps.users.models import Follow
+from notifications.aggregation import notify
+from notifications.counters import adjust_unread_count
+from notifications.fanout import enqueue_fanout
 from notifications.models import Notification
-from notifications.serializers import NotificationSerializer
 
 User = get_user_model()
-channel_layer = get_channel_layer()
 
 
-def send_notification_to_websocket(notification):
-    """Enviar notificación por WebSocket en tiempo real"""
-    if channel_layer:
-        serializer = NotificationSerializer(notification)
-        group_name = f'notifications_{notification.recipient.id}'
-        
-        async_to_sync(channel_layer.group_send)(
-            group_name,
-            {
-                'type': 'new_notification',
-                'notification': serializer.data
-            }
-        )
+@receiver(post_save, sender=Notification)
+def count_unread_notification(sender, instance, created, **kwargs):
+    """Sumar la notificación nueva al contador de no leídas del destinatario"""
+    if created and not instance.is_read:
+        transaction.on_commit(lambda: adjust_unread_count(instance.recipient_id, 1))
 
 
 @receiver(post_save, sender=Like)
@@ -35,16 +28,16 @@ def create_like_notification(sender, instance, created, **kwargs):
     if created:
         # No notificar si el usuario le da like a su propio post
         if instance.post.author != instance.user:
-            notification = Notification.objects.create(
+            notify(
                 recipient=instance.post.author,
                 sender=instance.user,
                 notification_type='like',
                 title='Nuevo like',
                 message=f'{instance.user.username} le gustó tu publicación',
+                group=f'like:post:{instance.post.id}',
+                aggregate_message='A {actor} y {others} personas más les gustó tu publicación',
                 related_post_id=instance.post.id
             )
-            # Enviar por WebSocket
-            send_notification_to_websocket(notification)
 
 
 @receiver(post_save, sender=Comment)
@@ -53,17 +46,17 @@ def create_comment_notification(sender, instance, created, **kwargs):
     if created:
         # No notificar si el usuario comenta su propio post
         if instance.post.author != instance.author:
-            notification = Notification.objects.create(
+            notify(
                 recipient=instance.post.author,
                 sender=instance.author,
                 notification_type='comment',
                 title='Nuevo comentario',
                 message=f'{instance.author.username} comentó tu publicación: "{instance.content[:50]}"',
+                group=f'comment:post:{instance.post.id}',
+                aggregate_message='{actor} y {others} personas más comentaron tu publicación',
                 related_post_id=instance.post.id,
                 related_comment_id=instance.id
             )
-            # Enviar por WebSocket
-            send_notification_to_websocket(notification)
 
 
 @receiver(post_save, sender=Follow)
@@ -81,15 +74,15 @@ def create_follow_notification(sender, instance, created, **kwargs):
         if existing_notification:
             return
             
-        notification = Notification.objects.create(
+        notify(
             recipient=instance.following,
             sender=instance.follower,
             notification_type='follow',
             title='Nuevo seguidor',
-            message=f'{instance.follower.username} comenzó a seguirte'
+            message=f'{instance.follower.username} comenzó a seguirte',
+            group='follow',
+            aggregate_message='{actor} y {others} personas más comenzaron a seguirte'
         )
-        # Enviar por WebSocket
-        send_notification_to_websocket(notification)
 
 
 @receiver(post_save, sender=SharedPost)
@@ -98,21 +91,21 @@ def create_share_notification(sender, instance, created, **kwargs):
     if created:
         # Notificar al autor original del post
         if instance.original_post.author != instance.shared_by:
-            notification = Notification.objects.create(
+            notify(
                 recipient=instance.original_post.author,
                 sender=instance.shared_by,
                 notification_type='post',
                 title='Compartieron tu publicación',
                 message=f'{instance.shared_by.username} compartió tu publicación',
+                group=f'share:post:{instance.original_post.id}',
+                aggregate_message='{actor} y {others} personas más compartieron tu publicación',
                 related_post_id=instance.original_post.id
             )
-            # Enviar por WebSocket
-            send_notification_to_websocket(notification)
         
         # Si se compartió con un usuario específico, notificarle también
         if instance.shared_with and instance.shared_with != instance.shared_by:
             message_text = instance.message or 'una publicación'
-            notification = Notification.objects.create(
+            notify(
                 recipient=instance.shared_with,
                 sender=instance.shared_by,
                 notification_type='post',
@@ -120,8 +113,6 @@ def create_share_notification(sender, instance, created, **kwargs):
                 message=f'{instance.shared_by.username} compartió contigo: "{message_text[:50]}"',
                 related_post_id=instance.original_post.id
             )
-            # Enviar por WebSocket
-            send_notification_to_websocket(notification)
 
 
 @receiver(post_save, sender=CommentLike)
@@ -130,14 +121,28 @@ def create_comment_like_notification(sender, instance, created, **kwargs):
     if created:
         # No notificar si el usuario le da like a su propio comentario
         if instance.comment.author != instance.user:
-            notification = Notification.objects.create(
+            notify(
                 recipient=instance.comment.author,
                 sender=instance.user,
                 notification_type='like',
                 title='Like en tu comentario',
                 message=f'{instance.user.username} le gustó tu comentario',
-                related_post_id=instance.comment.post.id,
+                group=f'like:comment:{instance.comment.id}',
+                aggregate_message='A {actor} y {others} personas más les gustó tu comentario',
+                related_post_id=instance.comment.post_id,
                 related_comment_id=instance.comment.id
             )
-            # Enviar por WebSocket
-            send_notification_to_websocket(notification)
+
+
+@receiver(post_save, sender=Post)
+def create_new_post_notifications(sender, instance, created, **kwargs):
+    """Avisar a los seguidores de una nueva publicación (si está activado)"""
+    if created and settings.NOTIFY_FOLLOWERS_ON_POST:
+        enqueue_fanout(
+            instance.author,
+            'followers',
+            notification_type='post',
+            title='Nueva publicación',
+            message=f'{instance.author.username} publicó: "{instance.content[:50]}"',
+            related_post_id=instance.id,
+        )
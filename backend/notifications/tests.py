@@ -1,3 +1,468 @@
-from django.test import TestCase
+import asyncio
+from datetime import timedelta
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.db import transaction
+from channels.testing import WebsocketCommunicator
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from apps.posts.models import Comment, Like, Post
+from apps.users.models import Follow
+from apps.users.testing import create_user
+from .consumers import NotificationConsumer
+from .counters import get_unread_count, reconcile_unread_counts, unread_key
+from .fanout import enqueue_fanout, run_fanout_job
+from .models import FanoutJob, Notification, NotificationArchive
+from .outbox import OutboxDispatcher, publish, send_events
+from .retention import archive_old, purge_expired
+
+
+@override_settings(NOTIFICATION_FANOUT_CHUNK_SIZE=2)
+class FanoutJobTests(TestCase):
+    """Tests del fan-out de notificaciones en segundo plano"""
+
+    def setUp(self):
+        self.streamer = create_user('streamer')
+        self.followers = [create_user(f'follower{i}') for i in range(5)]
+        for follower in self.followers:
+            Follow.objects.create(follower=follower, following=self.streamer)
+
+    def live_notifications(self):
+        return Notification.objects.filter(notification_type='live_stream')
+
+    def enqueue(self):
+        return enqueue_fanout(
+            self.streamer,
+            'followers',
+            notification_type='live_stream',
+            title='¡Nuevo directo!',
+            message='Directo',
+            related_live_stream_id=1,
+        )
+
+    def test_job_notifies_every_follower_in_chunks(self):
+        """Cada seguidor recibe una notificación y el trabajo termina"""
+        job = self.enqueue()
+        run_fanout_job(job.id)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual((job.processed, job.total, job.progress), (5, 5, 100))
+        self.assertEqual(
+            set(self.live_notifications().values_list('recipient_id', flat=True)),
+            {follower.id for follower in self.followers}
+        )
+
+    def test_interrupted_job_resumes_from_cursor(self):
+        """Un trabajo interrumpido continúa donde lo dejó sin duplicar"""
+        job = self.enqueue()
+        first_follows = Follow.objects.order_by('id')[:2]
+        Notification.objects.bulk_create([
+            Notification(recipient=follow.follower, sender=self.streamer,
+                         notification_type='live_stream', title='t', message='m')
+            for follow in first_follows
+        ])
+        FanoutJob.objects.filter(pk=job.pk).update(
+            cursor=first_follows[1].id, processed=2, total=5
+        )
+
+        run_fanout_job(job.id)
+
+        self.assertEqual(self.live_notifications().count(), 5)
+        self.assertEqual(FanoutJob.objects.get(pk=job.pk).processed, 5)
+
+    def test_running_job_is_not_claimed_twice(self):
+        """Un trabajo en curso reciente no lo toma otro worker"""
+        job = self.enqueue()
+        FanoutJob.objects.filter(pk=job.pk).update(status='running')
+        self.assertIsNone(run_fanout_job(job.id))
+        self.assertEqual(self.live_notifications().count(), 0)
+
+    def test_sender_can_check_progress(self):
+        job = self.enqueue()
+        client = APIClient()
+        client.force_authenticate(user=self.streamer)
+        response = client.get(f'/api/notifications/fanout/{job.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'pending')
+
+        client.force_authenticate(user=self.followers[0])
+        response = client.get(f'/api/notifications/fanout/{job.id}/')
+        self.assertEqual(response.status_code, 404)
+
+
+class NotificationAggregationTests(TestCase):
+    """Tests de la agrupación de notificaciones"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = create_user('author')
+        self.post = Post.objects.create(author=self.author, content='hola')
+        self.likers = [create_user(f'liker{i}') for i in range(3)]
+
+    def like_notifications(self):
+        return Notification.objects.filter(recipient=self.author, notification_type='like')
+
+    def test_likes_collapse_into_one_notification(self):
+        """Los likes de la misma publicación se agrupan en una notificación"""
+        for liker in self.likers:
+            Like.objects.create(user=liker, post=self.post)
+
+        notification = self.like_notifications().get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.sender, self.likers[-1])
+        self.assertEqual(
+            notification.message, 'A liker2 y 2 personas más les gustó tu publicación'
+        )
+
+    def test_read_notification_is_not_reused(self):
+        """Tras leerla, un nuevo like crea otra notificación"""
+        Like.objects.create(user=self.likers[0], post=self.post)
+        self.like_notifications().update(is_read=True)
+        Like.objects.create(user=self.likers[1], post=self.post)
+        self.assertEqual(self.like_notifications().count(), 2)
+
+    @override_settings(NOTIFICATION_AGGREGATION_ENABLED=False)
+    def test_one_notification_per_event_when_disabled(self):
+        for liker in self.likers:
+            Like.objects.create(user=liker, post=self.post)
+        self.assertEqual(self.like_notifications().count(), 3)
+
+    def test_same_user_is_counted_once(self):
+        """Quitar y volver a dar like no suma personas"""
+        Like.objects.create(user=self.likers[0], post=self.post)
+        for _ in range(2):
+            Like.objects.filter(user=self.likers[1], post=self.post).delete()
+            Like.objects.create(user=self.likers[1], post=self.post)
+
+        notification = self.like_notifications().get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.actor_ids, [self.likers[0].id, self.likers[1].id])
+
+        Like.objects.filter(user=self.likers[0], post=self.post).delete()
+        Like.objects.create(user=self.likers[0], post=self.post)
+        notification.refresh_from_db()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.message, 'A liker0 y 1 personas más les gustó tu publicación')
+
+    def test_toggled_like_keeps_single_actor(self):
+        for _ in range(3):
+            Like.objects.filter(user=self.likers[0], post=self.post).delete()
+            Like.objects.create(user=self.likers[0], post=self.post)
+        self.assertEqual(self.like_notifications().get().actor_count, 1)
+
+    def test_window_counts_from_first_event(self):
+        """Una agrupación que recibe eventos sin parar se cierra igualmente"""
+        Like.objects.create(user=self.likers[0], post=self.post)
+        window = timedelta(seconds=settings.NOTIFICATION_AGGREGATION_WINDOW + 1)
+        self.like_notifications().update(
+            group_started_at=timezone.now() - window, created_at=timezone.now()
+        )
+        Like.objects.create(user=self.likers[1], post=self.post)
+        self.assertEqual(self.like_notifications().count(), 2)
+
+    def test_pushes_are_throttled_per_recipient(self):
+        """Todas las notificaciones de un destinatario comparten ventana de envío"""
+        other_post = Post.objects.create(author=self.author, content='adiós')
+        with patch('notifications.aggregation.publish_throttled') as push:
+            for liker in self.likers:
+                Like.objects.create(user=liker, post=self.post)
+            Like.objects.create(user=self.likers[0], post=other_post)
+
+        self.assertEqual(push.call_count, 4)
+        keys = {call.args[0] for call in push.call_args_list}
+        self.assertEqual(keys, {f'notifications:push:{self.author.id}'})
+        key, group, message, delay, merge = push.call_args_list[0].args
+        self.assertEqual(group, f'notifications_{self.author.id}')
+        self.assertEqual(delay, settings.NOTIFICATION_PUSH_INTERVAL)
+
+        # La ventana llega al cliente como un solo lote, cada notificación una vez
+        batch = message
+        for call in push.call_args_list[1:]:
+            batch = merge(batch, call.args[2])
+        grouped = self.like_notifications().get(related_post_id=self.post.id)
+        self.assertEqual(batch['type'], 'notifications_batch')
+        self.assertEqual([data['id'] for data in batch['created']], [
+            grouped.id, self.like_notifications().get(related_post_id=other_post.id).id
+        ])
+        self.assertEqual(batch['created'][0]['actor_count'], 3)
+        self.assertEqual(batch['updated'], [])
+
+
+class UnreadCounterTests(TestCase):
+    """Tests del contador de no leídas en caché"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def create_notification(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Notification.objects.create(
+                recipient=self.user, notification_type='like', title='t', message='m', **kwargs
+            )
+
+    def test_counter_follows_create_read_and_delete(self):
+        """El contador se ajusta sin volver a contar filas"""
+        first = self.create_notification()
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+        self.create_notification()
+        self.create_notification(is_read=True)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_unread_count(self.user.id), 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{first.id}/read/')
+        self.assertEqual(cache.get(unread_key(self.user.id)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/notifications/{first.id}/read/')
+        self.assertEqual(cache.get(unread_key(self.user.id)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/notifications/bulk-delete/', {
+                'notification_ids': list(Notification.objects.values_list('id', flat=True))
+            }, format='json')
+        self.assertEqual(cache.get(unread_key(self.user.id)), 0)
+
+    def test_mark_all_read(self):
+        self.create_notification()
+        self.create_notification()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark-all-read/')
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(self.client.get('/api/notifications/unread-count/').data['count'], 0)
+
+    def test_reconcile_fixes_drift(self):
+        self.create_notification()
+        cache.set(unread_key(self.user.id), 7)
+        self.assertEqual(reconcile_unread_counts([self.user.id]), {self.user.id: 1})
+        self.assertEqual(get_unread_count(self.user.id), 1)
+        self.assertEqual(reconcile_unread_counts([self.user.id]), {})
+
+    def test_comment_unlike_discounts_notification(self):
+        """Quitar el like a un comentario borra su notificación y la descuenta"""
+        comment = Comment.objects.create(
+            post=Post.objects.create(author=self.user, content='hola'), author=self.user, content='c'
+        )
+        liker = APIClient()
+        liker.force_authenticate(user=create_user('liker'))
+        with self.captureOnCommitCallbacks(execute=True):
+            liker.post(f'/api/posts/comments/{comment.id}/like/')
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            liker.post(f'/api/posts/comments/{comment.id}/like/')
+        self.assertFalse(Notification.objects.filter(recipient=self.user).exists())
+        self.assertEqual(cache.get(unread_key(self.user.id)), 0)
+
+
+@override_settings(
+    NOTIFICATION_RETENTION_DAYS=30,
+    NOTIFICATION_RETENTION_DAYS_BY_TYPE={'live_stream': 7},
+    NOTIFICATION_UNREAD_RETENTION_DAYS=365,
+    NOTIFICATION_RETENTION_CHUNK_SIZE=2,
+)
+class NotificationRetentionTests(TestCase):
+    """Tests de la retención y el archivo de notificaciones"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('user')
+
+    def create(self, days_ago, notification_type='like', is_read=True):
+        notification = Notification.objects.create(
+            recipient=self.user, notification_type=notification_type,
+            title='t', message='m', is_read=is_read
+        )
+        Notification.objects.filter(pk=notification.pk).update(
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return notification
+
+    def test_purge_uses_retention_per_type(self):
+        """Cada tipo caduca según su retención; las no leídas se conservan más"""
+        keep = [
+            self.create(10),
+            self.create(3, 'live_stream'),
+            self.create(100, is_read=False),
+        ]
+        for _ in range(3):
+            self.create(40)
+        self.create(10, 'live_stream')
+
+        self.assertEqual(purge_expired(dry_run=True), 4)
+        self.assertEqual(purge_expired(), 4)
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)),
+            {notification.id for notification in keep}
+        )
+
+    def test_purging_unread_updates_counter(self):
+        self.create(400, is_read=False)
+        self.create(1, is_read=False)
+        self.assertEqual(get_unread_count(self.user.id), 2)
+
+        purge_expired()
+        self.assertEqual(get_unread_count(self.user.id), 1)
+
+    @override_settings(NOTIFICATION_ARCHIVE_AFTER_DAYS=5)
+    def test_old_read_notifications_are_archived(self):
+        old = self.create(10)
+        recent = self.create(1)
+        unread = self.create(10, is_read=False)
+
+        self.assertEqual(archive_old(), 1)
+        self.assertEqual(
+            set(Notification.objects.values_list('id', flat=True)), {recent.id, unread.id}
+        )
+        archived = NotificationArchive.objects.get()
+        self.assertEqual((archived.id, archived.recipient_id), (old.id, self.user.id))
+
+
+class FlakyChannelLayer:
+    """Channel layer de prueba que falla los primeros ``failures`` envíos"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    async def group_send(self, group, message):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('channel layer no disponible')
+        self.sent.append((group, message))
+
+
+@override_settings(WEBSOCKET_OUTBOX_RETRY_DELAY=0)
+class OutboxTests(TestCase):
+    """Tests del outbox de eventos WebSocket"""
+
+    def test_events_are_dispatched_after_commit(self):
+        with patch('notifications.outbox.dispatch') as dispatch:
+            with self.captureOnCommitCallbacks(execute=True):
+                publish('grupo', {'type': 'evento'})
+                dispatch.assert_not_called()
+        dispatch.assert_called_once_with([('grupo', {'type': 'evento'})])
+
+    def test_rolled_back_events_are_discarded(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            try:
+                with transaction.atomic():
+                    publish('grupo', {'type': 'evento'})
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(callbacks, [])
+
+    def test_transient_failures_are_retried(self):
+        layer = FlakyChannelLayer(failures=1)
+        undelivered = async_to_sync(send_events)(layer, [('grupo', {'type': 'evento'})])
+        self.assertEqual(undelivered, [])
+        self.assertEqual(layer.sent, [('grupo', {'type': 'evento'})])
+
+    @override_settings(WEBSOCKET_OUTBOX_BATCH_SIZE=2)
+    def test_dispatcher_sends_in_batches_and_retries(self):
+        """El dispatcher del event loop entrega todos los eventos aunque alguno falle"""
+        layer = FlakyChannelLayer(failures=1)
+        events = [(f'grupo{i}', {'type': 'evento'}) for i in range(5)]
+
+        async def scenario():
+            dispatcher = OutboxDispatcher(layer)
+            dispatcher.enqueue(events)
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+                if len(layer.sent) == len(events):
+                    break
+
+        asyncio.run(scenario())
+        self.assertEqual(sorted(layer.sent), sorted(events))
+
+    def test_debounced_events_send_only_the_last_one(self):
+        layer = FlakyChannelLayer()
+
+        async def scenario():
+            dispatcher = OutboxDispatcher(layer)
+            for version in range(3):
+                dispatcher.debounce('perfil:1', ('grupo', {'version': version}), 0.01)
+            await asyncio.sleep(0.05)
+
+        asyncio.run(scenario())
+        self.assertEqual(layer.sent, [('grupo', {'version': 2})])
+
+    def test_throttled_events_send_first_then_merged_batch(self):
+        layer = FlakyChannelLayer()
+
+        def merge(pending, new):
+            return {'versions': pending['versions'] + new['versions']}
+
+        async def scenario():
+            dispatcher = OutboxDispatcher(layer)
+            for version in range(4):
+                dispatcher.throttle('user:1', ('grupo', {'versions': [version]}), 0.02, merge)
+            await asyncio.sleep(0.01)
+            self.assertEqual(layer.sent, [('grupo', {'versions': [0]})])
+            await asyncio.sleep(0.06)
+            # Con la ventana cerrada sin pendientes, el siguiente sale al momento
+            dispatcher.throttle('user:1', ('grupo', {'versions': [4]}), 0.02, merge)
+            await asyncio.sleep(0.01)
+
+        asyncio.run(scenario())
+        self.assertEqual(layer.sent, [
+            ('grupo', {'versions': [0]}),
+            ('grupo', {'versions': [1, 2, 3]}),
+            ('grupo', {'versions': [4]}),
+        ])
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class NotificationConsumerTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = create_user('receptor')
+        self.sender = create_user('emisor')
+        self.notifications = [
+            Notification.objects.create(
+                recipient=self.user, sender=self.sender, notification_type='follow',
+                title='Nuevo seguidor', message='emisor te sigue'
+            )
+            for _ in range(2)
+        ]
+
+    async def receive_until(self, communicator, message_type):
+        while True:
+            message = await communicator.receive_json_from()
+            if message['type'] == message_type:
+                return message
+
+    def test_connect_sends_unread_count(self):
+        async def scenario():
+            communicator = WebsocketCommunicator(NotificationConsumer.as_asgi(), '/ws/notifications/')
+            communicator.scope['user'] = self.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            self.assertEqual((await communicator.receive_json_from())['type'], 'connection_established')
+            self.assertEqual(await communicator.receive_json_from(), {'type': 'unread_count', 'count': 2})
+
+            notification_id = self.notifications[0].id
+            for _ in range(2):
+                # La segunda vez ya estaba leída y sigue contando como éxito
+                await communicator.send_json_to({'type': 'mark_read', 'notification_id': notification_id})
+                reply = await self.receive_until(communicator, 'notification_marked_read')
+                self.assertTrue(reply['success'])
+
+            await communicator.send_json_to({'type': 'mark_read', 'notification_id': 999999})
+            reply = await self.receive_until(communicator, 'notification_marked_read')
+            self.assertFalse(reply['success'])
+            await communicator.disconnect()
+
+        async_to_sync(scenario)()
+        self.assertEqual(get_unread_count(self.user.id), 1)
@@ -20,4 +20,7 @@ urlpatterns = [
     ),
     path('bulk-mark-read/', views.bulk_mark_read, name='bulk-mark-read'),
     path('bulk-delete/', views.bulk_delete, name='bulk-delete'),
+    path('mark-all-read/', views.mark_all_read, name='mark-all-read'),
+    path('unread-count/', views.unread_count, name='unread-count'),
+    path('fanout/<int:job_id>/', views.fanout_job_status, name='fanout-job-status'),
 ]
@@ -1,10 +1,11 @@
-from rest_framework import generics, status
+from rest_framework import generics
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from .models import Notification
-from .serializers import NotificationSerializer
+from .counters import delete_notifications, get_unread_count, set_read
+from .models import FanoutJob, Notification
+from .serializers import FanoutJobSerializer, NotificationSerializer
 
 
 class NotificationListView(generics.ListAPIView):
@@ -26,58 +27,38 @@ class NotificationListView(generics.ListAPIView):
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notification_read(request, notification_id):
-    try:
-        notification = get_object_or_404(
-            Notification,
-            id=notification_id,
-            recipient=request.user
-        )
-        notification.is_read = True
-        notification.save()
-        return Response({'status': 'success'})
-    except Notification.DoesNotExist:
-        return Response(
-            {'error': 'Notification not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
+    notification = get_object_or_404(
+        Notification,
+        id=notification_id,
+        recipient=request.user
+    )
+    set_read(request.user.id, Notification.objects.filter(pk=notification.pk), True)
+    return Response({'status': 'success'})
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def mark_notification_unread(request, notification_id):
     """Marcar una notificación individual como NO leída."""
-    try:
-        notification = get_object_or_404(
-            Notification,
-            id=notification_id,
-            recipient=request.user
-        )
-        notification.is_read = False
-        notification.save()
-        return Response({'status': 'success'})
-    except Notification.DoesNotExist:
-        return Response(
-            {'error': 'Notification not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
+    notification = get_object_or_404(
+        Notification,
+        id=notification_id,
+        recipient=request.user
+    )
+    set_read(request.user.id, Notification.objects.filter(pk=notification.pk), False)
+    return Response({'status': 'success'})
 
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def delete_notification(request, notification_id):
-    try:
-        notification = get_object_or_404(
-            Notification,
-            id=notification_id,
-            recipient=request.user
-        )
-        notification.delete()
-        return Response({'status': 'success'})
-    except Notification.DoesNotExist:
-        return Response(
-            {'error': 'Notification not found'},
-            status=status.HTTP_404_NOT_FOUND
-        )
+    notification = get_object_or_404(
+        Notification,
+        id=notification_id,
+        recipient=request.user
+    )
+    delete_notifications(request.user.id, Notification.objects.filter(pk=notification.pk))
+    return Response({'status': 'success'})
 
 
 @api_view(['POST'])
@@ -85,22 +66,37 @@ def delete_notification(request, notification_id):
 def bulk_mark_read(request):
     notification_ids = request.data.get('notification_ids', [])
 
-    Notification.objects.filter(
-        id__in=notification_ids,
-        recipient=request.user
-    ).update(is_read=True)
+    set_read(request.user.id, Notification.objects.filter(id__in=notification_ids), True)
 
     return Response({'status': 'success'})
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def mark_all_read(request):
+    count = set_read(request.user.id, Notification.objects.all(), True)
+    return Response({'status': 'success', 'count': count})
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def bulk_delete(request):
     notification_ids = request.data.get('notification_ids', [])
 
-    Notification.objects.filter(
-        id__in=notification_ids,
-        recipient=request.user
-    ).delete()
+    delete_notifications(request.user.id, Notification.objects.filter(id__in=notification_ids))
 
     return Response({'status': 'success'})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def unread_count(request):
+    return Response({'count': get_unread_count(request.user.id)})
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def fanout_job_status(request, job_id):
+    """Progreso de un envío masivo de notificaciones iniciado por el usuario"""
+    job = get_object_or_404(FanoutJob, id=job_id, sender=request.user)
+    return Response(FanoutJobSerializer(job).data)
@@ -28,15 +28,20 @@ const NotificationCenter = () => {
     },
     {
       enabled: !!user,
-      onSuccess: (data) => {
-        // Verificar que data es un array antes de usar filter
-        if (Array.isArray(data)) {
-          const unread = data.filter((n) => !n.is_read).length;
-          setUnreadCount(unread);
-        } else {
-          setUnreadCount(0);
-        }
-      },
+    }
+  );
+
+  // El contador de no leídas llega por WebSocket (unread_count y sus deltas);
+  // esta consulta solo sirve de valor inicial
+  useQuery(
+    "notifications-unread-count",
+    async () => {
+      const response = await api.get("/notifications/unread-count/");
+      return response.data.count;
+    },
+    {
+      enabled: !!user,
+      onSuccess: (count) => setUnreadCount(count),
     }
   );
 
@@ -111,6 +116,33 @@ const NotificationCenter = () => {
     // Conectar al servicio de notificaciones
     notificationService.connect(token);
 
+    // Sonido y toast de una notificación nueva
+    const alertNotification = (notification) => {
+      // Reproducir sonido (opcional)
+      try {
+        const audio = new Audio("/notification.mp3");
+        audio.volume = 0.3;
+        audio.play().catch(() => { });
+      } catch (e) { }
+
+      // Mostrar toast
+      toast(
+        <div className="flex items-center space-x-3">
+          {getNotificationIcon(notification.notification_type)}
+          <div>
+            <p className="font-medium text-sm">{notification.title}</p>
+            <p className="text-xs text-gray-600">
+              {notification.message}
+            </p>
+          </div>
+        </div>,
+        {
+          duration: 5000,
+          position: "top-right",
+        }
+      );
+    };
+
     // Listener para mensajes del WebSocket
     const removeListener = notificationService.addListener((data) => {
       switch (data.type) {
@@ -130,36 +162,40 @@ const NotificationCenter = () => {
 
           // Incrementar contador
           setUnreadCount((prev) => prev + 1);
+          alertNotification(data.notification);
+          break;
 
-          // Reproducir sonido (opcional)
-          try {
-            const audio = new Audio("/notification.mp3");
-            audio.volume = 0.3;
-            audio.play().catch(() => { });
-          } catch (e) { }
-
-          // Mostrar toast
-          toast(
-            <div className="flex items-center space-x-3">
-              {getNotificationIcon(data.notification.notification_type)}
-              <div>
-                <p className="font-medium text-sm">{data.notification.title}</p>
-                <p className="text-xs text-gray-600">
-                  {data.notification.message}
-                </p>
-              </div>
-            </div>,
-            {
-              duration: 5000,
-              position: "top-right",
-            }
+        case "notifications_batch": {
+          // Nuevas y agrupadas de una ventana de envío (cada una una vez, con su último estado)
+          const incoming = [...data.created, ...data.updated].sort(
+            (a, b) => new Date(b.created_at) - new Date(a.created_at)
           );
+          const ids = new Set(incoming.map((n) => n.id));
+          queryClient.setQueryData("notifications", (oldData) => [
+            ...incoming,
+            ...(oldData || []).filter((n) => !ids.has(n.id)),
+          ]);
+
+          // Las actualizadas siguen siendo una sola no leída: solo suman las nuevas
+          if (data.created.length > 0) {
+            setUnreadCount((prev) => prev + data.created.length);
+            alertNotification(data.created[data.created.length - 1]);
+          }
           break;
+        }
 
         case "unread_count":
           setUnreadCount(data.count);
           break;
 
+        case "unread_count_changed":
+          if (typeof data.count === "number") {
+            setUnreadCount(data.count);
+          } else {
+            setUnreadCount((prev) => Math.max(0, prev + data.delta));
+          }
+          break;
+
         case "notification_marked_read":
           if (data.success) {
             queryClient.invalidateQueries("notifications");
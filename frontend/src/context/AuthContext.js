@@ -167,15 +167,8 @@ export const AuthProvider = ({ children }) => {
   };
 
   const updateUser = (userData) => {
+    // El backend difunde el cambio de perfil a los contactos al guardarlo
     dispatch({ type: "UPDATE_USER", payload: userData });
-
-    // Notificar al WebSocket sobre la actualización del perfil
-    if (socketService.isConnected()) {
-      socketService.send({
-        type: "profile_updated",
-        user_data: userData,
-      });
-    }
   };
 
   // 🌟 Sistema de Puntos y Gamificación
@@ -59,9 +59,7 @@ const LiveStreamPage = () => {
             if (response.data.status === 'live') {
                 setIsStreaming(true);
             }
-
-            const commentsResponse = await api.get(`/live/streams/${streamId}/comments/`);
-            setComments(commentsResponse.data);
+            // Los comentarios recientes llegan por WebSocket ('recent_comments')
         } catch (error) {
             console.error('Error loading stream:', error);
             toast.error('Error al cargar el directo');
@@ -358,7 +356,9 @@ const LiveStreamPage = () => {
         ws.onopen = () => console.log('WebSocket conectado');
         ws.onmessage = (event) => {
             const data = JSON.parse(event.data);
-            if (data.type === 'new_comment') {
+            if (data.type === 'recent_comments') {
+                setComments(data.comments || []);
+            } else if (data.type === 'new_comment') {
                 setComments(prev => [...prev, data.comment]);
             } else if (data.type === 'viewers_update') {
                 setViewersCount(data.count);